@@ -1,19 +1,17 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-from utils.mock_ad import MockActiveDirectory
-from utils.ticket_manager import TicketManager
-from utils.database import Database
+from utils.view_cache import (data_version, get_database, get_directory, get_ticket_manager,
+                              recent_tickets, ticket_statistics)
 
-# Initialize session state
+# Initialize session state with the process-wide shared resources
 if 'db' not in st.session_state:
-    st.session_state.db = Database()
+    st.session_state.db = get_database()
 
 if 'ticket_manager' not in st.session_state:
-    st.session_state.ticket_manager = TicketManager(st.session_state.db)
+    st.session_state.ticket_manager = get_ticket_manager()
 
 if 'mock_ad' not in st.session_state:
-    st.session_state.mock_ad = MockActiveDirectory()
+    st.session_state.mock_ad = get_directory()
 
 # Page configuration
 st.set_page_config(
@@ -93,19 +91,17 @@ def main():
 
     with col3:
         st.markdown("### Quick Stats")
-        tickets = st.session_state.ticket_manager.get_all_tickets()
-        total_tickets = len(tickets)
-        open_tickets = len([t for t in tickets if t['status'] == 'Open'])
+        stats = ticket_statistics(data_version())
         
-        st.metric("Total Tickets", total_tickets)
-        st.metric("Open Tickets", open_tickets)
+        st.metric("Total Tickets", stats['total'])
+        st.metric("Open Tickets", stats['open'])
 
     # Recent activity
     st.markdown("## Recent Activity")
-    recent_tickets = st.session_state.ticket_manager.get_recent_tickets(5)
+    tickets = recent_tickets(data_version(), 5)
     
-    if recent_tickets:
-        for ticket in recent_tickets:
+    if tickets:
+        for ticket in tickets:
             status_class = f"status-{ticket['status'].lower().replace(' ', '-')}"
             priority_class = f"priority-{ticket['priority'].lower()}"
             
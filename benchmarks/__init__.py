@@ -0,0 +1,5 @@
+"""
+Synthetic-load benchmarks for the Database backends and TicketManager
+
+Run with: python -m benchmarks.run --sizes 1000 10000
+"""
@@ -0,0 +1,216 @@
+"""
+Deterministic generator of realistic employees, tickets and comments
+The same seed and size always produce the same data, so benchmark runs are
+comparable across commits
+"""
+
+import random
+from datetime import datetime, timedelta
+
+CATEGORIES = [
+    "Hardware Issues",
+    "Software Issues",
+    "Network/Connectivity",
+    "Email/Communication",
+    "Security/Access",
+    "Printer/Peripherals",
+    "Account Management",
+    "Other"
+]
+PRIORITIES = ["Low", "Medium", "High"]
+URGENCIES = ["Low", "Medium", "High", "Critical"]
+STATUSES = ["Open", "In Progress", "Resolved", "Closed"]
+STATUS_WEIGHTS = [30, 20, 25, 25]
+AGENTS = ["John Smith (IT)", "Sarah Johnson (IT)", "Mike Wilson (IT)"]
+DEPARTMENTS = [
+    "Information Technology",
+    "Human Resources",
+    "Finance",
+    "Marketing",
+    "Operations",
+    "Sales",
+    "Legal"
+]
+FIRST_NAMES = [
+    "John", "Jane", "Bob", "Alice", "Carol", "David", "Sarah", "Michael", "Lisa", "Robert",
+    "Emma", "Daniel", "Olivia", "James", "Sophia", "William", "Mia", "Lucas", "Chloe", "Henry"
+]
+LAST_NAMES = [
+    "Doe", "Smith", "Johnson", "Brown", "Wilson", "Miller", "Davis", "Taylor", "Anderson", "Chen",
+    "Lee", "Garcia", "Martinez", "Clark", "Lewis", "Walker", "Hall", "Young", "King", "Wright"
+]
+SUBJECTS = [
+    "laptop", "monitor", "printer", "VPN", "email", "password", "keyboard", "docking station",
+    "shared drive", "Outlook", "Teams", "Wi-Fi", "badge reader", "phone", "CRM", "payroll portal"
+]
+PROBLEMS = [
+    "won't start", "keeps disconnecting", "is very slow", "shows an error", "needs access",
+    "stopped syncing", "is not responding", "needs to be replaced", "crashes on launch"
+]
+DETAILS = [
+    "This started after the latest update.",
+    "It happens several times a day.",
+    "I have already tried restarting.",
+    "Other people on my floor have the same problem.",
+    "It is blocking an urgent deadline.",
+    "The error code is 0x80070005.",
+    "It worked fine until yesterday afternoon.",
+    "I need this resolved before the client meeting."
+]
+REPLIES = [
+    "Looking into this now.",
+    "Could you send a screenshot of the error?",
+    "Reinstalled the driver, please try again.",
+    "Escalated to the network team.",
+    "Access has been granted.",
+    "Replacement hardware has been ordered.",
+    "Issue resolved after a configuration change."
+]
+
+# Fixed reference time so generated dates do not depend on when the benchmark runs
+BASE_DATE = datetime(2025, 6, 30, 18, 0, 0)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Direct reports per manager in the generated org chart
+MANAGER_SPAN = 8
+
+def generate_employees(count, seed=0):
+    """
+    Generate employee directory records
+
+    Args:
+        count (int): Number of employees
+        seed (int): Random seed
+
+    Employee i reports to employee (i - 1) // MANAGER_SPAN, so the directory
+    is one org chart under the first employee. Names repeat, so records carry
+    their manager's id as well as the name.
+
+    Returns:
+        list: Employee records in the MockActiveDirectory format
+    """
+    rng = random.Random(seed)
+    employees = []
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        department = rng.choice(DEPARTMENTS)
+        manager = employees[(i - 1) // MANAGER_SPAN] if i else None
+        employees.append({
+            'employee_id': f"EMP{i + 1:06d}",
+            'name': f"{first} {last}",
+            'email': f"{first.lower()}.{last.lower()}{i + 1}@company.com",
+            'department': department,
+            'phone': f"+1-555-{rng.randint(0, 9999):04d}",
+            'manager': manager['name'] if manager else 'CEO',
+            'manager_id': manager['employee_id'] if manager else '',
+            'location': f"Building {rng.choice('ABCDE')}, Floor {rng.randint(1, 6)}",
+            'title': f"{department} {rng.choice(['Specialist', 'Analyst', 'Coordinator', 'Manager'])}"
+        })
+    return employees
+
+def generate_comment(rng, author, timestamp):
+    """Generate one ticket comment"""
+    return {
+        'author': author,
+        'comment': rng.choice(REPLIES),
+        'timestamp': timestamp.strftime(DATE_FORMAT)
+    }
+
+def generate_tickets(count, employees, seed=0, days=365):
+    """
+    Generate tickets spread over the given number of days before BASE_DATE
+
+    Args:
+        count (int): Number of tickets
+        employees (list): Employee records to raise tickets for
+        seed (int): Random seed
+        days (int): Time span covered by the creation dates
+
+    Returns:
+        list: Tickets in the TicketManager format, ordered by creation date
+    """
+    rng = random.Random(seed + 1)
+    span = days * 24 * 3600
+    offsets = sorted(rng.randrange(span) for _ in range(count))
+    start = BASE_DATE - timedelta(seconds=span)
+
+    tickets = []
+    for i, offset in enumerate(offsets):
+        employee = rng.choice(employees)
+        created = start + timedelta(seconds=offset)
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        assigned_to = None if status == "Open" and rng.random() < 0.8 else rng.choice(AGENTS)
+
+        comments = []
+        updated = created
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+            updated = updated + timedelta(minutes=rng.randint(5, 3000))
+            comments.append(generate_comment(rng, assigned_to or employee['name'], updated))
+
+        subject = rng.choice(SUBJECTS)
+        tickets.append({
+            'id': str(i + 1).zfill(4),
+            'title': f"{subject.capitalize()} {rng.choice(PROBLEMS)}",
+            'description': f"My {subject} {rng.choice(PROBLEMS)}. {rng.choice(DETAILS)} {rng.choice(DETAILS)}",
+            'category': rng.choice(CATEGORIES),
+            'priority': rng.choice(PRIORITIES),
+            'urgency': rng.choice(URGENCIES),
+            'status': status,
+            'employee_id': employee['employee_id'],
+            'employee_name': employee['name'],
+            'employee_email': employee['email'],
+            'department': employee['department'],
+            'location': employee['location'],
+            'phone': employee['phone'],
+            'created_date': created.strftime(DATE_FORMAT),
+            'updated_date': updated.strftime(DATE_FORMAT),
+            'assigned_to': assigned_to,
+            'resolution': "Issue resolved." if status in ("Resolved", "Closed") else '',
+            'attachments': [],
+            'comments': comments
+        })
+    return tickets
+
+def generate_dataset(ticket_count, seed=0):
+    """
+    Generate a complete data file structure
+
+    Args:
+        ticket_count (int): Number of tickets
+        seed (int): Random seed
+
+    Returns:
+        tuple: (data dict with 'tickets' and 'settings', list of employees)
+    """
+    employees = generate_employees(max(10, min(ticket_count // 10, 80000)), seed)
+    data = {
+        'tickets': generate_tickets(ticket_count, employees, seed),
+        'settings': {
+            'auto_assign': True,
+            'escalation_enabled': True,
+            'business_hours_only': False,
+            'default_priority': 'Medium',
+            'max_response_time': 24
+        }
+    }
+    return data, employees
+
+def generate_ticket_data(rng, employees):
+    """Generate the form data for a new ticket, as submitted from the Employee Portal"""
+    employee = rng.choice(employees)
+    subject = rng.choice(SUBJECTS)
+    return {
+        'title': f"{subject.capitalize()} {rng.choice(PROBLEMS)}",
+        'description': f"My {subject} {rng.choice(PROBLEMS)}. {rng.choice(DETAILS)}",
+        'category': rng.choice(CATEGORIES),
+        'priority': rng.choice(PRIORITIES),
+        'urgency': rng.choice(URGENCIES),
+        'location': employee['location'],
+        'phone': employee['phone'],
+        'employee_id': employee['employee_id'],
+        'employee_name': employee['name'],
+        'employee_email': employee['email'],
+        'department': employee['department'],
+        'attachments': []
+    }
@@ -0,0 +1,285 @@
+"""
+Benchmark runner for Database and TicketManager
+Each dataset size runs in a fresh interpreter so that peak RSS and cold-load
+times are not skewed by earlier sizes. Results are written as JSON.
+
+Usage:
+    python -m benchmarks.run --sizes 1000 10000 100000 1000000 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.generator import (
+    AGENTS, BASE_DATE, CATEGORIES, MANAGER_SPAN, PRIORITIES, STATUSES, SUBJECTS,
+    generate_dataset, generate_ticket_data
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies):
+    """
+    Summarize per-call latencies
+
+    Args:
+        latencies (list): Seconds per call
+
+    Returns:
+        dict: Call count, throughput and latency percentiles in milliseconds
+    """
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'total_s': round(total, 6),
+        'ops_per_s': round(len(ordered) / total, 2) if total else None,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 4),
+        'p90_ms': round(percentile(ordered, 0.90) * 1000, 4),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4) if ordered else 0.0
+    }
+
+def measure(func, calls):
+    """Call func once per argument tuple and return the per-call latencies"""
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def ticket_memory(tickets, sample=10000):
+    """
+    Memory per ticket held as a plain dict and as a TicketRecord
+
+    Tickets are decoded from JSON first, as they are when loaded from disk,
+    so that no strings are shared with the generator's data.
+
+    Returns:
+        dict: Average traced bytes per ticket for 'dict' and 'record'
+    """
+    from utils.comment_store import detach_comments
+    from utils.ticket_record import TicketRecord
+
+    lines = [json.dumps(detach_comments(t)[0]) for t in tickets[:sample]]
+    result = {}
+    for name, build in (('dict', lambda ticket: ticket), ('record', TicketRecord)):
+        tracemalloc.start()
+        held = [build(json.loads(line)) for line in lines]
+        result[name] = round(tracemalloc.get_traced_memory()[0] / max(len(held), 1), 1)
+        tracemalloc.stop()
+        del held
+    return result
+
+def open_database(storage, data_file, durability):
+    """Open the backend under test on the generated data"""
+    if storage == 'sqlite':
+        from utils.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(os.path.splitext(data_file)[0] + '.db')
+    from utils.database import Database
+    return Database(data_file, storage_mode=storage, durability=durability)
+
+def run_size(size, storage, durability, ops, load_repeats, seed):
+    """
+    Benchmark one dataset size in this process
+
+    Returns:
+        dict: Timings for every operation plus memory and file size
+    """
+    from utils.mock_ad import MockActiveDirectory
+    from utils.ticket_manager import TicketManager
+
+    workdir = tempfile.mkdtemp(prefix='helpdesk_bench_')
+    try:
+        data_file = os.path.join(workdir, 'helpdesk_data.json')
+        start = time.perf_counter()
+        data, employees = generate_dataset(size, seed)
+        with open(data_file, 'w') as f:
+            json.dump(data, f)
+        ticket_bytes = ticket_memory(data['tickets'])
+        del data
+        if storage == 'sqlite':
+            from utils.sqlite_database import migrate_json_to_sqlite
+            migrate_json_to_sqlite(data_file, os.path.splitext(data_file)[0] + '.db')
+        else:
+            # The generator embeds comments in tickets; move them to the comment store
+            db = open_database(storage, data_file, durability)
+            db.migrate_comments()
+            db.close()
+        generate_s = time.perf_counter() - start
+
+        # Cold load: open the backend from disk, including index builds
+        load_latencies = []
+        for _ in range(load_repeats):
+            start = time.perf_counter()
+            db = open_database(storage, data_file, durability)
+            load_latencies.append(time.perf_counter() - start)
+            db.close()
+            del db
+        db = open_database(storage, data_file, durability)
+        manager = TicketManager(db)
+
+        rng = random.Random(seed + 2)
+        def random_id():
+            return str(rng.randint(1, size)).zfill(4)
+
+        operations = {}
+        operations['create'] = measure(
+            manager.create_ticket, [(generate_ticket_data(rng, employees),) for _ in range(ops)])
+        operations['update'] = measure(
+            manager.update_ticket,
+            [(random_id(), {'status': rng.choice(STATUSES), 'assigned_to': rng.choice(AGENTS)})
+             for _ in range(ops)])
+        operations['comment'] = measure(
+            manager.add_comment,
+            [(random_id(), {'author': 'Benchmark', 'comment': 'Benchmark comment',
+                            'timestamp': '2025-07-01 12:00:00'}) for _ in range(ops)])
+        operations['get_ticket'] = measure(manager.get_ticket, [(random_id(),) for _ in range(ops)])
+        operations['search'] = measure(
+            manager.search_tickets,
+            [(rng.choice(SUBJECTS).split()[0][:rng.randint(3, 6)],) for _ in range(ops)])
+        operations['filter_status'] = measure(
+            manager.get_tickets_by_status, [(rng.choice(STATUSES),) for _ in range(ops)])
+        operations['filter_priority'] = measure(
+            manager.get_tickets_by_priority, [(rng.choice(PRIORITIES),) for _ in range(ops)])
+        operations['filter_category'] = measure(
+            manager.get_tickets_by_category, [(rng.choice(CATEGORIES),) for _ in range(ops)])
+        operations['filter_unassigned'] = measure(manager.get_unassigned_tickets, [()] * ops)
+        operations['filter_employee'] = measure(
+            manager.get_employee_tickets,
+            [(rng.choice(employees)['employee_id'],) for _ in range(ops)])
+        operations['statistics'] = measure(manager.get_ticket_statistics, [()] * ops)
+        operations['recent'] = measure(manager.get_recent_tickets, [(10,)] * ops)
+        days = [(BASE_DATE - timedelta(days=rng.randint(1, 365))).date() for _ in range(ops)]
+        operations['created_on_day'] = measure(
+            manager.get_tickets_between, [('created_date', day, day + timedelta(days=1)) for day in days])
+
+        start = time.perf_counter()
+        directory = MockActiveDirectory(employees)
+        directory_build_s = time.perf_counter() - start
+        fragments = [rng.choice(employees)['name'].split()[rng.randint(0, 1)].lower()[:rng.randint(2, 6)]
+                     for _ in range(ops)]
+        operations['directory_search'] = measure(directory.search_employees, [(f,) for f in fragments])
+        operations['directory_lookup'] = measure(
+            directory.get_employee, [(rng.choice(employees)['email'].split('@')[0],) for _ in range(ops)])
+        operations['directory_manager'] = measure(
+            directory.get_employee_manager, [(rng.choice(employees)['employee_id'],) for _ in range(ops)])
+        # The first employees are the ones with reports, see generate_employees
+        managers = [employee['employee_id'] for employee in employees[:len(employees) // MANAGER_SPAN]]
+        operations['org_tickets'] = measure(
+            manager.get_org_tickets, [(directory.get_org_graph(), rng.choice(managers)) for _ in range(ops)])
+
+        flush_start = time.perf_counter()
+        db.close()
+        close_s = time.perf_counter() - flush_start
+
+        data_file_bytes = sum(
+            os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir))
+        return {
+            'size': size,
+            'generate_s': round(generate_s, 3),
+            'cold_load': summarize(load_latencies),
+            'operations': {name: summarize(latencies) for name, latencies in operations.items()},
+            'close_s': round(close_s, 6),
+            'directory_build_s': round(directory_build_s, 3),
+            'data_bytes': data_file_bytes,
+            'ticket_bytes': ticket_bytes,
+            'peak_rss_kb': peak_rss_kb()
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def git_revision():
+    """Current commit and whether the working tree has local changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Database and TicketManager on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Ticket counts to benchmark")
+    parser.add_argument('--storage', choices=['json', 'log', 'sqlite'], default='log')
+    parser.add_argument('--durability', choices=['always', 'interval', 'shutdown'], default='always')
+    parser.add_argument('--ops', type=int, default=200, help="Calls per operation")
+    parser.add_argument('--load-repeats', type=int, default=3, help="Cold loads per size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    options = ['--storage', args.storage, '--durability', args.durability, '--ops', str(args.ops),
+               '--load-repeats', str(args.load_repeats), '--seed', str(args.seed)]
+
+    if args.single is not None:
+        result = run_size(args.single, args.storage, args.durability, args.ops,
+                          args.load_repeats, args.seed)
+        json.dump(result, sys.stdout)
+        return
+
+    results = []
+    for size in args.sizes:
+        print(f"Benchmarking {size} tickets...", file=sys.stderr)
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.run', '--single', str(size)] + options,
+                               cwd=REPO_ROOT, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(child.stderr, file=sys.stderr)
+            results.append({'size': size, 'error': child.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append(json.loads(child.stdout))
+
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'storage': args.storage,
+            'durability': args.durability,
+            'ops': args.ops,
+            'load_repeats': args.load_repeats,
+            'seed': args.seed
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
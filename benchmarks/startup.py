@@ -0,0 +1,234 @@
+"""
+Startup-time profile of the Streamlit entry points
+Each entry point is run headless through Streamlit's AppTest, in a fresh
+interpreter started with -X importtime, on a generated data file. For every
+entry point the report gives the time spent importing the modules the script
+pulls in (and the heaviest of them), the time of the first render, and the
+time of a rerun, which is what every widget interaction costs once warm.
+
+Usage:
+    python -m benchmarks.startup --tickets 1000 --output startup.json
+    python -m benchmarks.startup --baseline startup.json
+
+With --baseline the exit status is 1 if any timing got slower than the
+baseline by more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.generator import generate_dataset
+from benchmarks.run import REPO_ROOT, git_revision
+
+ENTRY_POINTS = ['app.py', 'pages/01_Employee_Portal.py', 'pages/02_Admin_Dashboard.py']
+
+# Timings compared against a baseline
+TIMINGS = ('import_s', 'first_render_s', 'rerun_s')
+
+# Relative slowdown reported as a regression, and the absolute difference
+# below which timings are considered noise
+DEFAULT_TOLERANCE = 0.2
+NOISE_FLOOR_S = 0.05
+
+# Heaviest imports listed per entry point
+HEAVY_IMPORTS = 10
+
+def profile_script(script):
+    """
+    Render an entry point twice in this process
+
+    Streamlit's testing module is imported first, so that the modules
+    imported during the renders are the ones the script itself needs.
+
+    Returns:
+        dict: Render timings, the modules imported by the script and any
+            exceptions the script raised
+    """
+    from streamlit.testing.v1 import AppTest
+
+    before = set(sys.modules)
+    app = AppTest.from_file(os.path.join(REPO_ROOT, script), default_timeout=300)
+    start = time.perf_counter()
+    app.run()
+    first_render = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - start
+
+    return {
+        'first_render_s': round(first_render, 4),
+        'rerun_s': round(rerun, 4),
+        'modules': sorted(set(sys.modules) - before),
+        'exceptions': [e.message for e in app.exception]
+    }
+
+def parse_importtime(stderr, modules):
+    """
+    Cumulative import times of top-level imports from -X importtime output
+
+    Args:
+        stderr (str): Interpreter stderr
+        modules (list): Only report these modules
+
+    Returns:
+        dict: Seconds by module name
+    """
+    wanted = set(modules)
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # The header line
+        name = fields[2][1:]
+        if name.startswith(' ') or name not in wanted:
+            continue  # Nested imports are included in their parent's time
+        times[name] = int(fields[1]) / 1e6
+    return times
+
+def run_entry_point(script, workdir):
+    """
+    Profile an entry point in a fresh interpreter
+
+    Returns:
+        dict: Import and render timings, or 'error' if the run failed
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    child = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'benchmarks.startup', '--single', script],
+                           cwd=workdir, env=env, capture_output=True, text=True)
+    if child.returncode != 0:
+        lines = [line for line in child.stderr.splitlines() if not line.startswith('import time:')]
+        return {'error': lines[-1:]}
+
+    result = json.loads(child.stdout)
+    imports = parse_importtime(child.stderr, result.pop('modules'))
+    heaviest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:HEAVY_IMPORTS]
+    result['import_s'] = round(sum(imports.values()), 4)
+    result['heavy_imports'] = {name: round(seconds, 4) for name, seconds in heaviest}
+    return result
+
+def profile(entry_points, tickets, repeats, seed):
+    """
+    Profile each entry point repeats times on a generated data file
+
+    Returns:
+        list: One result per entry point, with the median of each timing
+    """
+    from utils.database import Database
+
+    workdir = tempfile.mkdtemp(prefix='helpdesk_startup_')
+    try:
+        data_file = os.path.join(workdir, 'helpdesk_data.json')
+        data, _ = generate_dataset(tickets, seed)
+        with open(data_file, 'w') as f:
+            json.dump(data, f)
+        del data
+        # Move the generated comments to the comment store up front, so the
+        # first profiled run does not pay for it
+        db = Database(data_file, storage_mode=os.environ.get('HELPDESK_STORAGE_MODE', 'json'))
+        db.migrate_comments()
+        db.close()
+
+        results = []
+        for script in entry_points:
+            print(f"Profiling {script}...", file=sys.stderr)
+            runs = [run_entry_point(script, workdir) for _ in range(repeats)]
+            failed = [run for run in runs if 'error' in run]
+            if failed:
+                results.append({'script': script, 'error': failed[0]['error']})
+                continue
+            result = {'script': script}
+            for timing in TIMINGS:
+                result[timing] = round(statistics.median(run[timing] for run in runs), 4)
+            # The import breakdown and exceptions of the median first render
+            median_run = sorted(runs, key=lambda run: run['first_render_s'])[len(runs) // 2]
+            result['heavy_imports'] = median_run['heavy_imports']
+            result['exceptions'] = median_run['exceptions']
+            results.append(result)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(results, baseline, tolerance):
+    """
+    Compare timings with a baseline report
+
+    Returns:
+        list: (script, timing, baseline seconds, current seconds) of every regression
+    """
+    previous = {r['script']: r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in results:
+        old = previous.get(result['script'])
+        if old is None or 'error' in result:
+            continue
+        for timing in TIMINGS:
+            before, after = old[timing], result[timing]
+            change = f"{(after - before) / before:+.0%}" if before else "n/a"
+            print(f"{result['script']:<32} {timing:<15} {before:>8.3f}s -> {after:>8.3f}s  {change}",
+                  file=sys.stderr)
+            if after > before * (1 + tolerance) and after - before > NOISE_FLOOR_S:
+                regressions.append((result['script'], timing, before, after))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile import and first-render time of the Streamlit pages")
+    parser.add_argument('--scripts', nargs='+', default=ENTRY_POINTS, help="Entry points, relative to the repo")
+    parser.add_argument('--tickets', type=int, default=1000, help="Tickets in the generated data file")
+    parser.add_argument('--repeats', type=int, default=3, help="Fresh-interpreter runs per entry point")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    parser.add_argument('--baseline', help="Earlier report to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative slowdown that counts as a regression")
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single is not None:
+        json.dump(profile_script(args.single), sys.stdout)
+        return 0
+
+    results = profile(args.scripts, args.tickets, args.repeats, args.seed)
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'tickets': args.tickets,
+            'repeats': args.repeats,
+            'seed': args.seed
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for script, timing, before, after in regressions:
+            print(f"Regression: {script} {timing} {before:.3f}s -> {after:.3f}s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
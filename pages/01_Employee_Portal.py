@@ -1,8 +1,9 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-from utils.mock_ad import MockActiveDirectory
-from utils.ticket_manager import TicketManager
+from utils.attachment_store import attachment_url, format_size
+from utils.metrics import timed
+from utils.view_cache import (VIEW_CACHE_ENTRIES, data_version, employee_tickets, get_database,
+                              get_directory, get_ticket_manager, org_ticket_statistics)
 
 st.set_page_config(
     page_title="Employee Portal - HelpDesk Pro",
@@ -10,14 +11,16 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
+# Comments loaded per page of a comment thread
+COMMENT_PAGE_SIZE = 10
+
+# Initialize components with the process-wide shared resources
 if 'ticket_manager' not in st.session_state:
-    from utils.database import Database
-    st.session_state.db = Database()
-    st.session_state.ticket_manager = TicketManager(st.session_state.db)
+    st.session_state.db = get_database()
+    st.session_state.ticket_manager = get_ticket_manager()
 
 if 'mock_ad' not in st.session_state:
-    st.session_state.mock_ad = MockActiveDirectory()
+    st.session_state.mock_ad = get_directory()
 
 def main():
     st.title("🧑‍💼 Employee Portal")
@@ -72,6 +75,7 @@ def main():
         with tab3:
             display_employee_stats(employee)
 
+@timed('page')
 def submit_ticket_form(employee):
     st.markdown("### Submit a New Support Ticket")
     
@@ -122,7 +126,8 @@ def submit_ticket_form(employee):
                     'employee_name': employee['name'],
                     'employee_email': employee['email'],
                     'department': employee['department'],
-                    'attachments': [f.name for f in uploaded_files] if uploaded_files else []
+                    'attachments': [st.session_state.ticket_manager.store_attachment(f, f.name)
+                                    for f in uploaded_files] if uploaded_files else []
                 }
                 
                 ticket_id = st.session_state.ticket_manager.create_ticket(ticket_data)
@@ -132,6 +137,7 @@ def submit_ticket_form(employee):
             else:
                 st.error("Please fill in all required fields marked with *")
 
+@timed('page')
 def display_employee_tickets(employee):
     st.markdown("### Your Support Tickets")
     
@@ -145,7 +151,7 @@ def display_employee_tickets(employee):
         sort_by = st.selectbox("Sort by", ["Newest First", "Oldest First", "Priority"])
     
     # Get employee tickets
-    tickets = st.session_state.ticket_manager.get_employee_tickets(employee['employee_id'])
+    tickets = employee_tickets(data_version(), employee['employee_id'])
     
     # Apply filters
     if status_filter != "All":
@@ -181,12 +187,13 @@ def display_employee_tickets(employee):
                 
                 st.write(f"**Description:** {ticket['description']}")
                 
-                if ticket.get('attachments'):
-                    st.write(f"**Attachments:** {', '.join(ticket['attachments'])}")
+                display_attachments(ticket)
                 
                 if ticket.get('resolution'):
                     st.write(f"**Resolution:** {ticket['resolution']}")
                 
+                display_comment_thread(ticket)
+                
                 # Add comment section
                 st.markdown("**Add Comment:**")
                 new_comment = st.text_area("Comment", key=f"comment_{ticket['id']}", height=100)
@@ -202,52 +209,144 @@ def display_employee_tickets(employee):
     else:
         st.info("No tickets found matching your criteria.")
 
+def display_attachments(ticket):
+    """List a ticket's attachments; file contents are only read when a download is requested"""
+    attachments = ticket.get('attachments') or []
+    if not attachments:
+        return
+    
+    st.write("**Attachments:**")
+    for number, attachment in enumerate(attachments):
+        if isinstance(attachment, str):
+            st.write(f"📎 {attachment}")  # Older tickets only kept the file name
+            continue
+        
+        label = f"📎 {attachment['name']} ({format_size(attachment['size'])})"
+        url = attachment_url(attachment['sha256'])
+        key = f"attachment_{ticket['id']}_{number}"
+        if url:
+            st.markdown(f"[{label}]({url})")
+        elif st.session_state.get(key):
+            st.download_button(f"⬇️ Download {attachment['name']}",
+                               data=b''.join(st.session_state.ticket_manager.read_attachment(attachment)),
+                               file_name=attachment['name'], key=f"{key}_download")
+        elif st.button(label, key=f"{key}_prepare"):
+            st.session_state[key] = True
+            st.rerun()
+
+def display_comment_thread(ticket):
+    """Show a ticket's comments on request, newest page first, loading older pages on demand"""
+    count = ticket.get('comment_count', 0)
+    if not count:
+        return
+    
+    # Threads are only read from the comment store once they are opened
+    if not st.checkbox(f"💬 Show comments ({count})", key=f"show_comments_{ticket['id']}"):
+        return
+    
+    shown_key = f"comments_shown_{ticket['id']}"
+    shown = min(count, st.session_state.get(shown_key, COMMENT_PAGE_SIZE))
+    if shown < count and st.button(f"Show older comments ({count - shown} more)",
+                                   key=f"older_comments_{ticket['id']}"):
+        st.session_state[shown_key] = shown + COMMENT_PAGE_SIZE
+        st.rerun()
+    
+    for comment in st.session_state.ticket_manager.get_comments(ticket['id'], count - shown, shown):
+        st.markdown(f"*{comment['author']}* ({comment['timestamp']}): {comment['comment']}")
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def employee_stats(version, employee_id):
+    """
+    Build an employee's ticket counts and charts at a data version
+    
+    Returns:
+        dict: Counts by metric label and plotly figures under 'figures',
+            or None if the employee has no tickets
+    """
+    tickets = employee_tickets(version, employee_id)
+    
+    if not tickets:
+        return None
+    
+    # Charts; pandas and plotly are only imported when the stats are built
+    import pandas as pd
+    import plotly.express as px
+    
+    # Status and category distributions
+    df = pd.DataFrame(tickets)
+    status_counts = df['status'].value_counts()
+    category_counts = df['category'].value_counts()
+    
+    category_figure = px.bar(x=category_counts.index, y=category_counts.values,
+                             title="Tickets by Category")
+    category_figure.update_xaxes(tickangle=45)
+    return {
+        'total': len(tickets),
+        'open': len([t for t in tickets if t['status'] in ['Open', 'In Progress']]),
+        'resolved': len([t for t in tickets if t['status'] in ['Resolved', 'Closed']]),
+        'high_priority': len([t for t in tickets if t['priority'] == 'High']),
+        'figures': {
+            'status': px.pie(values=status_counts.values, names=status_counts.index, 
+                             title="Tickets by Status"),
+            'category': category_figure
+        }
+    }
+
+@timed('page')
 def display_employee_stats(employee):
     st.markdown("### Your Support Statistics")
     
-    tickets = st.session_state.ticket_manager.get_employee_tickets(employee['employee_id'])
+    stats = employee_stats(data_version(), employee['employee_id'])
     
-    if tickets:
+    if stats:
         # Basic stats
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Tickets", len(tickets))
+            st.metric("Total Tickets", stats['total'])
         
         with col2:
-            open_tickets = len([t for t in tickets if t['status'] in ['Open', 'In Progress']])
-            st.metric("Open Tickets", open_tickets)
+            st.metric("Open Tickets", stats['open'])
         
         with col3:
-            resolved_tickets = len([t for t in tickets if t['status'] in ['Resolved', 'Closed']])
-            st.metric("Resolved Tickets", resolved_tickets)
+            st.metric("Resolved Tickets", stats['resolved'])
         
         with col4:
-            high_priority = len([t for t in tickets if t['priority'] == 'High'])
-            st.metric("High Priority", high_priority)
-        
-        # Charts
-        import plotly.express as px
-        
-        # Status distribution
-        df = pd.DataFrame(tickets)
-        status_counts = df['status'].value_counts()
+            st.metric("High Priority", stats['high_priority'])
         
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = px.pie(values=status_counts.values, names=status_counts.index, 
-                        title="Tickets by Status")
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(stats['figures']['status'], use_container_width=True)
         
         with col2:
-            category_counts = df['category'].value_counts()
-            fig = px.bar(x=category_counts.index, y=category_counts.values,
-                        title="Tickets by Category")
-            fig.update_xaxis(tickangle=45)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(stats['figures']['category'], use_container_width=True)
     else:
         st.info("No ticket statistics available yet. Submit your first ticket to see stats!")
+    
+    display_org_stats(employee)
+
+def display_org_stats(employee):
+    """Ticket load of everyone reporting to the employee, for managers only"""
+    directory = st.session_state.mock_ad
+    org_size = directory.get_org_graph().org_size(employee['employee_id'])
+    if not org_size:
+        return
+    
+    st.markdown("### Your Organization")
+    stats = org_ticket_statistics(data_version(), directory.org_generation, employee['employee_id'])
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("People", org_size + 1)
+    with col2:
+        st.metric("Total Tickets", stats['total'])
+    with col3:
+        st.metric("Open Tickets", stats['open'] + stats['in_progress'])
+    with col4:
+        st.metric("High Priority", stats['high_priority'])
+    with col5:
+        st.metric("Unassigned", stats['unassigned'])
 
 if __name__ == "__main__":
     main()
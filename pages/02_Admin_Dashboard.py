@@ -1,9 +1,11 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from utils.ticket_manager import TicketManager
+from utils.attachment_store import attachment_url, format_size
+from utils.backups import get_backup_manager
+from utils.metrics import METRICS_ENABLED, REGISTRY, timed
+from utils.view_cache import (VIEW_CACHE_ENTRIES, data_version, get_database, get_directory,
+                              get_ticket_manager, recent_tickets, ticket_page, ticket_statistics,
+                              tickets_updated_on)
 
 st.set_page_config(
     page_title="Admin Dashboard - HelpDesk Pro",
@@ -11,75 +13,71 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize components
+# Comments loaded per page of a comment thread
+COMMENT_PAGE_SIZE = 10
+
+# Initialize components with the process-wide shared resources
 if 'ticket_manager' not in st.session_state:
-    from utils.database import Database
-    st.session_state.db = Database()
-    st.session_state.ticket_manager = TicketManager(st.session_state.db)
+    st.session_state.db = get_database()
+    st.session_state.ticket_manager = get_ticket_manager()
 
 def main():
     st.title("👨‍💻 Admin Dashboard")
     st.markdown("Comprehensive ticket management and analytics")
     
-    # Tabs for different admin functions
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📊 Overview", 
-        "🎫 Manage Tickets", 
-        "📈 Analytics", 
-        "👥 Team Management",
-        "⚙️ Settings"
-    ])
-    
-    with tab1:
-        display_overview()
-    
-    with tab2:
-        manage_tickets()
-    
-    with tab3:
-        display_analytics()
-    
-    with tab4:
-        team_management()
-    
-    with tab5:
-        admin_settings()
+    # Sections for different admin functions. Unlike st.tabs, which runs
+    # every tab on each rerun, only the selected section is rendered, so
+    # pandas and plotly are only imported once a section needs them.
+    sections = {
+        "📊 Overview": display_overview,
+        "🎫 Manage Tickets": manage_tickets,
+        "📈 Analytics": display_analytics,
+        "👥 Team Management": team_management,
+        "⚙️ Settings": admin_settings
+    }
+    section = st.radio("Section", list(sections), horizontal=True,
+                       label_visibility="collapsed", key='admin_section')
+    sections[section]()
 
+@timed('page')
 def display_overview():
     st.markdown("### System Overview")
     
-    # Get all tickets
-    tickets = st.session_state.ticket_manager.get_all_tickets()
+    # Get running ticket counts
+    version = data_version()
+    stats = ticket_statistics(version)
     
     # Key metrics
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        st.metric("Total Tickets", len(tickets))
+        st.metric("Total Tickets", stats['total'])
     
     with col2:
-        open_tickets = len([t for t in tickets if t['status'] == 'Open'])
+        open_tickets = stats['open']
         st.metric("Open Tickets", open_tickets, delta=f"{open_tickets-5} from last week")
     
     with col3:
-        in_progress = len([t for t in tickets if t['status'] == 'In Progress'])
-        st.metric("In Progress", in_progress)
+        st.metric("In Progress", stats['in_progress'])
     
     with col4:
-        resolved_today = len([t for t in tickets if t['status'] == 'Resolved' and 
-                             datetime.strptime(t['updated_date'], "%Y-%m-%d %H:%M:%S").date() == datetime.now().date()])
+        today = datetime.now().date()
+        updated_today = tickets_updated_on(version, today)
+        resolved_today = len([t for t in updated_today if t['status'] == 'Resolved'])
         st.metric("Resolved Today", resolved_today)
     
     with col5:
-        high_priority = len([t for t in tickets if t['priority'] == 'High'])
+        high_priority = stats['high_priority']
         st.metric("High Priority", high_priority, delta="⚠️" if high_priority > 0 else "✅")
     
     # Recent tickets table
     st.markdown("### Recent Tickets")
-    recent_tickets = st.session_state.ticket_manager.get_recent_tickets(10)
+    tickets = recent_tickets(version, 10)
     
-    if recent_tickets:
-        df = pd.DataFrame(recent_tickets)
+    if tickets:
+        import pandas as pd
+        
+        df = pd.DataFrame(tickets)
         df = df[['id', 'title', 'employee_name', 'category', 'priority', 'status', 'created_date']]
         df.columns = ['ID', 'Title', 'Employee', 'Category', 'Priority', 'Status', 'Created']
         
@@ -127,6 +125,7 @@ def display_overview():
         if st.button("📧 Send Notifications", use_container_width=True):
             send_notifications()
 
+@timed('page')
 def manage_tickets():
     st.markdown("### Ticket Management")
     
@@ -149,30 +148,61 @@ def manage_tickets():
     with col4:
         assigned_filter = st.selectbox("Filter by Assignment", ["All", "Assigned", "Unassigned"])
     
-    # Get and filter tickets
-    tickets = st.session_state.ticket_manager.get_all_tickets()
+    # Search
+    search_term = st.text_input("🔍 Search tickets", placeholder="Search by title, description, employee name or comments")
+    
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        sort_options = ["Oldest first", "Newest first", "Recently updated"]
+        if search_term:
+            sort_options.insert(0, "Best match")
+        sort_option = st.selectbox("Sort by", sort_options)
+    with col2:
+        page_size = st.selectbox("Tickets per page", [10, 20, 50], index=1)
+    with col3:
+        explain = st.checkbox("Explain query")
     
-    # Apply filters
+    filters = {}
     if status_filter != "All":
-        tickets = [t for t in tickets if t['status'] == status_filter]
+        filters['status'] = status_filter
     if priority_filter != "All":
-        tickets = [t for t in tickets if t['priority'] == priority_filter]
+        filters['priority'] = priority_filter
     if category_filter != "All":
-        tickets = [t for t in tickets if t['category'] == category_filter]
-    if assigned_filter == "Assigned":
-        tickets = [t for t in tickets if t.get('assigned_to')]
-    elif assigned_filter == "Unassigned":
-        tickets = [t for t in tickets if not t.get('assigned_to')]
-    
-    # Search
-    search_term = st.text_input("🔍 Search tickets", placeholder="Search by title, description, or employee name")
+        filters['category'] = category_filter
+    if assigned_filter != "All":
+        filters['assigned'] = assigned_filter == "Assigned"
     if search_term:
-        tickets = [t for t in tickets if 
-                  search_term.lower() in t['title'].lower() or 
-                  search_term.lower() in t['description'].lower() or 
-                  search_term.lower() in t['employee_name'].lower()]
+        filters['search'] = search_term
+    sort = {
+        "Best match": None,
+        "Oldest first": "created_date" if search_term else None,
+        "Newest first": "-created_date",
+        "Recently updated": "-updated_date"
+    }[sort_option]
+    
+    # Start from the first page whenever the filters change
+    query_key = (tuple(sorted(filters.items())), sort, page_size)
+    if st.session_state.get('manage_tickets_query') != query_key:
+        st.session_state.manage_tickets_query = query_key
+        st.session_state.manage_tickets_page = 1
+    
+    # Only the current page is loaded and rendered
+    page = st.session_state.get('manage_tickets_page', 1)
+    if explain:
+        result = st.session_state.ticket_manager.query(filters, sort, page, page_size, explain=True)
+    else:
+        result = ticket_page(data_version(), filters, sort, page, page_size)
+    st.session_state.manage_tickets_page = result['page']
+    tickets = result['tickets']
     
-    st.markdown(f"**Showing {len(tickets)} tickets**")
+    if explain:
+        st.code(result['explain'], language=None)
+    
+    if tickets:
+        first = (result['page'] - 1) * page_size + 1
+        st.markdown(f"**Showing {first}-{first + len(tickets) - 1} of {result['total']} tickets**")
+    else:
+        st.markdown("**Showing 0 tickets**")
     
     # Display tickets
     for ticket in tickets:
@@ -189,8 +219,7 @@ def manage_tickets():
                 if ticket.get('location'):
                     st.write(f"**Location:** {ticket['location']}")
                 
-                if ticket.get('attachments'):
-                    st.write(f"**Attachments:** {', '.join(ticket['attachments'])}")
+                display_attachments(ticket)
             
             with col2:
                 # Ticket management form
@@ -218,11 +247,7 @@ def manage_tickets():
                         st.rerun()
             
             # Comments section
-            comments = ticket.get('comments', [])
-            if comments:
-                st.markdown("**Comments:**")
-                for comment in comments:
-                    st.markdown(f"*{comment['author']}* ({comment['timestamp']}): {comment['comment']}")
+            display_comment_thread(ticket)
             
             # Add admin comment
             admin_comment = st.text_area(f"Add admin comment", key=f"admin_comment_{ticket['id']}")
@@ -235,27 +260,127 @@ def manage_tickets():
                     })
                     st.success("Comment added!")
                     st.rerun()
+    
+    if result['pages'] > 1:
+        st.number_input(f"Page (of {result['pages']})", min_value=1, max_value=result['pages'],
+                        key='manage_tickets_page')
 
-def display_analytics():
-    st.markdown("### Analytics & Reports")
+def display_attachments(ticket):
+    """List a ticket's attachments; file contents are only read when a download is requested"""
+    attachments = ticket.get('attachments') or []
+    if not attachments:
+        return
     
-    tickets = st.session_state.ticket_manager.get_all_tickets()
+    st.write("**Attachments:**")
+    for number, attachment in enumerate(attachments):
+        if isinstance(attachment, str):
+            st.write(f"📎 {attachment}")  # Older tickets only kept the file name
+            continue
+        
+        label = f"📎 {attachment['name']} ({format_size(attachment['size'])})"
+        url = attachment_url(attachment['sha256'])
+        key = f"attachment_{ticket['id']}_{number}"
+        if url:
+            st.markdown(f"[{label}]({url})")
+        elif st.session_state.get(key):
+            st.download_button(f"⬇️ Download {attachment['name']}",
+                               data=b''.join(st.session_state.ticket_manager.read_attachment(attachment)),
+                               file_name=attachment['name'], key=f"{key}_download")
+        elif st.button(label, key=f"{key}_prepare"):
+            st.session_state[key] = True
+            st.rerun()
+
+def display_comment_thread(ticket):
+    """Show a ticket's comments on request, newest page first, loading older pages on demand"""
+    count = ticket.get('comment_count', 0)
+    if not count:
+        return
     
-    if not tickets:
-        st.info("No tickets available for analysis")
+    # Threads are only read from the comment store once they are opened
+    if not st.checkbox(f"💬 Show comments ({count})", key=f"show_comments_{ticket['id']}"):
         return
     
-    df = pd.DataFrame(tickets)
+    shown_key = f"comments_shown_{ticket['id']}"
+    shown = min(count, st.session_state.get(shown_key, COMMENT_PAGE_SIZE))
+    if shown < count and st.button(f"Show older comments ({count - shown} more)",
+                                   key=f"older_comments_{ticket['id']}"):
+        st.session_state[shown_key] = shown + COMMENT_PAGE_SIZE
+        st.rerun()
+    
+    for comment in st.session_state.ticket_manager.get_comments(ticket['id'], count - shown, shown):
+        st.markdown(f"*{comment['author']}* ({comment['timestamp']}): {comment['comment']}")
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def analytics_figures(version, days, today):
+    """
+    Build the analytics charts at a data version
+    
+    Args:
+        version (int): Data version, the cache key
+        days (int): Only count tickets created in the last days days before
+            today, or None for all time
+        today (datetime.date): Day the period ends, so cached charts move with the date
+        
+    Returns:
+        dict: Plotly figures by chart, or None if there are no tickets at all
+    """
+    df = get_ticket_manager().get_ticket_frame()
+    
+    if df.empty:
+        return None
+    
+    import plotly.express as px
+    from utils.analytics import value_counts
+    
+    # Filter by time period
+    if days:
+        cutoff_date = datetime.combine(today, datetime.min.time()) - timedelta(days=days)
+        df = df[df['created_date'] >= cutoff_date]
+    
+    figures = {}
+    
+    # Status distribution
+    status_counts = value_counts(df, 'status')
+    figures['status'] = px.pie(values=status_counts.values, names=status_counts.index, 
+                               title="Ticket Status Distribution")
+    
+    # Priority distribution
+    priority_counts = value_counts(df, 'priority')
+    figures['priority'] = px.bar(x=priority_counts.index, y=priority_counts.values,
+                                 title="Tickets by Priority",
+                                 color=priority_counts.index,
+                                 color_discrete_map={'High': '#ff4444', 'Medium': '#ffaa00', 'Low': '#00aa00'})
+    
+    # Category distribution
+    category_counts = value_counts(df, 'category')
+    figures['category'] = px.bar(x=category_counts.values, y=category_counts.index,
+                                 orientation='h', title="Tickets by Category")
+    
+    # Department distribution
+    dept_counts = value_counts(df, 'department')
+    figures['department'] = px.pie(values=dept_counts.values, names=dept_counts.index,
+                                   title="Tickets by Department")
+    
+    # Trends
+    if len(df) > 0:
+        daily_counts = df.groupby(df['created_date'].dt.date).size().reset_index(name='count')
+        figures['trend'] = px.line(daily_counts, x='created_date', y='count',
+                                   title="Daily Ticket Creation Trend")
+    return figures
+
+@timed('page')
+def display_analytics():
+    st.markdown("### Analytics & Reports")
     
     # Time period selector
     time_period = st.selectbox("Select Time Period", ["Last 7 days", "Last 30 days", "Last 90 days", "All time"])
+    days = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "All time": None}[time_period]
     
-    # Filter by time period
-    if time_period != "All time":
-        days = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90}[time_period]
-        cutoff_date = datetime.now() - timedelta(days=days)
-        df['created_datetime'] = pd.to_datetime(df['created_date'])
-        df = df[df['created_datetime'] >= cutoff_date]
+    figures = analytics_figures(data_version(), days, datetime.now().date())
+    
+    if figures is None:
+        st.info("No tickets available for analysis")
+        return
     
     # Key metrics row
     col1, col2, col3, col4 = st.columns(4)
@@ -280,43 +405,22 @@ def display_analytics():
     col1, col2 = st.columns(2)
     
     with col1:
-        # Status distribution
-        status_counts = df['status'].value_counts()
-        fig = px.pie(values=status_counts.values, names=status_counts.index, 
-                    title="Ticket Status Distribution")
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Priority distribution
-        priority_counts = df['priority'].value_counts()
-        fig = px.bar(x=priority_counts.index, y=priority_counts.values,
-                    title="Tickets by Priority",
-                    color=priority_counts.index,
-                    color_discrete_map={'High': '#ff4444', 'Medium': '#ffaa00', 'Low': '#00aa00'})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures['status'], use_container_width=True)
+        st.plotly_chart(figures['priority'], use_container_width=True)
     
     with col2:
-        # Category distribution
-        category_counts = df['category'].value_counts()
-        fig = px.bar(x=category_counts.values, y=category_counts.index,
-                    orientation='h', title="Tickets by Category")
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Department distribution
-        dept_counts = df['department'].value_counts()
-        fig = px.pie(values=dept_counts.values, names=dept_counts.index,
-                    title="Tickets by Department")
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures['category'], use_container_width=True)
+        st.plotly_chart(figures['department'], use_container_width=True)
     
     # Trends
-    if len(df) > 0:
-        df['created_date_only'] = pd.to_datetime(df['created_date']).dt.date
-        daily_counts = df.groupby('created_date_only').size().reset_index(name='count')
-        
-        fig = px.line(daily_counts, x='created_date_only', y='count',
-                     title="Daily Ticket Creation Trend")
-        st.plotly_chart(fig, use_container_width=True)
+    if 'trend' in figures:
+        st.plotly_chart(figures['trend'], use_container_width=True)
 
+@timed('page')
 def team_management():
+    import pandas as pd
+    import plotly.express as px
+    
     st.markdown("### Team Management")
     
     # Team performance metrics
@@ -361,11 +465,13 @@ def team_management():
         if st.button("📧 Send Team Update", use_container_width=True):
             st.success("Team update notifications sent!")
 
+@timed('page')
 def admin_settings():
     st.markdown("### System Settings")
     
     # Settings tabs
-    settings_tab1, settings_tab2, settings_tab3 = st.tabs(["General", "Notifications", "Integrations"])
+    settings_tab1, settings_tab2, settings_tab3, settings_tab4, settings_tab5 = st.tabs(
+        ["General", "Notifications", "Integrations", "Backups", "Performance"])
     
     with settings_tab1:
         st.markdown("#### General Settings")
@@ -410,6 +516,11 @@ def admin_settings():
             st.markdown("**Active Directory**")
             ad_enabled = st.checkbox("Enable AD integration", value=True)
             ad_server = st.text_input("AD Server", value="ldap://company.local")
+            directory = get_directory()
+            cache_stats = directory.cache.stats()
+            st.caption(f"Active provider: {type(directory.provider).__name__} "
+                       f"(set HELPDESK_DIRECTORY_URL to use LDAP) · cache: {cache_stats['entries']} entries, "
+                       f"{cache_stats['hits']} hits, {cache_stats['misses']} misses")
             
             st.markdown("**Email Integration**")
             email_integration = st.checkbox("Enable email integration", value=True)
@@ -425,6 +536,97 @@ def admin_settings():
         
         if st.button("Save Integration Settings"):
             st.success("Integration settings saved!")
+    
+    with settings_tab4:
+        backup_settings()
+    
+    with settings_tab5:
+        performance_metrics()
+
+def backup_settings():
+    st.markdown("#### Backups")
+    st.caption("Backups only store the tickets changed since the previous one; "
+               "a full backup starts a new chain.")
+    
+    import pandas as pd
+    
+    manager = get_backup_manager(st.session_state.db)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Back up now"):
+            entry = manager.backup()
+            st.success(f"{entry['type'].title()} backup written: {entry['tickets']} tickets, "
+                       f"{format_size(entry['bytes'])}")
+    with col2:
+        if st.button("Full backup"):
+            entry = manager.backup(full=True)
+            st.success(f"Full backup written: {entry['tickets']} tickets, {format_size(entry['bytes'])}")
+    
+    backups = manager.list_backups()
+    if not backups:
+        st.info("No backups yet.")
+        return
+    
+    st.dataframe(pd.DataFrame([{
+        'Backup': b['name'],
+        'Type': b['type'],
+        'Created': b['created'],
+        'Tickets': b['tickets'],
+        'Size': format_size(b['bytes'])
+    } for b in reversed(backups)]), use_container_width=True, hide_index=True)
+    
+    restore_name = st.selectbox("Restore from", [b['name'] for b in reversed(backups)])
+    confirm = st.checkbox("I understand this replaces all current tickets and settings")
+    if st.button("Restore", disabled=not confirm):
+        count = manager.restore(restore_name)
+        st.success(f"Restored {count} tickets from {restore_name}")
+
+def performance_metrics():
+    st.markdown("#### Performance")
+    
+    if not METRICS_ENABLED:
+        st.info("Instrumentation is off. Start the app with HELPDESK_METRICS=1 to record "
+                "call counts and latencies.")
+        return
+    
+    calls = REGISTRY.summary('helpdesk_call_duration_seconds')
+    if not calls:
+        st.info("No calls recorded yet.")
+    else:
+        import pandas as pd
+        
+        calls.sort(key=lambda row: row['sum'], reverse=True)
+        st.dataframe(pd.DataFrame([{
+            'Component': row['component'],
+            'Method': row['method'],
+            'Calls': row['count'],
+            'Total (ms)': round(row['sum'] * 1000, 1),
+            'Mean (ms)': round(row['mean'] * 1000, 3),
+            'p50 (ms)': round(row['p50'] * 1000, 3),
+            'p90 (ms)': round(row['p90'] * 1000, 3),
+            'p99 (ms)': round(row['p99'] * 1000, 3)
+        } for row in calls]), use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Serialized data**")
+        for row in sorted(REGISTRY.summary('helpdesk_serialized_bytes'), key=lambda row: row['operation']):
+            st.write(f"{row['operation']}: {row['count']} writes/reads, "
+                     f"mean {format_size(row['mean'])}, total {format_size(row['sum'])}")
+    with col2:
+        st.markdown("**Storage files**")
+        for labels, size in sorted(REGISTRY.gauge_values('helpdesk_file_bytes'), key=lambda item: item[0]['file']):
+            st.write(f"{labels['file']}: {format_size(size)}")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download Prometheus metrics", REGISTRY.render(),
+                           file_name="helpdesk_metrics.prom", mime="text/plain")
+    with col2:
+        if st.button("Reset metrics"):
+            REGISTRY.reset()
+            st.rerun()
 
 def generate_report():
     st.success("📊 Generating comprehensive report... Report will be available in Downloads shortly.")
@@ -0,0 +1,86 @@
+"""
+Signed links to the attachment server and collection of unreferenced blobs
+"""
+
+import io
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils.attachment_store import AttachmentStore, attachment_url, create_server
+from utils.database import Database
+from utils.ticket_manager import TicketManager
+
+SECRET = 'attachment-secret'
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(str(tmp_path / 'attachments'))
+
+@pytest.fixture
+def server_url(store, monkeypatch):
+    server = create_server(store, SECRET, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv('HELPDESK_ATTACHMENT_URL', url)
+    monkeypatch.setenv('HELPDESK_ATTACHMENT_SECRET', SECRET)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+def fetch(url, **headers):
+    """Status and body of a GET, including error responses"""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, b''
+
+def test_signed_link(store, server_url):
+    sha256 = store.put(io.BytesIO(b'0123456789'), 'a.txt')['sha256']
+    url = attachment_url(sha256)
+    assert fetch(url) == (200, b'0123456789')
+    assert fetch(url, Range='bytes=2-4') == (206, b'234')
+
+def test_unsigned_links_are_refused(store, server_url, monkeypatch):
+    sha256 = store.put(io.BytesIO(b'secret report'), 'a.txt')['sha256']
+    other = store.put(io.BytesIO(b'other report'), 'b.txt')['sha256']
+    assert fetch(f"{server_url}/{sha256}")[0] == 403
+    # A signature only opens the blob it was made for
+    assert fetch(attachment_url(other).replace(other, sha256))[0] == 403
+    monkeypatch.setattr(time, 'time', lambda: 0)
+    expired = attachment_url(sha256)
+    monkeypatch.undo()
+    assert fetch(expired)[0] == 403
+
+def test_server_needs_secret(store):
+    with pytest.raises(ValueError):
+        create_server(store, None, port=0)
+
+def test_collect_unreferenced_attachments(tmp_path, store):
+    db = Database(str(tmp_path / 'helpdesk_data.json'), storage_mode='json')
+    manager = TicketManager(db, store)
+    ticket_data = dict(db.get_tickets()[0])
+    kept = manager.store_attachment(io.BytesIO(b'kept'), 'kept.txt')
+    orphan = manager.store_attachment(io.BytesIO(b'orphan'), 'orphan.txt')
+    manager.create_ticket(dict(ticket_data, attachments=[kept]))
+    try:
+        # Files of a submission that may still be in progress are kept
+        assert manager.collect_attachments() == 0
+        assert manager.collect_attachments(grace=0) == 1
+        assert store.exists(kept['sha256'])
+        assert not store.exists(orphan['sha256'])
+    finally:
+        db.close()
+
+def test_upload_again_restarts_grace(store):
+    sha256 = store.put(io.BytesIO(b'again'), 'a.txt')['sha256']
+    os.utime(store.blob_path(sha256), (0, 0))
+    store.put(io.BytesIO(b'again'), 'a.txt')
+    assert store.collect_garbage(set(), grace=3600) == 0
+    assert store.exists(sha256)
@@ -0,0 +1,61 @@
+"""
+Torn comment lines are left alone on open and repaired before the next append
+"""
+
+import json
+
+from utils.comment_store import CommentStore
+from utils.database import Database
+from utils.ticket_manager import TicketManager
+
+COMMENT = {'author': 'IT Support', 'comment': 'Looking into it', 'timestamp': '2025-06-21 10:00:00'}
+
+def comment_line(ticket_id, comment):
+    return (json.dumps({'ticket_id': ticket_id, 'comment': comment}) + '\n').encode('utf-8')
+
+def test_scan_leaves_torn_line(tmp_path):
+    path = tmp_path / 'd.comments.jsonl'
+    contents = comment_line('0001', COMMENT) + b'{"ticket_id": "0001", "comm'
+    path.write_bytes(contents)
+    store = CommentStore(str(path))
+    assert list(store.scan()) == [('0001', COMMENT)]
+    assert path.read_bytes() == contents
+
+    store.append('0002', COMMENT)
+    store.close()
+    assert path.read_bytes() == comment_line('0001', COMMENT) + comment_line('0002', COMMENT)
+    assert store.get('0002') == [COMMENT]
+
+def test_append_keeps_lines_of_other_writers(tmp_path):
+    path = str(tmp_path / 'd.comments.jsonl')
+    ours = CommentStore(path)
+    other = CommentStore(path)
+    list(ours.scan())
+    list(other.scan())
+    other.append('0001', dict(COMMENT, comment='From the other process'))
+    other.close()
+    ours.append('0001', COMMENT)
+    ours.close()
+    assert [c['comment'] for c in ours.get('0001')] == ['From the other process', 'Looking into it']
+
+def test_opening_database_does_not_repair(tmp_path):
+    db = Database(str(tmp_path / 'helpdesk_data.json'), storage_mode='log')
+    ticket_id = db.get_tickets()[0]['id']
+    TicketManager(db).add_comment(ticket_id, COMMENT)
+    db.close()
+    path = tmp_path / 'helpdesk_data.comments.jsonl'
+    with open(path, 'ab') as f:
+        f.write(b'{"ticket_id": "')
+    contents = path.read_bytes()
+
+    db = Database(str(tmp_path / 'helpdesk_data.json'), storage_mode='log')
+    assert db.get_comments(ticket_id) == [COMMENT]
+    db.refresh()
+    assert path.read_bytes() == contents
+
+    TicketManager(db).add_comment(ticket_id, dict(COMMENT, comment='Fixed'))
+    db.close()
+    assert path.read_bytes().endswith(b'"Fixed", "timestamp": "2025-06-21 10:00:00"}}\n')
+    reopened = Database(str(tmp_path / 'helpdesk_data.json'), storage_mode='log')
+    assert [c['comment'] for c in reopened.get_comments(ticket_id)] == ['Looking into it', 'Fixed']
+    reopened.close()
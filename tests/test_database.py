@@ -0,0 +1,160 @@
+"""
+Opening data files, moving embedded comments and migrating to SQLite
+"""
+
+import hashlib
+import itertools
+import json
+import os
+
+import pytest
+
+from utils.database import Database, default_data
+from utils.sqlite_database import SQLiteDatabase, migrate_json_to_sqlite
+from utils.ticket_manager import TicketManager
+
+def legacy_data():
+    """Data file contents from before the comment store, with comments embedded in tickets"""
+    data = default_data()
+    for ticket in data['tickets']:
+        ticket.pop('comment_count', None)
+        ticket.pop('last_comment_date', None)
+        ticket['comments'] = [
+            {'author': 'IT Support', 'comment': f"Looking into {ticket['id']}", 'timestamp': '2025-06-21 10:00:00'},
+            {'author': ticket['employee_name'], 'comment': 'Thanks', 'timestamp': '2025-06-21 11:00:00'}
+        ]
+    return data
+
+def file_digests(directory):
+    """SHA-256 of every file in a directory, by name"""
+    return {name: hashlib.sha256((directory / name).read_bytes()).hexdigest()
+            for name in os.listdir(directory) if (directory / name).is_file()}
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    path = tmp_path / 'helpdesk_data.json'
+    path.write_text(json.dumps(legacy_data()))
+    return path
+
+@pytest.mark.parametrize('storage_mode', ['json', 'log'])
+def test_open_only_reads(legacy_file, storage_mode):
+    before = file_digests(legacy_file.parent)
+    db = Database(str(legacy_file), storage_mode=storage_mode)
+    ticket_id = legacy_data()['tickets'][0]['id']
+    assert [c['comment'] for c in db.get_comments(ticket_id)] == [f"Looking into {ticket_id}", 'Thanks']
+    assert db.get_comments(ticket_id, offset=1) == [legacy_data()['tickets'][0]['comments'][1]]
+    assert db.get_ticket(ticket_id)['comment_count'] == 2
+    assert [len(t['comments']) for t in db.export_tickets()] == [2] * len(legacy_data()['tickets'])
+    db.close()
+    assert file_digests(legacy_file.parent) == before
+
+@pytest.mark.parametrize('storage_mode', ['json', 'log'])
+def test_first_write_moves_comments(legacy_file, storage_mode):
+    db = Database(str(legacy_file), storage_mode=storage_mode)
+    manager = TicketManager(db)
+    ticket_id = legacy_data()['tickets'][0]['id']
+    manager.add_comment(ticket_id, {'author': 'IT Support', 'comment': 'Fixed', 'timestamp': '2025-06-22 09:00:00'})
+    db.close()
+
+    assert all('comments' not in t for t in json.loads(legacy_file.read_text())['tickets'])
+    reopened = Database(str(legacy_file), storage_mode=storage_mode)
+    assert [c['comment'] for c in reopened.get_comments(ticket_id)] == [f"Looking into {ticket_id}", 'Thanks', 'Fixed']
+    assert reopened.get_ticket(ticket_id)['comment_count'] == 3
+    assert reopened.get_statistics()['total_comments'] == 2 * len(legacy_data()['tickets']) + 1
+    reopened.close()
+
+def test_migrate_comments(legacy_file):
+    db = Database(str(legacy_file), storage_mode='json')
+    assert db.migrate_comments()
+    db.close()
+    assert all('comments' not in t for t in json.loads(legacy_file.read_text())['tickets'])
+    assert (legacy_file.parent / 'helpdesk_data.comments.jsonl').exists()
+
+def test_migrate_to_sqlite_leaves_source_untouched(legacy_file, tmp_path):
+    # A log-mode source with a pending log on top of the legacy snapshot
+    db = Database(str(legacy_file), storage_mode='log', compact_threshold=1000)
+    db.migrate_comments()
+    manager = TicketManager(db)
+    ticket_id = legacy_data()['tickets'][1]['id']
+    manager.add_comment(ticket_id, {'author': 'IT Support', 'comment': 'Logged', 'timestamp': '2025-06-22 09:00:00'})
+    expected = db.export_tickets()
+    db.close()
+    assert (tmp_path / 'helpdesk_data.log').exists()
+
+    (tmp_path / 'out').mkdir()
+    before = file_digests(tmp_path)
+    assert migrate_json_to_sqlite(str(legacy_file), str(tmp_path / 'out' / 'helpdesk_data.db')) == len(expected)
+    assert file_digests(tmp_path) == before
+
+    target = SQLiteDatabase(str(tmp_path / 'out' / 'helpdesk_data.db'), seed=False)
+    try:
+        assert [t['id'] for t in target.get_tickets()] == [t['id'] for t in expected]
+        for ticket in expected:
+            assert target.get_comments(ticket['id']) == ticket['comments']
+    finally:
+        target.close()
+
+def test_backup_while_file_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = Database(str(tmp_path / 'helpdesk_data.json'), storage_mode='json')
+    # Every refresh sees the file as changed by another process and reloads it
+    signatures = itertools.count()
+    monkeypatch.setattr(db, 'current_signature', lambda: next(signatures))
+    backup = db.backup_data()
+    db.close()
+    assert backup is not None
+    with open(backup) as f:
+        assert [t['id'] for t in json.load(f)['tickets']] == [t['id'] for t in default_data()['tickets']]
+
+def compacted_file(tmp_path):
+    """A log-mode data file with its comments moved and no pending log"""
+    path = str(tmp_path / 'helpdesk_data.json')
+    db = Database(path, storage_mode='log')
+    db.migrate_comments()
+    db.close()
+    return path
+
+def test_compaction_keeps_other_writers_records(tmp_path, monkeypatch):
+    path = compacted_file(tmp_path)
+    first = Database(path, storage_mode='log', compact_threshold=3)
+    second = Database(path, storage_mode='log')
+    late = Database(path, storage_mode='log', durability='shutdown')
+    for db in (first, second, late):
+        # Every write lands between the others' refreshes
+        monkeypatch.setattr(db, 'refresh', lambda: None)
+    ids = [t['id'] for t in first.get_tickets()]
+
+    TicketManager(second).update_ticket(ids[0], {'resolution': 'second, before compaction'})
+    # Not yet flushed when the log is compacted
+    TicketManager(late).update_ticket(ids[1], {'resolution': 'late'})
+    for n in range(3):
+        TicketManager(first).update_ticket(ids[2], {'resolution': f"first {n}"})
+    assert first.log_records == 0
+    assert not os.path.exists(path.replace('.json', '.log.compacting'))
+    TicketManager(second).update_ticket(ids[3], {'resolution': 'second, after compaction'})
+    for db in (first, second, late):
+        db.close()
+
+    reopened = Database(path, storage_mode='log')
+    try:
+        assert [reopened.get_ticket(i)['resolution'] for i in ids[:4]] == [
+            'second, before compaction', 'late', 'first 2', 'second, after compaction']
+    finally:
+        reopened.close()
+
+def test_unfinished_compaction_is_replayed(tmp_path):
+    path = compacted_file(tmp_path)
+    db = Database(path, storage_mode='log')
+    ticket_id = db.get_tickets()[0]['id']
+    TicketManager(db).update_ticket(ticket_id, {'resolution': 'Logged'})
+    db.close()
+    # As if a compaction crashed after moving the log aside
+    os.replace(path.replace('.json', '.log'), path.replace('.json', '.log.compacting'))
+    db = Database(path, storage_mode='log', compact_threshold=1)
+    assert db.get_ticket(ticket_id)['resolution'] == 'Logged'
+    TicketManager(db).update_ticket(ticket_id, {'status': 'Resolved'})
+    db.close()
+    assert not os.path.exists(path.replace('.json', '.log.compacting'))
+    reopened = Database(path, storage_mode='log')
+    assert (reopened.get_ticket(ticket_id)['resolution'], reopened.get_ticket(ticket_id)['status']) == ('Logged', 'Resolved')
+    reopened.close()
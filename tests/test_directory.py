@@ -0,0 +1,74 @@
+"""
+Org graph caching in CachedDirectory
+"""
+
+import threading
+import time
+
+import pytest
+
+from benchmarks.generator import generate_employees
+from utils.directory import CachedDirectory, DirectoryCache, DirectoryProvider
+
+TTL = 0.05
+
+
+class SlowDirectory(DirectoryProvider):
+    """Directory whose full reads block until released, and can be made to fail"""
+
+    def __init__(self, employees):
+        self.employees = employees
+        self.reads = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+    def get_all_employees(self):
+        self.release.wait(5)
+        self.reads += 1
+        if self.fail:
+            raise ConnectionError('directory unavailable')
+        return list(self.employees)
+
+
+@pytest.fixture
+def provider():
+    return SlowDirectory(generate_employees(50, seed=3))
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+def test_org_graph_built_once(provider):
+    directory = CachedDirectory(provider, DirectoryCache(ttl=60))
+    org = directory.get_org_graph()
+    assert len(org) == 50
+    assert all(directory.get_org_graph() is org for _ in range(10))
+    assert provider.reads == 1
+
+def test_expired_org_graph_refreshes_in_background(provider):
+    directory = CachedDirectory(provider, DirectoryCache(ttl=TTL))
+    org = directory.get_org_graph()
+    time.sleep(TTL)
+    provider.release.clear()
+    # The caller gets the current graph at once while the rebuild waits on the directory
+    assert directory.get_org_graph() is org
+    assert directory.get_org_graph() is org
+    assert directory.org_generation == 1
+    provider.release.set()
+    wait_for(lambda: directory.org_generation == 2)
+    assert directory.get_org_graph() is not org
+    assert provider.reads == 2
+
+def test_failed_refresh_keeps_org_graph(provider):
+    directory = CachedDirectory(provider, DirectoryCache(ttl=TTL, negative_ttl=60))
+    org = directory.get_org_graph()
+    time.sleep(TTL)
+    provider.fail = True
+    assert directory.get_org_graph() is org
+    wait_for(lambda: not directory.org_refreshing)
+    # The next attempt waits for negative_ttl
+    assert directory.get_org_graph() is org
+    assert provider.reads == 2
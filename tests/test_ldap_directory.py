@@ -0,0 +1,152 @@
+"""
+LDAPDirectory against the in-process LDAPStandInServer
+"""
+
+import pytest
+
+from benchmarks.generator import generate_employees
+from utils.ldap_directory import (BATCH_SIZE, INVALID_CREDENTIALS, SIZE_LIMIT_EXCEEDED, LDAPDirectory,
+                                  LDAPError, LDAPStandInServer, escape_dn_value, to_employee)
+from utils.mock_ad import MockActiveDirectory
+
+BASE_DN = 'OU=People,DC=company,DC=local'
+BIND_DN = 'CN=helpdesk,OU=Service,DC=company,DC=local'
+PASSWORD = 'secret'
+
+@pytest.fixture(scope='module')
+def employees():
+    return generate_employees(250, seed=7)
+
+@pytest.fixture
+def serve(employees):
+    """Start stand-in servers with the given options; they are shut down after the test"""
+    servers = []
+    directories = []
+
+    def start(**options):
+        server = LDAPStandInServer(employees, base_dn=BASE_DN, bind_dn=BIND_DN, password=PASSWORD, **options)
+        servers.append(server.start())
+        directory = LDAPDirectory(server.url, BASE_DN, BIND_DN, PASSWORD, pool_size=2, timeout=5)
+        directories.append(directory)
+        return server, directory
+
+    yield start
+    for directory in directories:
+        directory.close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_bind_failure(serve):
+    server, _ = serve()
+    directory = LDAPDirectory(server.url, BASE_DN, BIND_DN, 'wrong', timeout=5)
+    with pytest.raises(LDAPError) as error:
+        directory.get_employee('EMP000001')
+    assert error.value.result_code == INVALID_CREDENTIALS
+    directory.close()
+
+def test_get_employee_exact(serve, employees):
+    _, directory = serve()
+    employee = employees[42]
+    assert directory.get_employee(employee['employee_id']) == employee_fields(employee)
+    assert directory.get_employee(employee['email']) == employee_fields(employee)
+    assert directory.get_employee(employee['employee_id'].lower())['employee_id'] == employee['employee_id']
+
+def test_get_employee_partial(serve, employees):
+    _, directory = serve()
+    mock = MockActiveDirectory(employees)
+    for query in (employees[10]['name'], employees[10]['name'][:-2], employees[99]['email'].split('@')[0]):
+        assert directory.get_employee(query)['employee_id'] == mock.get_employee(query)['employee_id']
+    assert directory.get_employee('no such person') is None
+
+def test_get_employees_batched(serve, employees):
+    server, directory = serve()
+    ids = [employee['employee_id'] for employee in employees] + ['EMP999999']
+    before = server.searches
+    found = directory.get_employees(ids)
+    assert set(found) == {employee['employee_id'] for employee in employees}
+    assert server.searches - before == -(-len(ids) // BATCH_SIZE)
+
+def test_search_limit(serve, employees):
+    _, directory = serve()
+    mock = MockActiveDirectory(employees)
+    for query in ('marketing', 'company.com'):
+        found = directory.search_employees(query, limit=5)
+        assert len(found) == 5
+        assert all(any(query in employee[field].lower() for field in ('name', 'email', 'department', 'title'))
+                   for employee in found)
+    # Selective queries rank like the mock directory
+    query = employees[7]['name']
+    assert ([e['employee_id'] for e in directory.search_employees(query, limit=3)]
+            == [e['employee_id'] for e in mock.search_employees(query, 3)])
+
+def test_server_size_limit_is_paged_through(serve, employees):
+    server, directory = serve(size_limit=40)
+    before = server.searches
+    assert len(directory.get_all_employees()) == len(employees)
+    assert server.searches - before == -(-len(employees) // 40)
+
+def test_server_size_limit_without_paging_raises(serve):
+    _, directory = serve(size_limit=40, paging=False)
+    with pytest.raises(LDAPError) as error:
+        directory.get_all_employees()
+    assert error.value.result_code == SIZE_LIMIT_EXCEEDED
+    # A search asking for fewer entries than the server's limit is complete
+    assert directory.get_employee('EMP000001')['employee_id'] == 'EMP000001'
+    assert len(directory.search_employees('company.com', limit=5)) == 5
+
+def test_client_size_limit_across_pages(serve):
+    _, directory = serve(size_limit=3)
+    with directory.pool.connection() as conn:
+        entries = conn.search(BASE_DN, ('present', 'employeeID'), ['employeeID'], size_limit=10, page_size=4)
+        assert len(entries) == 10
+        # The connection stays usable after the rest of the search is abandoned
+        assert len(conn.search(BASE_DN, ('eq', 'employeeID', 'EMP000002'), ['employeeID'])) == 1
+
+def test_retry_after_stale_connection(serve):
+    server, directory = serve()
+    directory.get_employee('EMP000001')
+    # Simulate the server dropping the idle pooled connection
+    stale = directory.pool.idle.get_nowait()
+    stale.sock.shutdown(2)
+    directory.pool.idle.put(stale)
+    before = server.searches
+    assert directory.get_employee('EMP000003')['employee_id'] == 'EMP000003'
+    assert server.searches - before == 1
+
+def test_interrupted_request_closes_connection(serve):
+    _, directory = serve()
+    pool = directory.pool
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError('bad response')
+    assert conn.sock.fileno() == -1 and pool.idle.empty()
+
+    # A generator abandoned while it holds a connection
+    borrowed = pool.connection()
+    conn = borrowed.__enter__()
+    borrowed.gen.close()
+    assert conn.sock.fileno() == -1 and pool.idle.empty()
+    # Both slots were released
+    assert [pool.slots.acquire(blocking=False) for _ in range(3)] == [True, True, False]
+    pool.slots.release()
+    pool.slots.release()
+    assert directory.get_employee('EMP000001')['employee_id'] == 'EMP000001'
+
+@pytest.mark.parametrize('dn, name', [
+    ('CN=Doe\\, Jane,OU=People,DC=company,DC=local', 'Doe, Jane'),
+    ('CN=M\\C3\\BCller\\2C Anna,OU=People,DC=company,DC=local', 'M\u00fcller, Anna'),
+    ('CN=Jane Doe,OU=People,DC=company,DC=local', 'Jane Doe'),
+    ('Jane Doe', 'Jane Doe'),
+])
+def test_manager_dn(dn, name):
+    assert to_employee({'manager': [dn]})['manager'] == name
+
+def test_escape_dn_value():
+    for name in ('Doe, Jane', ' Leading and trailing ', '#1 Admin', 'Back\\slash + "quotes"'):
+        assert to_employee({'manager': [f"CN={escape_dn_value(name)},OU=People"]})['manager'] == name
+
+def employee_fields(employee):
+    """The fields an LDAP entry carries for an employee record"""
+    return {field: employee.get(field, '') for field in
+            ('employee_id', 'name', 'email', 'department', 'phone', 'manager', 'location', 'title')}
@@ -0,0 +1,32 @@
+"""
+Reporting lines with ambiguous and cyclic manager references
+"""
+
+from utils.org_graph import OrgGraph
+
+def employee(employee_id, manager, department='IT'):
+    return {'employee_id': employee_id, 'name': employee_id, 'manager': manager, 'department': department}
+
+def test_cycle_is_cut_at_first_member():
+    org = OrgGraph([employee('A', 'B'), employee('B', 'A')])
+    assert org.roots == ['A']
+    assert org.manager('B') == 'A'
+    assert org.descendants('A') == ['B']
+
+def test_employee_below_cycle_keeps_manager():
+    # C reports into the A <-> B cycle without being on it
+    org = OrgGraph([employee('C', 'A'), employee('A', 'B'), employee('B', 'A')])
+    assert org.manager_of == {'C': 'A', 'A': None, 'B': 'A'}
+    assert org.roots == ['A']
+    assert set(org.descendants('A')) == {'B', 'C'}
+    assert org.org_size('A') == 2
+    assert org.ancestors('C') == ['A']
+
+def test_chain_into_cycle_and_separate_tree():
+    org = OrgGraph([employee('D', 'C'), employee('C', 'B'), employee('X', 'CEO'),
+                    employee('B', 'A'), employee('A', 'B'), employee('Y', 'X')])
+    assert org.manager('B') is None
+    assert org.ancestors('D') == ['C', 'B']
+    assert org.descendants('B') == ['C', 'D', 'A']
+    assert org.descendants('X') == ['Y']
+    assert len(org.order) == len(org) == 6
@@ -0,0 +1,49 @@
+"""
+Prefix search over the ticket index, in both storage backends
+"""
+
+import pytest
+
+from utils.database import Database
+from utils.search_index import SearchIndex
+from utils.sqlite_database import SQLiteDatabase
+from utils.ticket_manager import TicketManager
+
+# More terms sharing a prefix than a capped expansion would keep
+PREFIXED_TERMS = 250
+
+def prefixed_ticket(i):
+    return {
+        'title': f"Scanner error code{i:03d}",
+        'description': "The scanner stops with an error",
+        'category': 'Hardware',
+        'priority': 'Low',
+        'employee_id': 'EMP001',
+        'employee_name': 'John Doe',
+        'employee_email': 'john.doe@company.com',
+        'department': 'Information Technology',
+        'urgency': 'Low'
+    }
+
+def test_expand_keeps_every_prefixed_term():
+    index = SearchIndex()
+    index.rebuild({'id': str(i), 'title': f"code{i:03d}"} for i in range(PREFIXED_TERMS))
+    assert len(index.expand('code')) == PREFIXED_TERMS
+    assert len(index.search('cod')) == PREFIXED_TERMS
+    assert index.search('code249') == ['249']
+
+@pytest.mark.parametrize('backend', ['log', 'sqlite'])
+def test_short_prefix_finds_every_ticket(tmp_path, backend):
+    if backend == 'sqlite':
+        db = SQLiteDatabase(str(tmp_path / 'helpdesk.db'), seed=False)
+    else:
+        db = Database(str(tmp_path / 'helpdesk.json'), storage_mode='log')
+        db.clear_all_data()
+    manager = TicketManager(db)
+    ids = {manager.create_ticket(prefixed_ticket(i)) for i in range(PREFIXED_TERMS)}
+    try:
+        assert {ticket['id'] for ticket in manager.search_tickets('code')} == ids
+        assert {ticket['id'] for ticket in manager.search_tickets('scanner co')} == ids
+        assert len(manager.search_tickets('code1')) == 100
+    finally:
+        db.close()
@@ -0,0 +1,42 @@
+"""
+Query validation and explain output of TicketManager.query
+"""
+
+import pytest
+
+from utils.database import Database
+from utils.sqlite_database import SQLiteDatabase
+from utils.ticket_manager import TicketManager
+
+@pytest.fixture(params=['log', 'sqlite'])
+def manager(request, tmp_path):
+    if request.param == 'sqlite':
+        db = SQLiteDatabase(str(tmp_path / 'helpdesk.db'))
+    else:
+        db = Database(str(tmp_path / 'helpdesk.json'), storage_mode='log')
+    yield TicketManager(db)
+    db.close()
+
+def test_unknown_filter_is_rejected(manager):
+    with pytest.raises(ValueError, match="Cannot filter tickets by colour"):
+        manager.query({'status': 'Open', 'colour': 'red'})
+    with pytest.raises(ValueError):
+        manager.query({'colour': 'red'}, explain=True)
+
+def test_explain_describes_returned_page(manager, monkeypatch):
+    runs = []
+    find_page = manager.db.find_page
+
+    def recording_find_page(steps, sort, offset, limit, trace=None):
+        tickets, total = find_page(steps, sort, offset, limit, trace)
+        runs.append((offset, trace, len(tickets)))
+        return tickets, total
+
+    monkeypatch.setattr(manager.db, 'find_page', recording_find_page)
+    result = manager.query({'status': 'Open'}, page=99, page_size=1, explain=True)
+    assert result['page'] == result['pages'] == result['total']
+    assert len(runs) == 2
+    offset, trace, returned = runs[-1]
+    assert offset == result['page'] - 1 and returned == 1
+    assert trace is not None and trace is not runs[0][1]
+    assert f"page {result['page']} of {result['pages']}" in result['explain']
@@ -0,0 +1,44 @@
+"""
+Date fields of ticket records that are not valid dates
+"""
+
+import json
+
+import pytest
+
+from utils.database import Database, default_data
+from utils.ticket_manager import TicketManager
+from utils.ticket_record import TicketRecord, ticket_epoch
+from utils.timestamps import is_date, to_epoch
+
+INVALID_DATES = ['2025-02-30 10:00:00', '2025-06-21 24:00:00', '2025-06-21 29:59:59', '2025-13-01 00:00:00']
+
+@pytest.mark.parametrize('value', INVALID_DATES)
+def test_invalid_dates_are_kept_as_strings(value):
+    assert not is_date(value)
+    with pytest.raises(ValueError):
+        to_epoch(value)
+    record = TicketRecord(id='0001', created_date=value)
+    assert record['created_date'] == value
+    assert record.epoch('created_date') is None
+    assert ticket_epoch({'created_date': value}, 'created_date') is None
+
+def test_valid_dates_are_stored_as_epoch():
+    record = TicketRecord(id='0001', created_date='2024-02-29 23:59:59')
+    assert record.epoch('created_date') == to_epoch('2024-02-29 23:59:59')
+    assert record['created_date'] == '2024-02-29 23:59:59'
+
+@pytest.mark.parametrize('storage_mode', ['json', 'log'])
+def test_database_loads_invalid_date(tmp_path, storage_mode):
+    data = default_data()
+    data['tickets'][0]['created_date'] = '2025-02-30 10:00:00'
+    path = tmp_path / 'helpdesk_data.json'
+    path.write_text(json.dumps(data))
+    db = Database(str(path), storage_mode=storage_mode)
+    try:
+        ticket_id = data['tickets'][0]['id']
+        assert db.get_ticket(ticket_id)['created_date'] == '2025-02-30 10:00:00'
+        assert TicketManager(db).update_ticket(ticket_id, {'last_comment_date': '2025-06-21 24:00:00'})
+        assert db.get_ticket(ticket_id)['last_comment_date'] == '2025-06-21 24:00:00'
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+"""
+Cached columnar snapshot of tickets for the analytics views
+The snapshot is a typed pandas DataFrame that is only patched with the tickets
+changed since it was built, instead of being rebuilt from dicts on every rerun
+"""
+
+import threading
+import weakref
+
+import pandas as pd
+
+from utils.ticket_record import ticket_epoch
+
+# Snapshot columns by type; the frame is indexed by ticket id
+TEXT_COLUMNS = ('title', 'employee_id', 'employee_name', 'assigned_to')
+CATEGORICAL_COLUMNS = ('status', 'priority', 'urgency', 'category', 'department')
+DATETIME_COLUMNS = ('created_date', 'updated_date')
+
+def build_frame(tickets):
+    """
+    Build a typed DataFrame from ticket dicts
+
+    Args:
+        tickets (list): Tickets
+
+    Returns:
+        pandas.DataFrame: One row per ticket, indexed by id
+    """
+    columns = {'id': [t['id'] for t in tickets]}
+    for column in TEXT_COLUMNS + CATEGORICAL_COLUMNS:
+        columns[column] = [t.get(column) for t in tickets]
+    # Dates come as epoch seconds, so nothing is parsed or formatted
+    for column in DATETIME_COLUMNS:
+        columns[column] = [ticket_epoch(t, column) for t in tickets]
+
+    frame = pd.DataFrame(columns).set_index('id')
+    for column in CATEGORICAL_COLUMNS:
+        frame[column] = frame[column].astype('category')
+    for column in DATETIME_COLUMNS:
+        frame[column] = pd.to_datetime(frame[column], unit='s', errors='coerce')
+    return frame
+
+def upsert_rows(frame, changed_ids, updates):
+    """
+    Replace the rows of changed tickets
+
+    Args:
+        frame (pandas.DataFrame): Current snapshot
+        changed_ids (set): Ids of changed tickets, including deleted ones
+        updates (pandas.DataFrame): Current rows of the changed tickets that still exist
+
+    Returns:
+        pandas.DataFrame: New snapshot; the input frame is not modified
+    """
+    kept = frame[~frame.index.isin(list(changed_ids))]
+
+    # Concatenating categoricals only keeps the dtype when categories match
+    categories = {
+        column: kept[column].cat.categories.union(updates[column].cat.categories)
+        for column in CATEGORICAL_COLUMNS
+    }
+    kept = kept.assign(**{c: kept[c].cat.set_categories(categories[c]) for c in CATEGORICAL_COLUMNS})
+    updates = updates.assign(**{c: updates[c].cat.set_categories(categories[c]) for c in CATEGORICAL_COLUMNS})
+    return pd.concat([kept, updates])
+
+def value_counts(frame, column):
+    """Counts of the values present in a column, largest first, without empty categories"""
+    counts = frame[column].value_counts()
+    return counts[counts > 0]
+
+
+class TicketFrame:
+    """Snapshot of a database's tickets, refreshed when its data version changes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.frame = None
+
+    def get(self, db):
+        """
+        Get the current snapshot
+
+        Args:
+            db: Database the snapshot belongs to
+
+        Returns:
+            pandas.DataFrame: Tickets indexed by id. Shared between callers, treat as read-only.
+        """
+        if db.get_version() == self.version:
+            return self.frame
+
+        with self.lock:
+            version = db.get_version()
+            if version == self.version:
+                return self.frame
+
+            changed = None if self.frame is None else db.changes_since(self.version)
+            if changed is None:
+                frame = build_frame(db.get_tickets())
+            elif changed:
+                tickets = [db.get_ticket(ticket_id) for ticket_id in changed]
+                frame = upsert_rows(self.frame, changed, build_frame([t for t in tickets if t is not None]))
+            else:
+                frame = self.frame
+
+            self.frame = frame
+            self.version = version
+            return frame
+
+
+_ticket_frames = weakref.WeakKeyDictionary()
+_ticket_frames_lock = threading.Lock()
+
+def get_ticket_frame(db):
+    """
+    Get the cached ticket snapshot for a database
+
+    Args:
+        db: Database or SQLiteDatabase
+
+    Returns:
+        pandas.DataFrame: Tickets indexed by id. Treat as read-only.
+    """
+    with _ticket_frames_lock:
+        ticket_frame = _ticket_frames.get(db)
+        if ticket_frame is None:
+            ticket_frame = _ticket_frames[db] = TicketFrame()
+    return ticket_frame.get(db)
@@ -0,0 +1,341 @@
+"""
+Content-addressable store for ticket attachments
+Files are stored once per distinct content, under their SHA-256 digest, and
+tickets reference them as {'name', 'sha256', 'size'}
+
+Run `python -m utils.attachment_store --port 8503` to serve blobs over HTTP
+with Range support; set HELPDESK_ATTACHMENT_URL to that address and the
+pages will link to it instead of embedding the bytes in download buttons.
+The server only answers links signed with HELPDESK_ATTACHMENT_SECRET, which
+the app and the server share; the pages sign a link only for a ticket that
+the viewer may see, and it expires after an hour or two.
+
+Blobs are stored before the ticket that references them is created, so a
+failed submission leaves them behind. Run
+`python -m utils.attachment_store --collect-garbage` to remove blobs that no
+ticket references.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import re
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+
+# Bytes read from an upload or a blob at a time
+CHUNK_SIZE = 64 * 1024
+
+# Signed links are valid for between one and two of these, in seconds
+LINK_TTL = 3600
+
+# Unreferenced blobs younger than this are kept, as their ticket may still be being created
+ORPHAN_GRACE_S = 24 * 3600
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+logger = logging.getLogger(__name__)
+
+def format_size(size):
+    """Human-readable file size"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def link_signature(sha256, expires, secret):
+    """HMAC-SHA256 of a blob digest and an expiry time"""
+    return hmac.new(secret.encode(), f"{sha256}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+def attachment_url(sha256):
+    """
+    Signed URL of a blob on the attachment server
+
+    Only call this for attachments of a ticket the viewer may see. The expiry
+    is rounded to LINK_TTL so the URL stays the same across reruns.
+
+    Returns:
+        str: URL, or None unless HELPDESK_ATTACHMENT_URL and HELPDESK_ATTACHMENT_SECRET are set
+    """
+    base_url = os.environ.get('HELPDESK_ATTACHMENT_URL')
+    secret = os.environ.get('HELPDESK_ATTACHMENT_SECRET')
+    if not base_url or not secret:
+        return None
+    expires = (int(time.time()) // LINK_TTL + 2) * LINK_TTL
+    query = urlencode({'expires': expires, 'signature': link_signature(sha256, expires, secret)})
+    return f"{base_url.rstrip('/')}/{sha256}?{query}"
+
+def parse_range(header, size):
+    """
+    Parse a single-range HTTP Range header
+
+    Args:
+        header (str): Header value such as 'bytes=0-99', 'bytes=100-' or 'bytes=-100'
+        size (int): Size of the blob
+
+    Returns:
+        tuple: (start, end) with end exclusive, or None if the range is not satisfiable
+
+    Raises:
+        ValueError: If the header is malformed or asks for several ranges
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        raise ValueError(f"Unsupported range: {header}")
+
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        end = size if last == '' else min(int(last) + 1, size)
+    if start >= end:
+        return None
+    return start, end
+
+
+class AttachmentStore:
+    """
+    Blobs on disk, named by the SHA-256 of their content
+
+    Uploads are streamed to a temporary file in chunks while being hashed,
+    then renamed into place, so identical files are stored once and a blob
+    is never visible half-written.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get('HELPDESK_ATTACHMENT_DIR', 'helpdesk_attachments')
+
+    def blob_path(self, sha256):
+        """Path of a blob; blobs are spread over subdirectories by digest prefix"""
+        if not DIGEST_PATTERN.match(sha256 or ''):
+            raise ValueError(f"Invalid attachment digest: {sha256}")
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def put(self, stream, name):
+        """
+        Store the contents of a binary stream
+
+        Args:
+            stream: Readable binary file object, read in chunks
+            name (str): File name to record in the reference
+
+        Returns:
+            dict: Attachment reference with 'name', 'sha256' and 'size'
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(prefix='.upload_', suffix='.tmp', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+            sha256 = digest.hexdigest()
+            path = self.blob_path(sha256)
+            if os.path.exists(path):
+                os.remove(temp_path)  # Already stored
+                os.utime(path)  # Restarts the garbage collection grace period
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        return {'name': name, 'sha256': sha256, 'size': size}
+
+    def exists(self, sha256):
+        """Whether a blob is stored"""
+        return os.path.exists(self.blob_path(sha256))
+
+    def size(self, sha256):
+        """Size of a stored blob in bytes"""
+        return os.path.getsize(self.blob_path(sha256))
+
+    def read_range(self, sha256, start=0, end=None):
+        """
+        Stream part of a blob
+
+        Args:
+            sha256 (str): Blob digest
+            start (int): First byte
+            end (int): End of the range (exclusive), or None for the end of the blob
+
+        Yields:
+            bytes: Chunks of at most CHUNK_SIZE bytes
+        """
+        with open(self.blob_path(sha256), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def read(self, sha256):
+        """Read a whole blob"""
+        return b''.join(self.read_range(sha256))
+
+    def collect_garbage(self, referenced, grace=ORPHAN_GRACE_S):
+        """
+        Remove blobs that no ticket references, and uploads that never finished
+
+        Args:
+            referenced (set): Digests of every blob a ticket references
+            grace (float): Files modified less than this many seconds ago are kept
+
+        Returns:
+            int: Number of files removed
+        """
+        cutoff = time.time() - grace
+        removed = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name in referenced or not (DIGEST_PATTERN.match(name) or name.startswith('.upload_')):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass  # Removed or replaced meanwhile
+        return removed
+
+
+class AttachmentRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET/HEAD /<sha256> from an AttachmentStore to signed links, honouring Range headers"""
+
+    store = None
+    secret = None
+
+    def do_HEAD(self):
+        self.send_blob(body=False)
+
+    def do_GET(self):
+        self.send_blob(body=True)
+
+    def authorized(self, sha256, query):
+        """Whether the query carries an unexpired signature for the blob"""
+        params = parse_qs(query)
+        expires = params.get('expires', [''])[0]
+        signature = params.get('signature', [''])[0]
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        return hmac.compare_digest(signature, link_signature(sha256, expires, self.secret))
+
+    def send_blob(self, body):
+        path, _, query = self.path.partition('?')
+        sha256 = path.strip('/')
+        if not self.authorized(sha256, query):
+            self.send_error(403)
+            return
+        try:
+            size = self.store.size(sha256)
+        except (ValueError, OSError):
+            self.send_error(404)
+            return
+
+        start, end = 0, size
+        status = 200
+        header = self.headers.get('Range')
+        if header:
+            try:
+                requested = parse_range(header, size)
+            except ValueError:
+                requested = False  # Ignore ranges we do not support, as RFC 9110 allows
+            if requested is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.end_headers()
+                return
+            if requested:
+                start, end = requested
+                status = 206
+
+        self.send_response(status)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('ETag', f'"{sha256}"')
+        self.send_header('Cache-Control', f"private, max-age={LINK_TTL}")
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+        if body:
+            for chunk in self.store.read_range(sha256, start, end):
+                self.wfile.write(chunk)
+
+def create_server(store, secret, host='127.0.0.1', port=8503):
+    """
+    HTTP server for the attachment store
+
+    Raises:
+        ValueError: If no secret is given; links could not be checked
+    """
+    if not secret:
+        raise ValueError("The attachment server needs HELPDESK_ATTACHMENT_SECRET to check links")
+    handler = type('Handler', (AttachmentRequestHandler,), {'store': store, 'secret': secret})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve(store, secret, host='127.0.0.1', port=8503):
+    """Serve the attachment store over HTTP until interrupted"""
+    server = create_server(store, secret, host, port)
+    logger.info("Serving %s on http://%s:%d/", store.root, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve ticket attachments over HTTP with Range support")
+    parser.add_argument("--root", help="Attachment directory (default: HELPDESK_ATTACHMENT_DIR or helpdesk_attachments)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8503)
+    parser.add_argument("--collect-garbage", action="store_true",
+                        help="Remove blobs no ticket references instead of serving")
+    parser.add_argument("--storage", choices=['json', 'log', 'sqlite'],
+                        help="Backend to read references from (default: HELPDESK_STORAGE_MODE, then json)")
+    parser.add_argument("--data-file", help="Data file of the backend (default: helpdesk_data.json/.db)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = AttachmentStore(args.root)
+    if args.collect_garbage:
+        from utils.bulk_io import open_database
+        from utils.ticket_manager import TicketManager
+
+        db = open_database(args.storage, args.data_file)
+        try:
+            logger.info("Removed %d unreferenced files", TicketManager(db, store).collect_attachments())
+        finally:
+            db.close()
+    else:
+        try:
+            serve(store, os.environ.get('HELPDESK_ATTACHMENT_SECRET'), args.host, args.port)
+        except ValueError as e:
+            parser.error(str(e))
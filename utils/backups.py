@@ -0,0 +1,326 @@
+"""
+Incremental, compressed backups
+A backup chain starts with a base backup of every ticket, followed by
+increments that only hold the tickets changed since the previous backup, as
+reported by the database's change journal. Restoring replays the base and
+then each increment up to the chosen backup.
+
+Backups are gzip-compressed JSON lines at the fastest compression level.
+The first line is a header with the settings; every other line is either
+{"ticket": {...}} with the comments embedded, or {"deleted": "<id>"}.
+
+Usage:
+    python -m utils.backups list
+    python -m utils.backups restore [name] --storage sqlite
+"""
+
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import weakref
+from datetime import datetime
+
+DEFAULT_BACKUP_DIR = 'helpdesk_backups'
+
+# Chains (a base and its increments) kept by the retention policy
+DEFAULT_KEEP_CHAINS = 3
+
+# Increments after which the next backup starts a new chain, so that a
+# restore never has to replay more than this many files
+DEFAULT_MAX_INCREMENTS = 24
+
+# gzip level 1 compresses JSON to about a fifth of its size at several times
+# the speed of the default level 9
+COMPRESS_LEVEL = 1
+
+MANIFEST_FILE = 'manifest.json'
+
+logger = logging.getLogger(__name__)
+
+
+class BackupManager:
+    """
+    Takes and restores backup chains of one database
+
+    Which tickets changed is only known for the lifetime of the database
+    object, so the first backup taken by a process is always a base. Keep one
+    manager per database (see get_backup_manager) to get increments.
+    """
+
+    def __init__(self, db, directory=None, keep_chains=DEFAULT_KEEP_CHAINS,
+                 max_increments=DEFAULT_MAX_INCREMENTS):
+        self.db = db
+        self.directory = directory or os.environ.get('HELPDESK_BACKUP_DIR', DEFAULT_BACKUP_DIR)
+        self.keep_chains = keep_chains
+        self.max_increments = max_increments
+        self.lock = threading.Lock()
+        # Name and data version of the last backup this manager wrote
+        self.last_name = None
+        self.version = None
+        self.stopped = threading.Event()
+
+    def manifest_path(self):
+        """Path of the manifest listing the backups"""
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def list_backups(self):
+        """
+        Get the backups in the manifest, oldest first
+
+        Returns:
+            list: Dicts with 'name', 'type' ('base' or 'increment'), 'base',
+                'created', 'tickets', 'deleted', 'bytes' and 'seconds'
+        """
+        try:
+            with open(self.manifest_path(), 'r') as f:
+                return json.load(f)['backups']
+        except FileNotFoundError:
+            return []
+
+    def write_manifest(self, backups):
+        """Atomically replace the manifest"""
+        fd, temp_path = tempfile.mkstemp(prefix='.manifest_', suffix='.tmp', dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'backups': backups}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.manifest_path())
+
+    def backup(self, full=False):
+        """
+        Take a backup: an increment when possible, otherwise a new base
+
+        A new chain is started when the newest backup was not written by this
+        manager, the change journal cannot list the changes since it, the
+        current chain already has max_increments increments, or its
+        increments have grown to half the size of its base.
+
+        Args:
+            full (bool): Always take a base backup
+
+        Returns:
+            dict: Manifest entry of the new backup
+        """
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            backups = self.list_backups()
+            start = time.perf_counter()
+            version = self.db.get_version()
+
+            changed = None
+            if not full and backups and backups[-1]['name'] == self.last_name:
+                chain = [b for b in backups if b['base'] == backups[-1]['base']]
+                increment_bytes = sum(b['bytes'] for b in chain[1:])
+                if len(chain) <= self.max_increments and increment_bytes < chain[0]['bytes'] // 2:
+                    changed = self.db.changes_since(self.version)
+
+            created = datetime.now()
+            kind = 'base' if changed is None else 'increment'
+            name = f"{kind}_{created.strftime('%Y%m%d_%H%M%S_%f')}.jsonl.gz"
+            header = {
+                'type': kind,
+                'created': created.strftime('%Y-%m-%d %H:%M:%S'),
+                'settings': self.db.get_settings()
+            }
+            if changed is None:
+                counts = self.write_backup(name, header, self.db.iter_tickets(), ())
+            else:
+                tickets = []
+                deleted = []
+                for ticket_id in sorted(changed):
+                    ticket = self.db.get_ticket(ticket_id)
+                    if ticket is None:
+                        deleted.append(ticket_id)
+                    else:
+                        tickets.append(dict(ticket, comments=self.db.get_comments(ticket_id)))
+                counts = self.write_backup(name, header, tickets, deleted)
+
+            entry = {
+                'name': name,
+                'type': kind,
+                'base': name if changed is None else backups[-1]['base'],
+                'created': header['created'],
+                'tickets': counts[0],
+                'deleted': counts[1],
+                'bytes': os.path.getsize(os.path.join(self.directory, name)),
+                'seconds': round(time.perf_counter() - start, 3)
+            }
+            backups.append(entry)
+            self.prune(backups)
+            self.last_name = name
+            self.version = version
+            logger.info("Wrote %s backup %s (%d tickets, %d bytes)",
+                        kind, name, entry['tickets'], entry['bytes'])
+            return entry
+
+    def write_backup(self, name, header, tickets, deleted):
+        """
+        Write a backup file via a temporary file
+
+        Returns:
+            tuple: (tickets written, deletions written)
+        """
+        fd, temp_path = tempfile.mkstemp(prefix='.backup_', suffix='.tmp', dir=self.directory)
+        written = 0
+        try:
+            with os.fdopen(fd, 'wb') as raw, \
+                    gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=COMPRESS_LEVEL) as f:
+                f.write((json.dumps({'header': header}) + '\n').encode('utf-8'))
+                for ticket in tickets:
+                    f.write((json.dumps({'ticket': ticket}, separators=(',', ':')) + '\n').encode('utf-8'))
+                    written += 1
+                for ticket_id in deleted:
+                    f.write((json.dumps({'deleted': ticket_id}) + '\n').encode('utf-8'))
+                f.close()
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temp_path, os.path.join(self.directory, name))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return written, len(deleted)
+
+    def prune(self, backups):
+        """
+        Apply the retention policy and write the manifest
+
+        Files of dropped chains are deleted only after the manifest no longer
+        lists them, so a crash never leaves the manifest pointing at missing files.
+
+        Args:
+            backups (list): Manifest entries, oldest first
+        """
+        bases = [b['name'] for b in backups if b['type'] == 'base']
+        kept_bases = set(bases[-self.keep_chains:])
+        self.write_manifest([b for b in backups if b['base'] in kept_bases])
+        for entry in backups:
+            if entry['base'] not in kept_bases:
+                try:
+                    os.remove(os.path.join(self.directory, entry['name']))
+                except FileNotFoundError:
+                    pass
+
+    def read_backup(self, name):
+        """
+        Read a backup file
+
+        Yields:
+            dict: The header line, then one {'ticket': ...} or {'deleted': ...} per line
+        """
+        with gzip.open(os.path.join(self.directory, name), 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def restore(self, name=None):
+        """
+        Replace all data with the state at a backup
+
+        Args:
+            name (str): Backup to restore, base or increment; defaults to the newest
+
+        Returns:
+            int: Number of tickets restored
+
+        Raises:
+            ValueError: If there is no such backup
+        """
+        with self.lock:
+            backups = self.list_backups()
+            if not backups:
+                raise ValueError(f"No backups in {self.directory}")
+            names = [b['name'] for b in backups]
+            target = backups[-1] if name is None else next((b for b in backups if b['name'] == name), None)
+            if target is None:
+                raise ValueError(f"Unknown backup: {name}")
+
+            chain = [b for b in backups[:names.index(target['name']) + 1] if b['base'] == target['base']]
+            tickets = {}
+            settings = {}
+            for entry in chain:
+                for record in self.read_backup(entry['name']):
+                    if 'ticket' in record:
+                        tickets[record['ticket']['id']] = record['ticket']
+                    elif 'deleted' in record:
+                        tickets.pop(record['deleted'], None)
+                    else:
+                        settings = record['header']['settings']
+
+            self.db.replace_all(list(tickets.values()), settings)
+            self.last_name = None  # Start a new chain from the restored data
+            logger.info("Restored %d tickets from %s", len(tickets), target['name'])
+            return len(tickets)
+
+    def start(self, interval_s):
+        """Take a backup every interval_s seconds in a background thread"""
+        def run():
+            while not self.stopped.wait(interval_s):
+                try:
+                    self.backup()
+                except Exception:
+                    logger.exception("Scheduled backup failed")
+        threading.Thread(target=run, name='helpdesk-backup', daemon=True).start()
+
+    def stop(self):
+        """Stop scheduled backups"""
+        self.stopped.set()
+
+
+_backup_managers = weakref.WeakKeyDictionary()
+_backup_managers_lock = threading.Lock()
+
+def get_backup_manager(db):
+    """
+    Get the shared backup manager of a database
+
+    The first call starts scheduled backups if HELPDESK_BACKUP_INTERVAL_MIN is set.
+
+    Args:
+        db: Database or SQLiteDatabase
+
+    Returns:
+        BackupManager: Manager writing to HELPDESK_BACKUP_DIR
+    """
+    with _backup_managers_lock:
+        manager = _backup_managers.get(db)
+        if manager is None:
+            manager = _backup_managers[db] = BackupManager(db)
+            interval = os.environ.get('HELPDESK_BACKUP_INTERVAL_MIN')
+            if interval:
+                manager.start(float(interval) * 60)
+        return manager
+
+if __name__ == "__main__":
+    import argparse
+
+    from utils.bulk_io import open_database
+
+    parser = argparse.ArgumentParser(description="List, take or restore incremental backups")
+    parser.add_argument('command', choices=['list', 'backup', 'restore'])
+    parser.add_argument('name', nargs='?', help="Backup to restore (default: the newest)")
+    parser.add_argument('--dir', help="Backup directory (default: HELPDESK_BACKUP_DIR or helpdesk_backups)")
+    parser.add_argument('--storage', choices=['json', 'log', 'sqlite'],
+                        help="Backend (default: HELPDESK_STORAGE_MODE, then json)")
+    parser.add_argument('--data-file', help="Data file of the backend (default: helpdesk_data.json/.db)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == 'list':
+        for entry in BackupManager(None, args.dir).list_backups():
+            print(f"{entry['name']}  {entry['created']}  {entry['tickets']} tickets  {entry['bytes']} bytes")
+    else:
+        db = open_database(args.storage, args.data_file)
+        try:
+            manager = BackupManager(db, args.dir)
+            if args.command == 'backup':
+                manager.backup()
+            else:
+                manager.restore(args.name)
+        finally:
+            db.close()
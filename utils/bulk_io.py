@@ -0,0 +1,280 @@
+"""
+Streaming bulk import and export of tickets as JSON lines
+One ticket per line, with its comments embedded as in backups. Files ending
+in .gz are compressed. Records are read and written one at a time and stored
+in batches, so the files can be far larger than memory.
+
+Usage:
+    python -m utils.bulk_io export tickets.jsonl.gz --storage sqlite
+    python -m utils.bulk_io import tickets.jsonl.gz --storage sqlite --batch-size 2000
+"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+from utils.statistics import PRIORITY_KEYS, STATUS_KEYS
+from utils.timestamps import DATE_FORMAT, is_date
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 2.0
+
+# Invalid lines listed in an import result; all of them are logged
+MAX_REPORTED_ERRORS = 100
+
+# Fields every imported ticket must have, as non-empty strings
+REQUIRED_FIELDS = ('id', 'title', 'description', 'category', 'priority', 'status',
+                   'employee_id', 'employee_name', 'created_date')
+
+# Values filled in for optional fields missing from an imported ticket
+OPTIONAL_DEFAULTS = {
+    'urgency': 'Medium',
+    'employee_email': '',
+    'department': '',
+    'location': '',
+    'phone': '',
+    'assigned_to': None,
+    'resolution': '',
+    'attachments': [],
+    'comments': []
+}
+
+logger = logging.getLogger(__name__)
+
+def open_jsonl(path, mode):
+    """
+    Open a JSON lines file for text reading ('r') or writing ('w')
+
+    Args:
+        path (str): File path; '.gz' files are compressed and '-' is stdin/stdout
+        mode (str): 'r' or 'w'
+
+    Returns:
+        file: Text file object
+    """
+    if path == '-':
+        stream = sys.stdin.buffer if mode == 'r' else sys.stdout.buffer
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def validate_ticket(record):
+    """
+    Check an imported record and fill in missing optional fields
+
+    Args:
+        record: Decoded JSON value of one line
+
+    Returns:
+        tuple: (ticket or None, list of problems); the ticket is None when
+            there are problems
+    """
+    if not isinstance(record, dict):
+        return None, ["record is not an object"]
+
+    problems = [f"missing {field}" for field in REQUIRED_FIELDS
+                if not isinstance(record.get(field), str) or not record[field].strip()]
+    if record.get('status') and record['status'] not in STATUS_KEYS:
+        problems.append(f"unknown status {record.get('status')!r}")
+    if record.get('priority') and record['priority'] not in PRIORITY_KEYS:
+        problems.append(f"unknown priority {record.get('priority')!r}")
+    for field in ('created_date', 'updated_date'):
+        if record.get(field) is not None and not is_date(record[field]):
+            problems.append(f"{field} is not a '{DATE_FORMAT}' date")
+    if not isinstance(record.get('attachments', []), list):
+        problems.append("attachments is not a list")
+    comments = record.get('comments', [])
+    if not isinstance(comments, list) or not all(
+            isinstance(c, dict) and isinstance(c.get('comment'), str) for c in comments):
+        problems.append("comments is not a list of comments")
+    if problems:
+        return None, problems
+
+    ticket = dict(record)
+    for field, default in OPTIONAL_DEFAULTS.items():
+        if field not in ticket:
+            ticket[field] = list(default) if isinstance(default, list) else default
+    ticket['updated_date'] = ticket.get('updated_date') or ticket['created_date']
+    return ticket, []
+
+
+class ProgressReporter:
+    """Logs record counts and throughput at most every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, action, interval=PROGRESS_INTERVAL):
+        self.action = action
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, count, rejected=0, force=False):
+        """Report progress if the interval has passed, or always with force=True"""
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        message = f"{self.action} {count} tickets ({self.rate(count, now):,.0f}/s)"
+        if rejected:
+            message += f", {rejected} rejected"
+        logger.info(message)
+
+    def elapsed(self, now=None):
+        """Seconds since the reporter was created"""
+        return (now or time.perf_counter()) - self.start
+
+    def rate(self, count, now=None):
+        """Records per second so far"""
+        elapsed = self.elapsed(now)
+        return count / elapsed if elapsed else 0.0
+
+def export_tickets(db, path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write every ticket, with its comments, to a JSON lines file
+
+    Args:
+        db: Database or SQLiteDatabase
+        path (str): Output file; '.gz' is compressed, '-' is stdout
+        batch_size (int): Tickets read from the database at a time
+
+    Returns:
+        dict: 'exported' count, 'seconds' and 'per_second'
+    """
+    progress = ProgressReporter("Exported")
+    count = 0
+    with open_jsonl(path, 'w') as f:
+        for ticket in db.iter_tickets(batch_size):
+            f.write(json.dumps(ticket, separators=(',', ':')) + '\n')
+            count += 1
+            progress.update(count)
+    progress.update(count, force=True)
+    return {
+        'exported': count,
+        'seconds': round(progress.elapsed(), 3),
+        'per_second': round(progress.rate(count), 1)
+    }
+
+def import_tickets(db, path, batch_size=DEFAULT_BATCH_SIZE, max_errors=100):
+    """
+    Add or replace tickets from a JSON lines file, in batches
+
+    Invalid lines are skipped and reported; tickets are matched on their id,
+    so an interrupted import can simply be run again.
+
+    Args:
+        db: Database or SQLiteDatabase
+        path (str): Input file; '.gz' is decompressed, '-' is stdin
+        batch_size (int): Tickets written per batch
+        max_errors (int): Stop after this many invalid lines, or None for no limit
+
+    Returns:
+        dict: 'read', 'imported', 'added' and 'rejected' counts, the first
+            'errors' as (line number, message), 'seconds' and 'per_second'
+
+    Raises:
+        ValueError: If more than max_errors lines are invalid
+    """
+    progress = ProgressReporter("Imported")
+    read = imported = added = rejected = 0
+    errors = []
+    batch = []
+
+    with open_jsonl(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            read += 1
+            try:
+                ticket, problems = validate_ticket(json.loads(line))
+            except ValueError as e:
+                ticket, problems = None, [f"invalid JSON: {e}"]
+            if problems:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((line_number, '; '.join(problems)))
+                logger.warning("Line %d: %s", line_number, '; '.join(problems))
+                if max_errors is not None and rejected > max_errors:
+                    if batch:
+                        db.upsert_tickets(batch)
+                    db.flush()
+                    raise ValueError(f"Too many invalid records ({rejected}), stopped at line {line_number}")
+                continue
+
+            batch.append(ticket)
+            if len(batch) >= batch_size:
+                added += db.upsert_tickets(batch)
+                imported += len(batch)
+                batch = []
+                progress.update(imported, rejected)
+
+    if batch:
+        added += db.upsert_tickets(batch)
+        imported += len(batch)
+    db.flush()
+    progress.update(imported, rejected, force=True)
+    return {
+        'read': read,
+        'imported': imported,
+        'added': added,
+        'rejected': rejected,
+        'errors': errors,
+        'seconds': round(progress.elapsed(), 3),
+        'per_second': round(progress.rate(imported), 1)
+    }
+
+def open_database(storage=None, data_file=None):
+    """
+    Open a backend for bulk work
+
+    The JSON backends only flush when the import finishes, instead of after
+    every batch.
+
+    Args:
+        storage (str): 'json', 'log' or 'sqlite'. Defaults to the
+            HELPDESK_STORAGE_MODE environment variable, then 'json', so the
+            tickets land where the app reads them.
+        data_file (str): Data file of the backend
+    """
+    storage = storage or os.environ.get('HELPDESK_STORAGE_MODE', 'json')
+    if storage == 'sqlite':
+        from utils.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(data_file or os.environ.get('HELPDESK_SQLITE_FILE', 'helpdesk_data.db'), seed=False)
+    from utils.database import Database
+    return Database(data_file or 'helpdesk_data.json', storage_mode=storage, durability='shutdown')
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream tickets to or from a JSON lines file")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('path', help="JSON lines file; '.gz' is compressed, '-' is stdin/stdout")
+    parser.add_argument('--storage', choices=['json', 'log', 'sqlite'],
+                        help="Backend (default: HELPDESK_STORAGE_MODE, then json)")
+    parser.add_argument('--data-file', help="Data file of the backend (default: helpdesk_data.json/.db)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-errors', type=int, default=100,
+                        help="Invalid lines tolerated before an import stops")
+    parser.add_argument('--replace', action='store_true',
+                        help="Delete all existing tickets before importing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(message)s")
+    db = open_database(args.storage, args.data_file)
+    try:
+        if args.command == 'export':
+            result = export_tickets(db, args.path, args.batch_size)
+        else:
+            if args.replace:
+                db.clear_all_data()
+            result = import_tickets(db, args.path, args.batch_size, args.max_errors)
+    finally:
+        db.close()
+    logger.info(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
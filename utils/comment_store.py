@@ -0,0 +1,234 @@
+"""
+Append-only comment storage, kept out of the ticket list
+Tickets only carry a comment count and the time of the last comment; the
+comment threads themselves are read from the store when they are displayed
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+def detach_comments(ticket):
+    """
+    Split the comments out of a ticket in the older embedded format
+
+    Args:
+        ticket (dict): Ticket, possibly with a 'comments' list
+
+    Returns:
+        tuple: (ticket copy without comments, with comment_count and
+            last_comment_date set, list of comments)
+    """
+    ticket = dict(ticket)
+    comments = ticket.pop('comments', None) or []
+    ticket['comment_count'] = len(comments)
+    ticket['last_comment_date'] = comments[-1].get('timestamp') if comments else None
+    return ticket, comments
+
+def read_comments(path):
+    """
+    Read every complete comment of a comment file, without repairing it
+
+    Returns:
+        dict: Comments by ticket id, oldest first; empty if there is no file
+    """
+    threads = {}
+    if not os.path.exists(path):
+        return threads
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            threads.setdefault(record['ticket_id'], []).append(record['comment'])
+    return threads
+
+
+class CommentStore:
+    """
+    Comments of all tickets in one append-only JSON lines file
+
+    Only the byte offset of every comment is kept in memory, grouped by
+    ticket id, so threads are read from disk on demand. Appends are flushed
+    to the operating system immediately and synced to disk by sync().
+
+    Scanning never writes: a torn line at the end of the file, left by a
+    crash during an append, is only cut off before the next append, which
+    runs under the database's write lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.handle = None
+        self.size = 0
+
+    def scan(self):
+        """
+        Read the whole file, rebuilding the offsets
+
+        Reading stops at the end of the last complete line; anything after
+        it is left in place until repair().
+
+        Yields:
+            tuple: (ticket_id, comment) for every stored comment, in order
+        """
+        self.close()
+        self.offsets = {}
+        self.size = 0
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb') as f:
+            yield from self.index_lines(f)
+
+    def index_lines(self, f):
+        """
+        Index the complete lines of an open file from self.size on
+
+        Yields:
+            tuple: (ticket_id, comment) for every complete line, in order
+        """
+        f.seek(self.size)
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            self.offsets.setdefault(record['ticket_id'], []).append(self.size)
+            self.size += len(line)
+            yield record['ticket_id'], record['comment']
+
+    def repair(self):
+        """
+        Make the file end on a clean line before appending
+
+        Complete lines past the scanned end, appended since by another
+        process, are indexed and kept; only a torn line after them is cut off.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size <= self.size:
+            return
+        with open(self.path, 'r+b') as f:
+            for _ in self.index_lines(f):
+                pass
+            if size > self.size:
+                logger.warning("Discarding a partial comment at the end of %s", self.path)
+                f.truncate(self.size)
+
+    def append(self, ticket_id, comment):
+        """
+        Append a comment to a ticket's thread
+
+        Args:
+            ticket_id (str): Ticket ID
+            comment (dict): Comment with author, comment and timestamp
+        """
+        line = (json.dumps({'ticket_id': ticket_id, 'comment': comment}) + '\n').encode('utf-8')
+        if self.handle is None:
+            self.repair()
+            self.handle = open(self.path, 'ab')
+        self.handle.write(line)
+        self.handle.flush()
+        self.offsets.setdefault(ticket_id, []).append(self.size)
+        self.size += len(line)
+
+    def count(self, ticket_id):
+        """Number of comments on a ticket"""
+        return len(self.offsets.get(ticket_id, ()))
+
+    def total(self):
+        """Number of stored comments"""
+        return sum(len(offsets) for offsets in self.offsets.values())
+
+    def get(self, ticket_id, offset=0, limit=None):
+        """
+        Read part of a ticket's thread
+
+        Args:
+            ticket_id (str): Ticket ID
+            offset (int): Number of comments to skip, oldest first
+            limit (int): Maximum number of comments, or None for the rest
+
+        Returns:
+            list: Comments, oldest first
+        """
+        offsets = self.offsets.get(ticket_id, [])
+        offsets = offsets[offset:] if limit is None else offsets[offset:offset + limit]
+        if not offsets:
+            return []
+
+        comments = []
+        with open(self.path, 'rb') as f:
+            for position in offsets:
+                f.seek(position)
+                comments.append(json.loads(f.readline())['comment'])
+        return comments
+
+    def replace(self, threads):
+        """
+        Atomically replace every stored comment
+
+        Args:
+            threads (dict): Ticket id to list of comments
+        """
+        self.close()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix='.helpdesk_', suffix='.tmp', dir=directory)
+        offsets = {}
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for ticket_id, comments in threads.items():
+                    for comment in comments:
+                        line = (json.dumps({'ticket_id': ticket_id, 'comment': comment}) + '\n').encode('utf-8')
+                        f.write(line)
+                        offsets.setdefault(ticket_id, []).append(size)
+                        size += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.offsets = offsets
+        self.size = size
+
+    def sync(self):
+        """
+        Flush appended comments to disk
+
+        Returns:
+            bool: True if the file is synced
+        """
+        if self.handle is None:
+            return True
+        try:
+            os.fsync(self.handle.fileno())
+            return True
+        except (OSError, ValueError):
+            logger.exception("Could not sync %s", self.path)
+            return False
+
+    def close(self):
+        """Close the append handle, if open"""
+        if self.handle is not None:
+            try:
+                self.handle.close()
+            except OSError:
+                pass
+            self.handle = None
@@ -3,215 +3,1311 @@ Simple in-memory database for storing tickets and system data
 In a production environment, this would be replaced with a proper database
 """
 
+import atexit
+import heapq
+import itertools
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from utils.comment_store import CommentStore, detach_comments, read_comments
+from utils.indexes import ChangeJournal, FieldIndex, TimeIndex
+from utils.locks import ReadWriteLock
+from utils.metrics import instrument_class, observe_bytes, record_file_size, start_exporters
+from utils.search_index import SearchIndex
+from utils.statistics import TicketStatistics
+from utils.ticket_record import TicketRecord, encode_json
+
+# Storage modes:
+#   'json'   - every mutation rewrites the full data file
+#   'log'    - mutations are appended to a write-ahead log which is periodically
+#              compacted into the data file (the snapshot)
+#   'sqlite' - tickets live in an indexed SQLite database (see sqlite_database.py)
+STORAGE_MODES = ('json', 'log')
+
+# Ticket fields that can be used as equality filters in find_tickets
+TICKET_FILTER_FIELDS = ('id', 'status', 'priority', 'category', 'employee_id', 'assigned_to')
+
+# Ticket fields that find_page can sort by; prefix with '-' for descending order
+TICKET_SORT_FIELDS = ('created_date', 'updated_date')
+
+# Ticket fields with a secondary index in the in-memory Database
+INDEXED_FIELDS = ('status', 'priority', 'category', 'employee_id', 'assigned_to')
+
+# Number of log records after which the log is folded into the snapshot
+LOG_COMPACT_THRESHOLD = 500
+
+# Durability policies:
+#   'always'   - every write is on disk before the call returns; writes that
+#                arrive while a flush is running share the next flush
+#   'interval' - a background thread flushes at most every flush interval
+#   'shutdown' - changes are only flushed by flush(), close() or at exit
+DURABILITY_POLICIES = ('always', 'interval', 'shutdown')
+
+DEFAULT_FLUSH_INTERVAL_MS = 200
+
+logger = logging.getLogger(__name__)
+
+def check_filters(filters, search=False):
+    """
+    Validate ticket filters
+    
+    Besides the fields in TICKET_FILTER_FIELDS, 'assigned' (bool) matches
+    tickets with or without an assignee, and with search=True 'search' (str)
+    matches ticket text.
+    
+    Raises:
+        ValueError: If a filter is not supported
+    """
+    for field in filters:
+        if field not in TICKET_FILTER_FIELDS and field != 'assigned' and not (search and field == 'search'):
+            raise ValueError(f"Cannot filter tickets by {field}")
+
+def parse_sort(sort):
+    """
+    Split a sort spec such as '-created_date' into its field and direction
+    
+    Returns:
+        tuple: (field or None for the default order, True if descending)
+    """
+    if not sort:
+        return None, False
+    field = sort.lstrip('-')
+    if field not in TICKET_SORT_FIELDS:
+        raise ValueError(f"Cannot sort tickets by {field}")
+    return field, sort.startswith('-')
+
+def create_database(storage_mode=None):
+    """
+    Create the database backend selected by configuration
+    
+    Args:
+        storage_mode (str): 'json', 'log' or 'sqlite'. Defaults to the
+            HELPDESK_STORAGE_MODE environment variable, then 'json'.
+            
+    Returns:
+        Database or SQLiteDatabase: Configured database instance
+    """
+    storage_mode = storage_mode or os.environ.get('HELPDESK_STORAGE_MODE', 'json')
+    if storage_mode == 'sqlite':
+        from utils.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(os.environ.get('HELPDESK_SQLITE_FILE', 'helpdesk_data.db'))
+    return Database(storage_mode=storage_mode)
+
+_shared_databases = {}
+_shared_databases_lock = threading.Lock()
+
+def get_shared_database(storage_mode=None):
+    """
+    Get the process-wide database instance for the configured backend
+    
+    Streamlit runs every browser session in the same process, so sharing one
+    instance keeps a single copy of the data in memory and gives all sessions
+    a consistent view of it. The first call also starts the metrics
+    exporters, if configured.
+    
+    Args:
+        storage_mode (str): Same as create_database
+        
+    Returns:
+        Database or SQLiteDatabase: Shared database instance
+    """
+    storage_mode = storage_mode or os.environ.get('HELPDESK_STORAGE_MODE', 'json')
+    start_exporters()  # Metrics endpoint and file, when HELPDESK_METRICS is set
+    with _shared_databases_lock:
+        if storage_mode not in _shared_databases:
+            _shared_databases[storage_mode] = create_database(storage_mode)
+        return _shared_databases[storage_mode]
+
+def fsync_directory(directory):
+    """Sync a directory so a rename inside it survives a crash (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def default_data():
+    """Default data structure with some sample tickets"""
+    return {
+        'tickets': [
+            {
+                'id': '0001',
+                'title': 'Computer won\'t start',
+                'description': 'My desktop computer won\'t turn on this morning. No lights or sounds when pressing power button.',
+                'category': 'Hardware Issues',
+                'priority': 'High',
+                'urgency': 'High',
+                'status': 'Open',
+                'employee_id': 'EMP001',
+                'employee_name': 'John Doe',
+                'employee_email': 'john.doe@company.com',
+                'department': 'Information Technology',
+                'location': 'Building A, Floor 3, Desk 15',
+                'phone': '+1-555-0101',
+                'created_date': '2025-06-20 09:15:30',
+                'updated_date': '2025-06-20 09:15:30',
+                'assigned_to': None,
+                'resolution': '',
+                'attachments': [],
+                'comments': []
+            },
+            {
+                'id': '0002',
+                'title': 'Email not syncing on mobile device',
+                'description': 'Unable to receive emails on my iPhone. Last sync was yesterday evening.',
+                'category': 'Email/Communication',
+                'priority': 'Medium',
+                'urgency': 'Medium',
+                'status': 'In Progress',
+                'employee_id': 'EMP004',
+                'employee_name': 'Alice Brown',
+                'employee_email': 'alice.brown@company.com',
+                'department': 'Human Resources',
+                'location': 'Building B, Floor 2',
+                'phone': '+1-555-0201',
+                'created_date': '2025-06-19 14:30:15',
+                'updated_date': '2025-06-20 10:45:22',
+                'assigned_to': 'John Smith (IT)',
+                'resolution': '',
+                'attachments': [],
+                'comments': [
+                    {
+                        'author': 'John Smith (IT)',
+                        'comment': 'Checking Exchange server settings. Will update shortly.',
+                        'timestamp': '2025-06-20 10:45:22'
+                    }
+                ]
+            },
+            {
+                'id': '0003',
+                'title': 'Printer offline in accounting department',
+                'description': 'The main printer in accounting shows as offline. Cannot print invoices.',
+                'category': 'Printer/Peripherals',
+                'priority': 'Medium',
+                'urgency': 'High',
+                'status': 'Resolved',
+                'employee_id': 'EMP006',
+                'employee_name': 'David Miller',
+                'employee_email': 'david.miller@company.com',
+                'department': 'Finance',
+                'location': 'Building C, Floor 1',
+                'phone': '+1-555-0301',
+                'created_date': '2025-06-18 11:20:45',
+                'updated_date': '2025-06-19 16:30:12',
+                'assigned_to': 'Sarah Johnson (IT)',
+                'resolution': 'Printer driver was corrupted. Reinstalled drivers and printer is now working normally.',
+                'attachments': [],
+                'comments': [
+                    {
+                        'author': 'Sarah Johnson (IT)',
+                        'comment': 'Investigating printer connection issues.',
+                        'timestamp': '2025-06-18 13:15:30'
+                    },
+                    {
+                        'author': 'Sarah Johnson (IT)',
+                        'comment': 'Found driver corruption. Reinstalling now.',
+                        'timestamp': '2025-06-19 16:25:45'
+                    }
+                ]
+            },
+            {
+                'id': '0004',
+                'title': 'VPN connection keeps dropping',
+                'description': 'VPN connection disconnects every 10-15 minutes when working from home.',
+                'category': 'Network/Connectivity',
+                'priority': 'Medium',
+                'urgency': 'Medium',
+                'status': 'Open',
+                'employee_id': 'EMP008',
+                'employee_name': 'Michael Taylor',
+                'employee_email': 'michael.taylor@company.com',
+                'department': 'Marketing',
+                'location': 'Remote - Home Office',
+                'phone': '+1-555-0401',
+                'created_date': '2025-06-21 08:45:10',
+                'updated_date': '2025-06-21 08:45:10',
+                'assigned_to': None,
+                'resolution': '',
+                'attachments': [],
+                'comments': []
+            },
+            {
+                'id': '0005',
+                'title': 'Need access to new project folder',
+                'description': 'Require access to the Project Phoenix shared folder for the new marketing campaign.',
+                'category': 'Security/Access',
+                'priority': 'Low',
+                'urgency': 'Low',
+                'status': 'Closed',
+                'employee_id': 'EMP008',
+                'employee_name': 'Michael Taylor',
+                'employee_email': 'michael.taylor@company.com',
+                'department': 'Marketing',
+                'location': 'Building D, Floor 2',
+                'phone': '+1-555-0401',
+                'created_date': '2025-06-17 13:20:35',
+                'updated_date': '2025-06-18 09:15:22',
+                'assigned_to': 'Mike Wilson (IT)',
+                'resolution': 'Access granted to Project Phoenix folder. User can now access all required documents.',
+                'attachments': [],
+                'comments': [
+                    {
+                        'author': 'Mike Wilson (IT)',
+                        'comment': 'Verifying permissions with manager.',
+                        'timestamp': '2025-06-17 15:30:12'
+                    },
+                    {
+                        'author': 'Mike Wilson (IT)',
+                        'comment': 'Approval received. Granting access now.',
+                        'timestamp': '2025-06-18 09:10:45'
+                    }
+                ]
+            }
+        ],
+        'settings': {
+            'auto_assign': True,
+            'escalation_enabled': True,
+            'business_hours_only': False,
+            'default_priority': 'Medium',
+            'max_response_time': 24,
+            'notification_settings': {
+                'email_enabled': True,
+                'sms_enabled': False,
+                'slack_enabled': True
+            }
+        }
+    }
+
+
+def empty_data():
+    """Data structure with no tickets and default settings"""
+    return {
+        'tickets': [],
+        'settings': {
+            'auto_assign': True,
+            'escalation_enabled': True,
+            'business_hours_only': False,
+            'default_priority': 'Medium',
+            'max_response_time': 24
+        }
+    }
+
+def compacting_log_file(log_file):
+    """Path a log is moved to while it is folded into the snapshot"""
+    return log_file + '.compacting'
+
+def replay_log_file(log_file, data):
+    """
+    Apply the mutations of a log file to snapshot data
+
+    A log left behind by an unfinished compaction is applied first.
+
+    Args:
+        log_file (str): Path to the log
+        data (dict): Snapshot data, modified in place
+
+    Returns:
+        tuple: (number of records replayed from the log, bytes of the log read)
+    """
+    positions = {t['id']: i for i, t in enumerate(data.get('tickets', []))}
+    replay_log_lines(compacting_log_file(log_file), data, positions)
+    return replay_log_lines(log_file, data, positions)
+
+def replay_log_lines(log_file, data, positions):
+    """
+    Apply the records of one log file, skipping lines torn by a crash
+
+    Returns:
+        tuple: (number of records replayed, bytes read)
+    """
+    count = 0
+    size = 0
+    try:
+        with open(log_file, 'rb') as f:
+            for line in f:
+                size += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn write; later records start on a line of their own
+                apply_log_record(data, record, positions)
+                count += 1
+    except IOError:
+        pass
+    return count, size
+
+def apply_log_record(data, record, positions):
+    """Apply one log record to the data structure"""
+    op = record.get('op')
+    if op in ('add_ticket', 'update_ticket', 'upsert_tickets'):
+        tickets = data.setdefault('tickets', [])
+        for ticket in record['tickets'] if op == 'upsert_tickets' else [record['ticket']]:
+            if ticket['id'] in positions:
+                tickets[positions[ticket['id']]] = ticket
+            else:
+                positions[ticket['id']] = len(tickets)
+                tickets.append(ticket)
+    elif op == 'update_tickets':
+        data['tickets'] = record['tickets']
+        positions.clear()
+        positions.update({t['id']: i for i, t in enumerate(data['tickets'])})
+    elif op == 'update_settings':
+        data['settings'] = record['settings']
+    elif op == 'replace_data':
+        data.clear()
+        data.update(record['data'])
+        positions.clear()
+        positions.update({t['id']: i for i, t in enumerate(data.get('tickets', []))})
+
+def read_data_file(data_file):
+    """
+    Read a data file with its pending log and comment store, changing none of them
+
+    Args:
+        data_file (str): Path to the JSON data file
+
+    Returns:
+        tuple: (tickets with their comments embedded, as in backups; settings)
+    """
+    with open(data_file, 'r') as f:
+        data = json.load(f)
+    base = os.path.splitext(data_file)[0]
+    replay_log_file(base + '.log', data)
+    threads = read_comments(base + '.comments.jsonl')
+    tickets = []
+    for ticket in data.get('tickets', []):
+        ticket, embedded = detach_comments(ticket)
+        # Stored comments win over embedded ones, as when the file is opened
+        tickets.append(dict(ticket, comments=threads.get(ticket['id']) or embedded))
+    return tickets, data.get('settings', {})
+
+
 class Database:
-    def __init__(self):
-        self.data_file = "helpdesk_data.json"
+    def __init__(self, data_file="helpdesk_data.json", storage_mode=None,
+                 compact_threshold=LOG_COMPACT_THRESHOLD, durability=None, flush_interval_ms=None):
+        self.data_file = data_file
+        self.storage_mode = storage_mode or os.environ.get('HELPDESK_STORAGE_MODE', 'json')
+        if self.storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {self.storage_mode}")
+        self.durability = durability or os.environ.get('HELPDESK_DURABILITY', 'always')
+        if self.durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {self.durability}")
+        if flush_interval_ms is None:
+            flush_interval_ms = int(os.environ.get('HELPDESK_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS))
+        self.flush_interval = flush_interval_ms / 1000
+        self.log_file = os.path.splitext(data_file)[0] + '.log'
+        self.log_handle = None
+        self.log_size = 0          # Bytes of the log we replayed or wrote; None if others may have written
+        self.unsynced_log = []     # Lines appended since the log was last synced
+        self.comments = CommentStore(os.path.splitext(data_file)[0] + '.comments.jsonl')
+        self.compact_threshold = compact_threshold
+        self.log_records = 0
+        self.lock = ReadWriteLock()
+        
+        # Writes are numbered; flushed_seq is the last one known to be on disk
+        self.write_seq = 0
+        self.flushed_seq = 0
+        self.flush_lock = threading.RLock()
+        self.flush_cond = threading.Condition()
+        self.closed = False
+        self.ticket_positions = {}
+        self.field_indexes = {field: FieldIndex(field) for field in INDEXED_FIELDS}
+        self.statistics = TicketStatistics()
+        self.time_indexes = {field: TimeIndex(field) for field in TICKET_SORT_FIELDS}
+        self.recency = self.time_indexes['created_date']
+        self.search_index = SearchIndex()
+        self.indexes = (list(self.field_indexes.values()) + list(self.time_indexes.values())
+                        + [self.statistics, self.search_index])
+        self.journal = ChangeJournal()
+        self.pending_comments = {}  # Ticket id -> embedded comments not yet in the comment store
         self.data = self.load_data()
+        self.file_signature = self.current_signature()
+        self.rebuild_indexes()
+        
+        if self.durability == 'interval':
+            threading.Thread(target=self.flush_loop, name='helpdesk-flush', daemon=True).start()
+        atexit.register(self.close)
     
     def load_data(self):
+        """Load the snapshot, replay any logged mutations on top of it and load the comments"""
+        data = self.load_snapshot()
+        if self.storage_mode == 'log':
+            self.log_records, self.log_size = self.replay_log(data)
+        self.load_comments(data)
+        
+        # Converted one by one so the decoded dicts are freed as we go
+        tickets = data.get('tickets', [])
+        for position, ticket in enumerate(tickets):
+            tickets[position] = TicketRecord(ticket)
+        self.record_file_sizes()
+        return data
+    
+    def load_comments(self, data):
+        """
+        Scan the comment store and make the tickets' comment counts match it
+        
+        Comments still embedded in tickets, from data files written before
+        the comment store existed, are detached into pending_comments. Nothing
+        is written here: store_pending_comments moves them into the store
+        when the first change is made, so opening a file only to read it
+        leaves it untouched.
+        
+        Args:
+            data (dict): Loaded data, modified in place
+        """
+        self.pending_comments = {}
+        self.search_index.clear_comments()
+        last_dates = {}
+        for ticket_id, comment in self.comments.scan():
+            self.search_index.add_comment(ticket_id, comment.get('comment'))
+            last_dates[ticket_id] = comment.get('timestamp')
+        
+        tickets = data.get('tickets', [])
+        for position, ticket in enumerate(tickets):
+            ticket_id = ticket['id']
+            if 'comments' in ticket:
+                ticket, embedded = detach_comments(ticket)
+                # A crash during an earlier move may have left them in both places
+                if embedded and not self.comments.count(ticket_id):
+                    self.pending_comments[ticket_id] = embedded
+                    for comment in embedded:
+                        self.search_index.add_comment(ticket_id, comment.get('comment'))
+                        last_dates[ticket_id] = comment.get('timestamp')
+                tickets[position] = ticket
+            
+            count = self.comment_count(ticket_id)
+            if ticket.get('comment_count') != count or ticket.get('last_comment_date') != last_dates.get(ticket_id):
+                tickets[position] = dict(ticket, comment_count=count, last_comment_date=last_dates.get(ticket_id))
+    
+    def migrate_comments(self):
+        """
+        Move comments embedded in tickets of an older data file to the comment store
+        
+        This also happens on the first change; calling it saves the tickets
+        without their comments right away.
+        
+        Returns:
+            bool: True if the tickets were saved
+        """
+        with self.transaction():
+            self.store_pending_comments()
+        return self.flush()
+    
+    def comment_count(self, ticket_id):
+        """Number of comments on a ticket, stored or pending"""
+        return self.comments.count(ticket_id) + len(self.pending_comments.get(ticket_id, ()))
+    
+    def thread(self, ticket_id, offset=0, limit=None):
+        """Part of a ticket's comment thread, stored or pending; needs the read lock"""
+        pending = self.pending_comments.get(ticket_id)
+        if pending is None:
+            return self.comments.get(ticket_id, offset, limit)
+        return pending[offset:None if limit is None else offset + limit]
+    
+    def store_pending_comments(self):
+        """
+        Move detached legacy comments into the comment store; needs the write lock
+        
+        The next flush writes a full snapshot, so the data file no longer
+        embeds them.
+        """
+        if not self.pending_comments:
+            return
+        for ticket_id, comments in self.pending_comments.items():
+            for comment in comments:
+                self.comments.append(ticket_id, comment)
+        self.pending_comments = {}
+        self.write_seq += 1
+        self.log_records = max(self.log_records, self.compact_threshold)
+    
+    def record_file_sizes(self):
+        """Report the sizes of the data, log and comment files to the metrics registry"""
+        record_file_size('snapshot', self.data_file)
+        record_file_size('log', self.log_file)
+        record_file_size('comments', self.comments.path)
+    
+    def current_signature(self):
+        """Modification time and size of the data, log and comment files"""
+        signature = []
+        for path in (self.data_file, self.log_file, self.comments.path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def refresh(self):
+        """Reload data if the files were changed by someone else since we last read or wrote them"""
+        if self.flushed_seq < self.write_seq:
+            return  # Our own unflushed changes take precedence
+        if self.current_signature() == self.file_signature:
+            return
+        
+        with self.lock.write_lock():
+            signature = self.current_signature()
+            if signature != self.file_signature and self.flushed_seq == self.write_seq:
+                self.data = self.load_data()
+                self.file_signature = signature
+                self.rebuild_indexes()
+    
+    def rebuild_indexes(self):
+        """Rebuild the in-memory ticket indexes from the ticket list"""
+        tickets = self.data.get('tickets', [])
+        self.ticket_positions = {t['id']: i for i, t in enumerate(tickets)}
+        for index in self.indexes:
+            index.rebuild(tickets)
+        self.journal.record(None)
+    
+    def load_snapshot(self):
         """Load data from file or create initial structure"""
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r') as f:
+                    observe_bytes('load_data', os.fstat(f.fileno()).st_size)
                     return json.load(f)
             except (json.JSONDecodeError, IOError):
                 pass
         
-        # Return default data structure with some sample tickets
-        return {
-            'tickets': [
-                {
-                    'id': '0001',
-                    'title': 'Computer won\'t start',
-                    'description': 'My desktop computer won\'t turn on this morning. No lights or sounds when pressing power button.',
-                    'category': 'Hardware Issues',
-                    'priority': 'High',
-                    'urgency': 'High',
-                    'status': 'Open',
-                    'employee_id': 'EMP001',
-                    'employee_name': 'John Doe',
-                    'employee_email': 'john.doe@company.com',
-                    'department': 'Information Technology',
-                    'location': 'Building A, Floor 3, Desk 15',
-                    'phone': '+1-555-0101',
-                    'created_date': '2025-06-20 09:15:30',
-                    'updated_date': '2025-06-20 09:15:30',
-                    'assigned_to': None,
-                    'resolution': '',
-                    'attachments': [],
-                    'comments': []
-                },
-                {
-                    'id': '0002',
-                    'title': 'Email not syncing on mobile device',
-                    'description': 'Unable to receive emails on my iPhone. Last sync was yesterday evening.',
-                    'category': 'Email/Communication',
-                    'priority': 'Medium',
-                    'urgency': 'Medium',
-                    'status': 'In Progress',
-                    'employee_id': 'EMP004',
-                    'employee_name': 'Alice Brown',
-                    'employee_email': 'alice.brown@company.com',
-                    'department': 'Human Resources',
-                    'location': 'Building B, Floor 2',
-                    'phone': '+1-555-0201',
-                    'created_date': '2025-06-19 14:30:15',
-                    'updated_date': '2025-06-20 10:45:22',
-                    'assigned_to': 'John Smith (IT)',
-                    'resolution': '',
-                    'attachments': [],
-                    'comments': [
-                        {
-                            'author': 'John Smith (IT)',
-                            'comment': 'Checking Exchange server settings. Will update shortly.',
-                            'timestamp': '2025-06-20 10:45:22'
-                        }
-                    ]
-                },
-                {
-                    'id': '0003',
-                    'title': 'Printer offline in accounting department',
-                    'description': 'The main printer in accounting shows as offline. Cannot print invoices.',
-                    'category': 'Printer/Peripherals',
-                    'priority': 'Medium',
-                    'urgency': 'High',
-                    'status': 'Resolved',
-                    'employee_id': 'EMP006',
-                    'employee_name': 'David Miller',
-                    'employee_email': 'david.miller@company.com',
-                    'department': 'Finance',
-                    'location': 'Building C, Floor 1',
-                    'phone': '+1-555-0301',
-                    'created_date': '2025-06-18 11:20:45',
-                    'updated_date': '2025-06-19 16:30:12',
-                    'assigned_to': 'Sarah Johnson (IT)',
-                    'resolution': 'Printer driver was corrupted. Reinstalled drivers and printer is now working normally.',
-                    'attachments': [],
-                    'comments': [
-                        {
-                            'author': 'Sarah Johnson (IT)',
-                            'comment': 'Investigating printer connection issues.',
-                            'timestamp': '2025-06-18 13:15:30'
-                        },
-                        {
-                            'author': 'Sarah Johnson (IT)',
-                            'comment': 'Found driver corruption. Reinstalling now.',
-                            'timestamp': '2025-06-19 16:25:45'
-                        }
-                    ]
-                },
-                {
-                    'id': '0004',
-                    'title': 'VPN connection keeps dropping',
-                    'description': 'VPN connection disconnects every 10-15 minutes when working from home.',
-                    'category': 'Network/Connectivity',
-                    'priority': 'Medium',
-                    'urgency': 'Medium',
-                    'status': 'Open',
-                    'employee_id': 'EMP008',
-                    'employee_name': 'Michael Taylor',
-                    'employee_email': 'michael.taylor@company.com',
-                    'department': 'Marketing',
-                    'location': 'Remote - Home Office',
-                    'phone': '+1-555-0401',
-                    'created_date': '2025-06-21 08:45:10',
-                    'updated_date': '2025-06-21 08:45:10',
-                    'assigned_to': None,
-                    'resolution': '',
-                    'attachments': [],
-                    'comments': []
-                },
-                {
-                    'id': '0005',
-                    'title': 'Need access to new project folder',
-                    'description': 'Require access to the Project Phoenix shared folder for the new marketing campaign.',
-                    'category': 'Security/Access',
-                    'priority': 'Low',
-                    'urgency': 'Low',
-                    'status': 'Closed',
-                    'employee_id': 'EMP008',
-                    'employee_name': 'Michael Taylor',
-                    'employee_email': 'michael.taylor@company.com',
-                    'department': 'Marketing',
-                    'location': 'Building D, Floor 2',
-                    'phone': '+1-555-0401',
-                    'created_date': '2025-06-17 13:20:35',
-                    'updated_date': '2025-06-18 09:15:22',
-                    'assigned_to': 'Mike Wilson (IT)',
-                    'resolution': 'Access granted to Project Phoenix folder. User can now access all required documents.',
-                    'attachments': [],
-                    'comments': [
-                        {
-                            'author': 'Mike Wilson (IT)',
-                            'comment': 'Verifying permissions with manager.',
-                            'timestamp': '2025-06-17 15:30:12'
-                        },
-                        {
-                            'author': 'Mike Wilson (IT)',
-                            'comment': 'Approval received. Granting access now.',
-                            'timestamp': '2025-06-18 09:10:45'
-                        }
-                    ]
-                }
-            ],
-            'settings': {
-                'auto_assign': True,
-                'escalation_enabled': True,
-                'business_hours_only': False,
-                'default_priority': 'Medium',
-                'max_response_time': 24,
-                'notification_settings': {
-                    'email_enabled': True,
-                    'sms_enabled': False,
-                    'slack_enabled': True
-                }
-            }
-        }
+        return default_data()
     
     def save_data(self):
-        """Save data to file"""
+        """Atomically write the full data file"""
+        with self.lock.read_lock():
+            payload = json.dumps(self.data, indent=2, default=encode_json)
+        return self.write_snapshot(payload)
+    
+    def write_snapshot(self, payload):
+        """
+        Replace the data file with new contents without ever leaving a partial file
+        
+        The contents are written to a temporary file in the same directory,
+        synced, and renamed over the data file.
+        
+        Args:
+            payload (str): Serialized data
+            
+        Returns:
+            bool: True if the file was written
+        """
+        directory = os.path.dirname(os.path.abspath(self.data_file))
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix='.helpdesk_', suffix='.tmp', dir=directory)
+        except OSError:
+            logger.exception("Could not create a temporary file in %s", directory)
+            return False
+        
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.data_file)
+        except OSError:
+            logger.exception("Could not save %s", self.data_file)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+        
+        fsync_directory(directory)
+        observe_bytes('save_data', len(payload))
+        return True
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the write lock for a group of changes and commit them afterwards
+        
+        Nested transactions commit once, when the outermost one finishes.
+        """
+        with self.lock.write_lock():
+            self.store_pending_comments()
+            yield
+        self.commit()
+    
+    def persist(self, record):
+        """
+        Record a mutation for the next flush; must be called under the write lock
+        
+        Args:
+            record (dict): Log record describing the mutation
+        """
+        self.write_seq += 1
+        if self.storage_mode == 'log':
+            self.append_log(record)
+    
+    def append_log(self, record):
+        """Append a mutation record to the (buffered) log file"""
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.data, f, indent=2)
+            if self.log_handle is None or not self.log_is_current():
+                self.open_log()
+            line = json.dumps(record, default=encode_json) + '\n'
+            self.log_handle.write(line)
         except IOError:
-            pass  # Handle file write errors gracefully
+            logger.exception("Could not append to %s", self.log_file)
+            return
+        self.unsynced_log.append(line)
+        self.log_records += 1
+        if self.log_size is not None:
+            self.log_size += len(line)
+        observe_bytes('append_log', len(line))
+    
+    def open_log(self):
+        """
+        Open the log file for appending
+        
+        A handle left on a log that another process has since compacted is
+        replaced. Should the file end in a torn line, a newline is written
+        first so that our records start on a line of their own.
+        """
+        if self.log_handle is not None:
+            self.close_log()
+            self.log_size = None  # The new log may hold other processes' records
+        self.log_handle = open(self.log_file, 'a')
+        if self.log_handle.tell():
+            with open(self.log_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.log_handle.write('\n')
+                    self.log_size = None
+    
+    def log_is_current(self):
+        """Whether the open log handle still refers to the file at log_file"""
+        try:
+            return os.path.samestat(os.stat(self.log_file), os.fstat(self.log_handle.fileno()))
+        except (OSError, ValueError):
+            return False
+    
+    def sync_log(self):
+        """
+        Flush the log file to disk
+        
+        If another process compacted the log while our lines were being
+        written, they may have missed its snapshot, so they are appended
+        again to the new log; records are idempotent upserts.
+        """
+        if self.log_handle is None:
+            return True
+        try:
+            self.log_handle.flush()
+            os.fsync(self.log_handle.fileno())
+            while not self.log_is_current():
+                self.open_log()
+                self.log_handle.write(''.join(self.unsynced_log))
+                self.log_handle.flush()
+                os.fsync(self.log_handle.fileno())
+            self.unsynced_log = []
+            return True
+        except (IOError, ValueError):
+            logger.exception("Could not sync %s", self.log_file)
+            return False
+    
+    def close_log(self):
+        """Close the log file handle, if open; call sync_log first to keep its lines"""
+        if self.log_handle is not None:
+            try:
+                self.log_handle.close()
+            except IOError:
+                pass
+            self.log_handle = None
+    
+    def commit(self):
+        """Make recorded mutations durable according to the durability policy"""
+        if self.lock.owns_write():
+            return  # The outermost transaction commits
+        if self.durability == 'always':
+            self.flush()
+        elif self.durability == 'interval':
+            with self.flush_cond:
+                self.flush_cond.notify()
+    
+    def flush(self):
+        """
+        Write all recorded mutations to disk
+        
+        Concurrent callers are grouped: whoever flushes first also writes
+        the changes of everyone waiting behind it, and the others return
+        without writing again. Must not be called under the write lock.
+        
+        Returns:
+            bool: True if everything recorded before the call is on disk
+        """
+        target = self.write_seq
+        with self.flush_lock:
+            if self.flushed_seq >= target:
+                return True
+            
+            if self.storage_mode == 'log':
+                if self.log_records >= self.compact_threshold:
+                    return self.compact()
+                with self.lock.read_lock():
+                    seq = self.write_seq
+                    ok = self.comments.sync() and self.sync_log()
+            else:
+                with self.lock.read_lock():
+                    seq = self.write_seq
+                    synced = self.comments.sync()
+                    payload = json.dumps(self.data, indent=2, default=encode_json)
+                ok = synced and self.write_snapshot(payload)
+            
+            if ok:
+                self.file_signature = self.current_signature()
+                self.flushed_seq = max(self.flushed_seq, seq)
+                self.record_file_sizes()
+            return ok
+    
+    def flush_loop(self):
+        """Background flusher for the 'interval' durability policy"""
+        while not self.closed:
+            with self.flush_cond:
+                while self.flushed_seq >= self.write_seq and not self.closed:
+                    self.flush_cond.wait()
+            # Let more writes accumulate so they share one flush
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def close(self):
+        """Flush pending changes and stop the background flusher"""
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        with self.flush_cond:
+            self.flush_cond.notify()
+        self.flush()
+        with self.flush_lock:
+            self.close_log()
+            self.comments.close()
+    
+    def replay_log(self, data):
+        """
+        Apply logged mutations to a freshly loaded snapshot
+        
+        Records are idempotent (tickets are upserted by id), so replaying a log
+        that was already folded into the snapshot is harmless.
+        
+        Args:
+            data (dict): Snapshot data, modified in place
+            
+        Returns:
+            tuple: (number of records replayed, bytes of the log read)
+        """
+        return replay_log_file(self.log_file, data)
+    
+    def compact(self):
+        """
+        Fold the mutation log into the snapshot file
+        
+        The log is renamed aside rather than removed, so processes still
+        appending to it notice (see sync_log) and move on to a new log. If
+        the renamed log holds records we did not write or replay, the data
+        is reloaded from the snapshot and the log first so that those
+        records end up in the snapshot too. A log left renamed aside by a
+        crash or by a compaction in another process is folded in, and the
+        current log is then kept.
+        
+        Returns:
+            bool: True if the snapshot was written and the log cleared
+        """
+        with self.flush_lock, self.lock.write_lock():
+            seq = self.write_seq
+            if not self.comments.sync() or not self.sync_log():
+                return False
+            
+            self.close_log()
+            compacting = compacting_log_file(self.log_file)
+            try:
+                rotated = not os.path.exists(compacting) and os.path.exists(self.log_file)
+                if rotated:
+                    os.replace(self.log_file, compacting)
+                    reload = os.path.getsize(compacting) != self.log_size
+                else:
+                    reload = os.path.exists(compacting)
+            except OSError:
+                logger.exception("Could not move %s aside", self.log_file)
+                return False
+            
+            if reload:
+                self.data = self.load_data()
+                self.rebuild_indexes()
+            else:
+                self.log_records = 0
+                self.log_size = 0
+            try:
+                if not self.save_data():
+                    return False
+                if os.path.exists(compacting):
+                    os.remove(compacting)
+            except OSError:
+                logger.exception("Could not remove %s", compacting)
+                return False
+            finally:
+                self.file_signature = self.current_signature()
+            self.flushed_seq = seq
+            self.record_file_sizes()
+            return True
     
     def get_tickets(self):
         """Get all tickets"""
-        return self.data.get('tickets', [])
+        self.refresh()
+        with self.lock.read_lock():
+            return list(self.data.get('tickets', []))
+    
+    def count_tickets(self):
+        """Get the number of tickets"""
+        self.refresh()
+        with self.lock.read_lock():
+            return len(self.data.get('tickets', []))
     
     def add_ticket(self, ticket):
         """Add a new ticket"""
-        if 'tickets' not in self.data:
-            self.data['tickets'] = []
+        ticket = TicketRecord(ticket)
+        with self.transaction():
+            if 'tickets' not in self.data:
+                self.data['tickets'] = []
+            
+            self.ticket_positions[ticket['id']] = len(self.data['tickets'])
+            self.data['tickets'].append(ticket)
+            for index in self.indexes:
+                index.put(ticket)
+            self.journal.record([ticket['id']])
+            self.persist({'op': 'add_ticket', 'ticket': ticket})
+    
+    def get_ticket(self, ticket_id):
+        """Get a single ticket by id, or None if it does not exist"""
+        self.refresh()
+        with self.lock.read_lock():
+            position = self.ticket_positions.get(ticket_id)
+            return None if position is None else self.data['tickets'][position]
+    
+    def update_ticket(self, ticket):
+        """
+        Replace a single existing ticket
+        
+        In log mode only the changed ticket is written.
+        
+        Args:
+            ticket (dict): Updated ticket, matched on its id
+            
+        Returns:
+            bool: True if the ticket exists and was replaced
+        """
+        ticket = TicketRecord(ticket)
+        with self.transaction():
+            position = self.ticket_positions.get(ticket['id'])
+            if position is None:
+                return False
+            
+            self.data['tickets'][position] = ticket
+            for index in self.indexes:
+                index.put(ticket)
+            self.journal.record([ticket['id']])
+            self.persist({'op': 'update_ticket', 'ticket': ticket})
+            return True
+    
+    def add_comment(self, ticket, comment):
+        """
+        Append a comment to a ticket's thread and update the ticket
+        
+        Only the comment count and last comment date are stored on the
+        ticket; the comment itself goes to the comment store.
+        
+        Args:
+            ticket (dict): Updated ticket, matched on its id
+            comment (dict): Comment with author, comment and timestamp
+            
+        Returns:
+            bool: True if the ticket exists and the comment was added
+        """
+        with self.transaction():
+            if ticket['id'] not in self.ticket_positions:
+                return False
+            
+            self.comments.append(ticket['id'], comment)
+            self.search_index.add_comment(ticket['id'], comment.get('comment'))
+            ticket = dict(ticket, comment_count=self.comments.count(ticket['id']),
+                          last_comment_date=comment.get('timestamp'))
+            return self.update_ticket(ticket)
+    
+    def get_comments(self, ticket_id, offset=0, limit=None):
+        """
+        Get part of a ticket's comment thread, oldest first
+        
+        Args:
+            ticket_id (str): Ticket ID
+            offset (int): Number of comments to skip
+            limit (int): Maximum number of comments, or None for the rest
+            
+        Returns:
+            list: Comments
+        """
+        self.refresh()
+        with self.lock.read_lock():
+            return self.thread(ticket_id, offset, limit)
+    
+    def export_tickets(self):
+        """Get all tickets with their comments embedded, as stored in backups"""
+        self.refresh()
+        with self.lock.read_lock():
+            return self.tickets_with_comments()
+    
+    def tickets_with_comments(self):
+        """All tickets with their comments embedded; needs the read lock"""
+        return [dict(t, comments=self.thread(t['id'])) for t in self.data.get('tickets', [])]
+    
+    def iter_tickets(self, batch_size=1000):
+        """
+        Iterate over all tickets in storage order, with their comments embedded
         
-        self.data['tickets'].append(ticket)
-        self.save_data()
+        The read lock is only held while each batch is copied, so writers are
+        not blocked for the whole iteration. Tickets added during iteration may
+        or may not be seen.
+        
+        Args:
+            batch_size (int): Tickets read per batch
+            
+        Yields:
+            dict: Ticket with a 'comments' list, as stored in backups
+        """
+        position = 0
+        while True:
+            self.refresh()
+            with self.lock.read_lock():
+                batch = [dict(t, comments=self.thread(t['id']))
+                         for t in self.data.get('tickets', [])[position:position + batch_size]]
+            if not batch:
+                return
+            yield from batch
+            position += len(batch)
+    
+    def upsert_tickets(self, tickets):
+        """
+        Add or replace a batch of tickets, matched on their ids
+        
+        Embedded comments are moved to the comment store, but only for tickets
+        that have no stored comments yet, so importing the same file twice does
+        not duplicate threads. In log mode the batch is a single log record.
+        
+        Args:
+            tickets (list): Tickets, optionally with a 'comments' list
+            
+        Returns:
+            int: Number of tickets that did not exist before
+        """
+        added = 0
+        stored = []
+        with self.transaction():
+            tickets_list = self.data.setdefault('tickets', [])
+            for ticket in tickets:
+                ticket, comments = detach_comments(ticket)
+                ticket_id = ticket['id']
+                position = self.ticket_positions.get(ticket_id)
+                if comments and not self.comments.count(ticket_id):
+                    for comment in comments:
+                        self.comments.append(ticket_id, comment)
+                        self.search_index.add_comment(ticket_id, comment.get('comment'))
+                elif position is not None:
+                    ticket['last_comment_date'] = tickets_list[position].get('last_comment_date')
+                ticket['comment_count'] = self.comments.count(ticket_id)
+                ticket = TicketRecord(ticket)
+                
+                if position is None:
+                    self.ticket_positions[ticket_id] = len(tickets_list)
+                    tickets_list.append(ticket)
+                    added += 1
+                else:
+                    tickets_list[position] = ticket
+                for index in self.indexes:
+                    index.put(ticket)
+                stored.append(ticket)
+            
+            self.journal.record([t['id'] for t in stored])
+            self.persist({'op': 'upsert_tickets', 'tickets': stored})
+        return added
+    
+    def find_tickets(self, **filters):
+        """
+        Get tickets matching all of the given field values
+        
+        Args:
+            **filters: Field/value pairs from TICKET_FILTER_FIELDS. A value of
+                None for 'assigned_to' matches unassigned tickets, and
+                'assigned' (bool) matches tickets with or without an assignee.
+                
+        Returns:
+            list: List of matching tickets
+        """
+        check_filters(filters)
+        
+        self.refresh()
+        with self.lock.read_lock():
+            tickets = self.data.get('tickets', [])
+            if not filters:
+                return list(tickets)
+            
+            # Start from the most selective filter
+            steps = sorted(filters.items(), key=lambda step: self.index_cardinality(*step))
+            ids, _ = self.run_steps(steps)
+            positions = sorted(self.ticket_positions[ticket_id] for ticket_id in ids)
+            return [tickets[position] for position in positions]
+    
+    def find_tickets_for_employees(self, employee_ids):
+        """
+        Get the tickets raised by any of several employees
+        
+        Args:
+            employee_ids (iterable): Employee IDs
+            
+        Returns:
+            list: Matching tickets, in storage order
+        """
+        self.refresh()
+        with self.lock.read_lock():
+            tickets = self.data.get('tickets', [])
+            index = self.field_indexes['employee_id']
+            positions = sorted(self.ticket_positions[ticket_id]
+                               for employee_id in set(employee_ids)
+                               for ticket_id in index.lookup(employee_id))
+            return [tickets[position] for position in positions]
+    
+    def index_cardinality(self, field, value):
+        """
+        Estimate how many tickets match a single filter, using the indexes only
+        
+        Args:
+            field (str): Filter field, 'assigned' or 'search'
+            value: Filter value
+            
+        Returns:
+            int: Exact count for field filters, an upper bound for searches
+        """
+        with self.lock.read_lock():
+            if field == 'id':
+                return 1 if value in self.ticket_positions else 0
+            if field == 'search':
+                return self.search_index.estimate(value)
+            if field == 'assigned':
+                unassigned = self.field_indexes['assigned_to'].cardinality(None)
+                return len(self.ticket_positions) - unassigned if value else unassigned
+            return self.field_indexes[field].cardinality(value)
+    
+    def run_steps(self, steps, trace=None):
+        """
+        Evaluate conjunctive filter steps in the given order; needs the read lock
+        
+        The first step produces the candidate ids and every later step only
+        checks the remaining candidates, so the cost follows the first step.
+        
+        Args:
+            steps (list): (field, value) pairs, as for find_tickets plus 'search'
+            trace (list): Optional list that receives a dict with the field,
+                value and rows left after each step that ran
+                
+        Returns:
+            tuple: (set of matching ids or None if there are no steps,
+                    matching ids best match first if a step was a search, else None)
+        """
+        unassigned = self.field_indexes['assigned_to'].lookup(None)
+        ids = None
+        ranked = None
+        for field, value in steps:
+            if field == 'search':
+                ranked = self.search_index.search(value, candidates=ids)
+                ids = set(ranked)
+            elif field == 'id':
+                ids = {value} if value in self.ticket_positions and (ids is None or value in ids) else set()
+            elif field == 'assigned' and value:
+                ids = (self.ticket_positions.keys() if ids is None else ids) - unassigned
+            else:
+                matches = unassigned if field == 'assigned' else self.field_indexes[field].lookup(value)
+                ids = set(matches) if ids is None else ids.intersection(matches)
+            
+            if trace is not None:
+                trace.append({'field': field, 'value': value, 'rows': len(ids)})
+            if not ids:
+                break
+        
+        if ranked is not None and len(ranked) != len(ids):
+            ranked = [ticket_id for ticket_id in ranked if ticket_id in ids]
+        return ids, ranked
+    
+    def find_page(self, steps=(), sort=None, offset=0, limit=None, trace=None):
+        """
+        Get one page of the tickets matching all filter steps
+        
+        Only the tickets on the page are collected, so the cost of rendering
+        a page does not grow with the number of matches.
+        
+        Args:
+            steps (list): (field, value) pairs, evaluated in the given order.
+                Fields are as for find_tickets, plus 'search' (str) which
+                matches ticket text with every word as a prefix.
+            sort (str): Field from TICKET_SORT_FIELDS, prefixed with '-' for
+                descending order. Defaults to relevance when searching and to
+                creation order otherwise.
+            offset (int): Number of matching tickets to skip
+            limit (int): Maximum number of tickets to return, or None for all
+            trace (list): Optional list that receives a dict with the field,
+                value and rows left after each step that ran
+            
+        Returns:
+            tuple: (list of tickets on the page, total number of matching tickets)
+        """
+        steps = list(steps)
+        check_filters(dict(steps), search=True)
+        field, descending = parse_sort(sort)
+        end = None if limit is None else offset + limit
+        
+        self.refresh()
+        with self.lock.read_lock():
+            tickets = self.data.get('tickets', [])
+            positions = self.ticket_positions
+            ids, ranked = self.run_steps(steps, trace)
+            
+            if ranked is not None and field is None:
+                return [tickets[positions[ticket_id]] for ticket_id in ranked[offset:end]], len(ranked)
+            if ids is None and field is None:
+                return tickets[offset:end], len(tickets)
+            if ids is None and field is not None:
+                # The time index is already in (date, id) order
+                entries = self.time_indexes[field].entries
+                keys = reversed(entries) if descending else iter(entries)
+                return ([tickets[positions[key[1]]] for key in itertools.islice(keys, offset, end)],
+                        len(entries))
+            
+            if ids is None:
+                ids = positions.keys()
+            key = positions.__getitem__ if field is None else self.time_indexes[field].keys.__getitem__
+            
+            if end is None:
+                page = sorted(ids, key=key, reverse=descending)[offset:]
+            elif descending:
+                page = heapq.nlargest(end, ids, key=key)[offset:]
+            else:
+                page = heapq.nsmallest(end, ids, key=key)[offset:]
+            return [tickets[positions[ticket_id]] for ticket_id in page], len(ids)
     
     def update_tickets(self, tickets):
         """Update all tickets"""
-        self.data['tickets'] = tickets
-        self.save_data()
+        tickets = [TicketRecord(t) for t in tickets]
+        with self.transaction():
+            self.data['tickets'] = tickets
+            self.rebuild_indexes()
+            self.persist({'op': 'update_tickets', 'tickets': tickets})
+    
+    def find_tickets_between(self, field, start=None, end=None):
+        """
+        Get the tickets whose date falls in a range, oldest first
+        
+        Args:
+            field (str): 'created_date' or 'updated_date'
+            start (int): First epoch second included, or None for no lower bound
+            end (int): First epoch second excluded, or None for no upper bound
+            
+        Returns:
+            list: Matching tickets
+        """
+        if field not in TICKET_SORT_FIELDS:
+            raise ValueError(f"Cannot look up tickets by {field}")
+        self.refresh()
+        with self.lock.read_lock():
+            tickets = self.data.get('tickets', [])
+            return [tickets[self.ticket_positions[ticket_id]]
+                    for ticket_id in self.time_indexes[field].between(start, end)]
+    
+    def get_recent_tickets(self, limit, before=None):
+        """
+        Get the most recently created tickets, newest first
+        
+        Args:
+            limit (int): Maximum number of tickets to return
+            before (tuple): Optional (created_date, id) cursor; only tickets
+                created before it are returned
+                
+        Returns:
+            list: List of tickets
+        """
+        self.refresh()
+        with self.lock.read_lock():
+            tickets = self.data.get('tickets', [])
+            return [tickets[self.ticket_positions[ticket_id]]
+                    for ticket_id in self.recency.latest(limit, before)]
+    
+    def search_tickets(self, query, limit=None):
+        """
+        Full-text search over ticket text and comments
+        
+        Args:
+            query (str): Search text; every word must match, as a prefix
+            limit (int): Maximum number of results, or None for all
+            
+        Returns:
+            list: Matching tickets, best match first
+        """
+        self.refresh()
+        with self.lock.read_lock():
+            tickets = self.data.get('tickets', [])
+            return [tickets[self.ticket_positions[ticket_id]]
+                    for ticket_id in self.search_index.search(query, limit)]
+    
+    def get_version(self):
+        """Get the data version, which increases with every change"""
+        self.refresh()
+        return self.journal.version
+    
+    def changes_since(self, version):
+        """
+        Get the ids of tickets changed after a data version
+        
+        Args:
+            version (int): Version returned by an earlier get_version call
+            
+        Returns:
+            set: Changed ticket ids, or None if everything must be reloaded
+        """
+        self.refresh()
+        with self.lock.read_lock():
+            return self.journal.changes_since(version)
+    
+    def get_ticket_statistics(self):
+        """Get ticket counts by status, priority and assignment"""
+        self.refresh()
+        with self.lock.read_lock():
+            return self.statistics.as_dict()
     
     def get_settings(self):
         """Get system settings"""
-        return self.data.get('settings', {})
+        self.refresh()
+        with self.lock.read_lock():
+            return self.data.get('settings', {})
     
     def update_settings(self, settings):
         """Update system settings"""
-        self.data['settings'] = settings
-        self.save_data()
+        with self.transaction():
+            self.data['settings'] = settings
+            self.journal.record()
+            self.persist({'op': 'update_settings', 'settings': settings})
     
     def backup_data(self):
-        """Create a backup of current data"""
+        """Create a backup of current data, with the comments embedded in their tickets"""
         backup_filename = f"helpdesk_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        self.refresh()
         try:
-            with open(backup_filename, 'w') as f:
-                json.dump(self.data, f, indent=2)
+            with self.lock.read_lock(), open(backup_filename, 'w') as f:
+                json.dump(dict(self.data, tickets=self.tickets_with_comments()), f, indent=2)
             return backup_filename
         except IOError:
             return None
@@ -220,25 +1316,59 @@ class Database:
         """Restore data from backup"""
         try:
             with open(backup_file, 'r') as f:
-                self.data = json.load(f)
-            self.save_data()
-            return True
+                data = json.load(f)
         except (IOError, json.JSONDecodeError):
             return False
+        
+        return self.replace_all(data.get('tickets', []), data.get('settings', {}))
+    
+    def replace_all(self, tickets, settings):
+        """
+        Replace all tickets and settings and flush them to disk
+        
+        Args:
+            tickets (list): Complete list of tickets, with their comments embedded
+            settings (dict): System settings
+            
+        Returns:
+            bool: True if the new data was flushed
+        """
+        with self.transaction():
+            self.replace_data({'tickets': tickets, 'settings': settings})
+        return self.flush()
     
     def clear_all_data(self):
         """Clear all data (use with caution)"""
-        self.data = {
-            'tickets': [],
-            'settings': {
-                'auto_assign': True,
-                'escalation_enabled': True,
-                'business_hours_only': False,
-                'default_priority': 'Medium',
-                'max_response_time': 24
-            }
-        }
-        self.save_data()
+        with self.transaction():
+            self.replace_data(empty_data())
+        self.flush()
+    
+    def replace_data(self, data):
+        """
+        Replace all data; must be called in a transaction
+        
+        The comments embedded in the new tickets replace the comment store.
+        """
+        threads = {}
+        tickets = []
+        for ticket in data.get('tickets', []):
+            ticket, comments = detach_comments(ticket)
+            if comments:
+                threads[ticket['id']] = comments
+            tickets.append(TicketRecord(ticket))
+        data = dict(data, tickets=tickets)
+        
+        self.comments.replace(threads)
+        self.search_index.clear_comments()
+        for ticket_id, comments in threads.items():
+            for comment in comments:
+                self.search_index.add_comment(ticket_id, comment.get('comment'))
+        
+        self.data = data
+        self.rebuild_indexes()
+        self.persist({'op': 'replace_data', 'data': data})
+        # Fold the log into the snapshot on the next flush
+        self.log_records = max(self.log_records, self.compact_threshold)
     
     def get_statistics(self):
         """Get database statistics"""
@@ -248,5 +1378,15 @@ class Database:
             'data_file_size': os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0,
             'last_modified': datetime.fromtimestamp(
                 os.path.getmtime(self.data_file)
-            ).strftime('%Y-%m-%d %H:%M:%S') if os.path.exists(self.data_file) else 'Never'
+            ).strftime('%Y-%m-%d %H:%M:%S') if os.path.exists(self.data_file) else 'Never',
+            'storage_mode': self.storage_mode,
+            'log_records': self.log_records,
+            'log_file_size': os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0,
+            'total_comments': self.comments.total() + sum(map(len, self.pending_comments.values())),
+            'comment_file_size': self.comments.size,
+            'durability': self.durability,
+            'pending_writes': self.write_seq - self.flushed_seq
         }
+
+
+instrument_class(Database, 'database')
@@ -0,0 +1,291 @@
+"""
+Employee directory providers and the cache in front of them
+A provider answers employee lookups from some directory: the built-in
+MockActiveDirectory, or an LDAP server such as Active Directory
+(utils.ldap_directory). create_directory picks one from the environment and
+wraps it in a CachedDirectory, so portal reruns do not query the directory
+every time:
+    HELPDESK_DIRECTORY_URL       ldap://host:port or ldaps://host:port; unset for the mock
+    HELPDESK_DIRECTORY_BASE_DN   Search base, e.g. OU=People,DC=company,DC=local
+    HELPDESK_DIRECTORY_BIND_DN   Account to bind as; unset for an anonymous bind
+    HELPDESK_DIRECTORY_PASSWORD  Password of that account
+    HELPDESK_DIRECTORY_TTL_S     Seconds a found employee is cached (default 300)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.org_graph import OrgGraph
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_ENTRIES = 10000
+DEFAULT_TTL = 300
+
+# Misses are cached for a shorter time, so a new hire shows up soon
+DEFAULT_NEGATIVE_TTL = 60
+
+# Placeholder for "not in the cache", since None is a cacheable result
+MISSING = object()
+
+
+class DirectoryProvider:
+    """
+    Base class for employee directories
+
+    Employees are dicts with 'employee_id', 'name', 'email', 'department',
+    'phone', 'manager' (the manager's name), 'location' and 'title'.
+    Subclasses implement get_employee, get_employees_by_department,
+    get_all_employees and search_employees; the rest have defaults built on
+    them. Providers that keep the whole directory in memory should also keep
+    its org graph, which the default rebuilds on every call.
+    """
+
+    def get_employee(self, identifier):
+        """Get an employee by id or email, falling back to the best partial name or email match"""
+        raise NotImplementedError
+
+    def get_employees(self, employee_ids):
+        """
+        Get several employees by id in one call
+
+        Returns:
+            dict: Employee by upper-case id; ids that do not exist are left out
+        """
+        employees = {}
+        for employee_id in employee_ids:
+            employee = self.get_employee(employee_id)
+            if employee is not None and employee['employee_id'].upper() == employee_id.upper():
+                employees[employee_id.upper()] = employee
+        return employees
+
+    def get_all_employees(self):
+        """Get every employee"""
+        raise NotImplementedError
+
+    def get_employees_by_department(self, department):
+        """Get the employees of a department, case-insensitive"""
+        raise NotImplementedError
+
+    def search_employees(self, query, limit=None):
+        """Get employees whose name, email, department or title contain a query, best first"""
+        raise NotImplementedError
+
+    def get_employee_by_name(self, name):
+        """Get the employee with exactly this name, or None"""
+        for employee in self.search_employees(name, limit=None):
+            if employee['name'] == name:
+                return employee
+        return None
+
+    def get_employee_manager(self, employee_id):
+        """Get an employee's manager, or None"""
+        employee = self.get_employee(employee_id)
+        if not employee or not employee.get('manager'):
+            return None
+        return self.get_employee_by_name(employee['manager'])
+
+    def get_org_graph(self):
+        """Reporting lines of the whole directory, see utils.org_graph.OrgGraph"""
+        return OrgGraph(self.get_all_employees())
+
+    def validate_employee(self, employee_id):
+        """Whether an employee id exists"""
+        return employee_id.upper() in self.get_employees([employee_id])
+
+    def close(self):
+        """Release connections, if any"""
+
+
+class DirectoryCache:
+    """
+    Bounded cache whose entries expire
+
+    Entries are evicted least recently used first once max_entries is reached.
+    None and empty results expire after negative_ttl instead of ttl.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()  # Key -> (expiry time, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Get a cached value, or MISSING if it is absent or expired"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Cache a value"""
+        ttl = self.negative_ttl if value is None or value == [] else self.ttl
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Entry count, hits and misses"""
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class CachedDirectory(DirectoryProvider):
+    """
+    Directory provider answering from a DirectoryCache in front of another provider
+
+    Batched lookups only send the ids that are not cached to the provider,
+    in a single call. The org graph is kept outside the cache, see get_org_graph.
+    """
+
+    def __init__(self, provider, cache=None):
+        self.provider = provider
+        self.cache = cache or DirectoryCache()
+        self.org = None
+        self.org_generation = 0  # Increases whenever a new org graph replaces the old one
+        self.org_expires = 0
+        self.org_refreshing = False
+        self.org_lock = threading.Lock()
+        self.org_build_lock = threading.Lock()
+
+    def cached(self, key, load):
+        """Get a value from the cache, loading and caching it on a miss"""
+        value = self.cache.get(key)
+        if value is MISSING:
+            value = load()
+            self.cache.put(key, value)
+        return value
+
+    def remember(self, employee):
+        """Cache an employee under its id and email"""
+        self.cache.put(('employee', employee['employee_id'].upper()), employee)
+        if employee.get('email'):
+            self.cache.put(('employee', employee['email'].lower()), employee)
+
+    def get_employee(self, identifier):
+        key = identifier.strip()
+        key = key.lower() if '@' in key else key.upper()
+        return self.cached(('employee', key), lambda: self.provider.get_employee(identifier))
+
+    def get_employees(self, employee_ids):
+        employees = {}
+        missing = []
+        for employee_id in employee_ids:
+            employee = self.cache.get(('employee', employee_id.upper()))
+            if employee is MISSING:
+                missing.append(employee_id.upper())
+            elif employee is not None:
+                employees[employee_id.upper()] = employee
+        if missing:
+            found = self.provider.get_employees(missing)
+            for employee_id in missing:
+                employee = found.get(employee_id)
+                if employee is None:
+                    self.cache.put(('employee', employee_id), None)
+                else:
+                    self.remember(employee)
+                    employees[employee_id] = employee
+        return employees
+
+    def get_all_employees(self):
+        return self.cached(('all',), self.provider.get_all_employees)
+
+    def get_employees_by_department(self, department):
+        return self.cached(('department', department.lower()),
+                           lambda: self.provider.get_employees_by_department(department))
+
+    def search_employees(self, query, limit=None):
+        return self.cached(('search', query.strip().lower(), limit),
+                           lambda: self.provider.search_employees(query, limit))
+
+    def get_employee_by_name(self, name):
+        return self.cached(('name', name), lambda: self.provider.get_employee_by_name(name))
+
+    def get_employee_manager(self, employee_id):
+        return self.cached(('manager', employee_id.upper()),
+                           lambda: self.provider.get_employee_manager(employee_id))
+
+    def get_org_graph(self):
+        """
+        Org graph of the provider, built on first use
+
+        Once it is older than the cache's ttl, the next call starts a rebuild
+        in a background thread and keeps returning the current graph until
+        the new one is ready, so no caller waits for the whole directory to
+        be read again.
+        """
+        with self.org_lock:
+            org = self.org
+            if org is not None:
+                if not self.org_refreshing and time.monotonic() >= self.org_expires:
+                    self.org_refreshing = True
+                    threading.Thread(target=self.refresh_org_graph, name='helpdesk-org-graph',
+                                     daemon=True).start()
+                return org
+        with self.org_build_lock:
+            if self.org is None:
+                self.build_org_graph()
+            return self.org
+
+    def build_org_graph(self):
+        """Build the org graph from the provider and make it current"""
+        org = self.provider.get_org_graph()
+        with self.org_lock:
+            self.org = org
+            self.org_generation += 1
+            self.org_expires = time.monotonic() + self.cache.ttl
+
+    def refresh_org_graph(self):
+        """Rebuild the org graph in the background; on failure keep the current one and retry later"""
+        try:
+            self.build_org_graph()
+        except Exception:
+            logger.exception("Could not refresh the org graph")
+            with self.org_lock:
+                self.org_expires = time.monotonic() + self.cache.negative_ttl
+        finally:
+            with self.org_lock:
+                self.org_refreshing = False
+
+    def close(self):
+        self.provider.close()
+
+def create_directory():
+    """
+    Create the directory provider configured by environment variables
+
+    Returns:
+        CachedDirectory: LDAP directory if HELPDESK_DIRECTORY_URL is set,
+            else MockActiveDirectory, behind a cache
+    """
+    url = os.environ.get('HELPDESK_DIRECTORY_URL')
+    if url:
+        from utils.ldap_directory import LDAPDirectory
+        provider = LDAPDirectory(url, os.environ.get('HELPDESK_DIRECTORY_BASE_DN', ''),
+                                 os.environ.get('HELPDESK_DIRECTORY_BIND_DN', ''),
+                                 os.environ.get('HELPDESK_DIRECTORY_PASSWORD', ''))
+    else:
+        from utils.mock_ad import MockActiveDirectory
+        provider = MockActiveDirectory()
+    ttl = float(os.environ.get('HELPDESK_DIRECTORY_TTL_S', DEFAULT_TTL))
+    return CachedDirectory(provider, DirectoryCache(ttl=ttl, negative_ttl=min(ttl, DEFAULT_NEGATIVE_TTL)))
@@ -0,0 +1,179 @@
+"""
+Substring and prefix index over the employee directory
+Searches match anywhere in an employee's name, email, department or title.
+Queries of three or more characters are answered from a trigram index and
+shorter ones from a sorted word list, so neither scans the directory. Each
+distinct field value is indexed once: a department shared by ten thousand
+employees costs one entry, not ten thousand.
+"""
+
+import bisect
+import heapq
+from array import array
+
+from utils.search_index import tokenize
+
+# Searchable fields and their weight when ranking matches of equal quality
+SEARCH_FIELDS = {'name': 4, 'email': 3, 'title': 2, 'department': 1}
+
+# Match quality, best first: the whole value, its start, the start of one of
+# its words, anywhere inside it
+EXACT = 3
+PREFIX = 2
+WORD_PREFIX = 1
+SUBSTRING = 0
+
+GRAM_SIZE = 3
+
+def grams(text):
+    """Distinct character trigrams of a string"""
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+def match_quality(value, query):
+    """How well a lowercased value matches a query it contains"""
+    if value == query:
+        return EXACT
+    if value.startswith(query):
+        return PREFIX
+    # A word starts wherever the preceding character is not alphanumeric
+    start = value.find(query, 1)
+    while start != -1:
+        if not value[start - 1].isalnum():
+            return WORD_PREFIX
+        start = value.find(query, start + 1)
+    return SUBSTRING
+
+
+class ValueIndex:
+    """Index of the distinct lowercased values of one field"""
+
+    def __init__(self):
+        self.values = []       # Value id -> lowercased value
+        self.value_ids = {}    # Lowercased value -> value id
+        self.members = []      # Value id -> positions of the employees with that value
+        self.grams = {}        # Trigram -> array of value ids, ascending
+        self.word_values = {}  # Word -> array of value ids
+        self.words = []        # Sorted words, for prefix lookups
+
+    def add(self, value, position):
+        """Index the value of the employee at a position"""
+        key = (value or '').lower()
+        value_id = self.value_ids.get(key)
+        if value_id is None:
+            value_id = self.value_ids[key] = len(self.values)
+            self.values.append(key)
+            self.members.append([])
+            for gram in grams(key):
+                self.grams.setdefault(gram, array('I')).append(value_id)
+            for word in set(tokenize(key)):
+                self.word_values.setdefault(word, array('I')).append(value_id)
+        self.members[value_id].append(position)
+
+    def freeze(self):
+        """Sort the word list once all values are added"""
+        self.words = sorted(self.word_values)
+
+    def match(self, query):
+        """
+        Find the values matching a lowercased query
+
+        Queries shorter than a trigram only match the start of a word.
+
+        Yields:
+            tuple: (value id, match quality)
+        """
+        if len(query) >= GRAM_SIZE:
+            postings = [self.grams.get(gram) for gram in grams(query)]
+            if not all(postings):
+                return
+            # Every match contains the rarest trigram; checking those candidates
+            # directly is cheaper than intersecting the longer lists
+            for value_id in min(postings, key=len):
+                value = self.values[value_id]
+                if query in value:
+                    yield value_id, match_quality(value, query)
+        else:
+            seen = set()
+            i = bisect.bisect_left(self.words, query)
+            while i < len(self.words) and self.words[i].startswith(query):
+                seen.update(self.word_values[self.words[i]])
+                i += 1
+            for value_id in seen:
+                yield value_id, match_quality(self.values[value_id], query)
+
+
+class EmployeeIndex:
+    """
+    Ranked search over employee records, built once when the directory loads
+
+    Results are ordered by match quality, then by the weight of the field
+    that matched, then by name. That order is encoded in a single integer per
+    match, so ranking needs no Python-level sort key.
+    """
+
+    def __init__(self, employees):
+        self.employees = list(employees)
+        self.fields = {field: ValueIndex() for field in SEARCH_FIELDS}
+        for position, employee in enumerate(self.employees):
+            for field, index in self.fields.items():
+                index.add(employee.get(field), position)
+        for index in self.fields.values():
+            index.freeze()
+
+        # Positions in name order, and each position's place in that order
+        self.by_name = sorted(range(len(self.employees)),
+                              key=lambda position: self.employees[position].get('name') or '')
+        self.name_rank = array('I', bytes(4 * len(self.employees)))
+        for rank, position in enumerate(self.by_name):
+            self.name_rank[position] = rank
+
+    def rank_base(self, quality, field):
+        """Sort key offset of a match; lower keys rank first"""
+        max_weight = max(SEARCH_FIELDS.values())
+        tier = (EXACT - quality) * max_weight + (max_weight - SEARCH_FIELDS[field])
+        return tier * len(self.employees)
+
+    def search(self, query, limit=None, fields=None):
+        """
+        Find employees whose fields contain a query
+
+        Args:
+            query (str): Text to find, case-insensitive
+            limit (int): Maximum number of results; None for all
+            fields (iterable): Fields to search; defaults to SEARCH_FIELDS
+
+        Returns:
+            list: Matching employee records, best first
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        best = {}  # Position -> sort key of its best match
+        name_rank = self.name_rank
+        for field in fields or SEARCH_FIELDS:
+            index = self.fields[field]
+            for value_id, quality in index.match(query):
+                base = self.rank_base(quality, field)
+                for position in index.members[value_id]:
+                    key = base + name_rank[position]
+                    if key < best.get(position, key + 1):
+                        best[position] = key
+
+        keys = best.values()
+        keys = sorted(keys) if limit is None else heapq.nsmallest(limit, keys)
+        size = len(self.employees)
+        return [self.employees[self.by_name[key % size]] for key in keys]
+
+    def with_value(self, field, value):
+        """
+        Get the employees whose field equals a value, case-insensitive
+
+        Returns:
+            list: Employee records in directory order
+        """
+        index = self.fields[field]
+        value_id = index.value_ids.get((value or '').lower())
+        if value_id is None:
+            return []
+        return [self.employees[position] for position in index.members[value_id]]
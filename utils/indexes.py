@@ -0,0 +1,222 @@
+"""
+In-memory ticket indexes maintained incrementally by the Database
+"""
+
+import bisect
+import collections
+
+from utils.ticket_record import ticket_epoch
+from utils.timestamps import to_epoch
+
+class TicketIndex:
+    """
+    Base class for indexes kept in sync with the ticket list
+
+    Each index remembers what it recorded for every ticket id, so put() can
+    move a ticket between keys even when the caller mutated the ticket dict
+    in place.
+    """
+
+    def clear(self):
+        """Remove all entries"""
+        raise NotImplementedError
+
+    def put(self, ticket):
+        """Add a ticket, or re-index it if it is already present"""
+        raise NotImplementedError
+
+    def discard(self, ticket_id):
+        """Remove a ticket if it is present"""
+        raise NotImplementedError
+
+    def rebuild(self, tickets):
+        """Rebuild the index from a full ticket list"""
+        self.clear()
+        for ticket in tickets:
+            self.put(ticket)
+
+
+class FieldIndex(TicketIndex):
+    """
+    Equality index mapping a field value to the ids of tickets having it
+
+    Empty values ('' or None) are stored under None so that unassigned
+    tickets can be looked up with None.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.buckets = {}
+        self.keys = {}
+
+    def clear(self):
+        self.buckets = {}
+        self.keys = {}
+
+    def put(self, ticket):
+        ticket_id = ticket['id']
+        key = ticket.get(self.field) or None
+        if ticket_id in self.keys:
+            if self.keys[ticket_id] == key:
+                return
+            self.discard(ticket_id)
+        self.keys[ticket_id] = key
+        self.buckets.setdefault(key, set()).add(ticket_id)
+
+    def discard(self, ticket_id):
+        if ticket_id not in self.keys:
+            return
+        key = self.keys.pop(ticket_id)
+        bucket = self.buckets[key]
+        bucket.discard(ticket_id)
+        if not bucket:
+            del self.buckets[key]
+
+    def lookup(self, value):
+        """
+        Get the ids of tickets with the given value
+
+        Args:
+            value: Field value, or None for empty values
+
+        Returns:
+            set: Matching ticket ids (do not modify)
+        """
+        return self.buckets.get(value or None, set())
+
+    def cardinality(self, value):
+        """Number of tickets with the given value"""
+        return len(self.lookup(value))
+
+    def values(self):
+        """Distinct values currently present in the index"""
+        return list(self.buckets)
+
+
+class TimeIndex(TicketIndex):
+    """
+    Ticket ids ordered by a date field
+
+    Keys are (epoch seconds, id) pairs, so range lookups and ordered scans
+    never parse or format dates. Tickets without a valid date sort first.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.entries = []
+        self.keys = {}
+
+    def clear(self):
+        self.entries = []
+        self.keys = {}
+
+    def key(self, ticket):
+        return (ticket_epoch(ticket, self.field) or 0, ticket['id'])
+
+    def put(self, ticket):
+        ticket_id = ticket['id']
+        key = self.key(ticket)
+        if self.keys.get(ticket_id) == key:
+            return
+        self.discard(ticket_id)
+        self.keys[ticket_id] = key
+        # New and updated tickets are the newest, so this is almost always an append
+        if not self.entries or key > self.entries[-1]:
+            self.entries.append(key)
+        else:
+            bisect.insort(self.entries, key)
+
+    def discard(self, ticket_id):
+        key = self.keys.pop(ticket_id, None)
+        if key is None:
+            return
+        position = bisect.bisect_left(self.entries, key)
+        del self.entries[position]
+
+    def rebuild(self, tickets):
+        self.keys = {t['id']: self.key(t) for t in tickets}
+        self.entries = sorted(self.keys.values())
+
+    def between(self, start=None, end=None):
+        """
+        Get the ids of tickets dated in a range, oldest first
+
+        Args:
+            start (int): First epoch second included, or None for no lower bound
+            end (int): First epoch second excluded, or None for no upper bound
+
+        Returns:
+            list: Ticket ids
+        """
+        low = 0 if start is None else bisect.bisect_left(self.entries, (start,))
+        high = len(self.entries) if end is None else bisect.bisect_left(self.entries, (end,))
+        return [key[1] for key in self.entries[low:high]]
+
+    def latest(self, limit, before=None):
+        """
+        Get the newest ticket ids, newest first
+
+        Args:
+            limit (int): Maximum number of ids to return
+            before (tuple): Optional (date, id) cursor, the date as a string
+                or epoch seconds; only tickets older than it are returned
+
+        Returns:
+            list: Ticket ids
+        """
+        if before is None:
+            end = len(self.entries)
+        else:
+            end = bisect.bisect_left(self.entries, (to_epoch(before[0]) or 0, before[1]))
+        start = max(end - limit, 0)
+        return [key[1] for key in reversed(self.entries[start:end])]
+
+
+class ChangeJournal:
+    """
+    Data version counter with a bounded journal of changed ticket ids
+
+    Every write bumps the version. Consumers that cache derived data remember
+    the version they built from and ask for the ticket ids changed since then,
+    falling back to a full rebuild when the journal cannot answer.
+    """
+
+    def __init__(self, size=10000):
+        self.version = 0
+        self.entries = collections.deque(maxlen=size)
+        # Oldest version changes_since() can still answer for
+        self.floor = 0
+
+    def record(self, ticket_ids=()):
+        """
+        Bump the version
+
+        Args:
+            ticket_ids: Ids of the tickets that changed, or None if anything
+                may have changed (bulk replacement or reload)
+        """
+        self.version += 1
+        if ticket_ids is None:
+            self.entries.clear()
+            self.floor = self.version
+            return
+        for ticket_id in ticket_ids:
+            if len(self.entries) == self.entries.maxlen:
+                self.floor = self.entries[0][0]
+            self.entries.append((self.version, ticket_id))
+
+    def changes_since(self, version):
+        """
+        Get the ids of tickets changed after the given version
+
+        Returns:
+            set: Changed ticket ids, or None if a full rebuild is required
+        """
+        if version < self.floor:
+            return None
+        changed = set()
+        for entry_version, ticket_id in reversed(self.entries):
+            if entry_version <= version:
+                break
+            changed.add(ticket_id)
+        return changed
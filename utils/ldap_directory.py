@@ -0,0 +1,765 @@
+"""
+LDAP directory provider, with a minimal LDAPv3 client and a stand-in server
+Only what employee lookups need is implemented: simple bind, search with
+equality, substring, presence, and/or/not filters, the paged results control
+(RFC 2696), and unbind, encoded in BER by hand so that no LDAP library is
+required. Connections are pooled and reused across lookups.
+
+LDAPStandInServer serves employee records over the same protocol from
+memory, for trying the provider without a real directory:
+    python -m utils.ldap_directory serve --port 3890 --employees employees.jsonl
+    HELPDESK_DIRECTORY_URL=ldap://127.0.0.1:3890 streamlit run app.py
+"""
+
+import queue
+import socket
+import socketserver
+import ssl
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from utils.directory import DirectoryProvider
+from utils.employee_index import EmployeeIndex
+
+# Employee field -> LDAP attribute, as named by Active Directory
+ATTRIBUTES = {
+    'employee_id': 'employeeID',
+    'name': 'displayName',
+    'email': 'mail',
+    'department': 'department',
+    'phone': 'telephoneNumber',
+    'manager': 'manager',
+    'location': 'physicalDeliveryOfficeName',
+    'title': 'title'
+}
+
+SEARCH_ATTRIBUTES = ('name', 'email', 'department', 'title')
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 10
+
+# Ids looked up per search by get_employees
+BATCH_SIZE = 100
+
+# Entries requested per page; below Active Directory's default MaxPageSize of 1000
+DEFAULT_PAGE_SIZE = 500
+
+# Partial matches fetched per result wanted, so that ranking them locally
+# finds the best ones rather than whichever the server returned first
+SEARCH_OVERFETCH = 4
+
+# BER tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+ENUMERATED = 0x0a
+BOOLEAN = 0x01
+SEQUENCE = 0x30
+SET = 0x31
+
+# LDAP protocol operations ([APPLICATION n])
+BIND_REQUEST = 0x60
+BIND_RESPONSE = 0x61
+UNBIND_REQUEST = 0x42
+SEARCH_REQUEST = 0x63
+SEARCH_RESULT_ENTRY = 0x64
+SEARCH_RESULT_DONE = 0x65
+SEARCH_RESULT_REFERENCE = 0x73
+
+# Filter choices
+FILTER_TAGS = {'and': 0xa0, 'or': 0xa1, 'not': 0xa2, 'eq': 0xa3, 'sub': 0xa4, 'present': 0x87}
+SUBSTRING_INITIAL = 0x80
+SUBSTRING_ANY = 0x81
+SUBSTRING_FINAL = 0x82
+SIMPLE_AUTH = 0x80
+CONTROLS = 0xa0
+
+# Simple paged results control (RFC 2696)
+PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+
+# Result codes
+SUCCESS = 0
+PROTOCOL_ERROR = 2
+SIZE_LIMIT_EXCEEDED = 4
+INVALID_CREDENTIALS = 49
+
+
+class LDAPError(Exception):
+    """Error result from the server, or a malformed message"""
+
+    def __init__(self, message, result_code=PROTOCOL_ERROR):
+        super().__init__(message)
+        self.result_code = result_code
+
+def encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    body = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(body)]) + body
+
+def tlv(tag, content):
+    """Encode a BER tag-length-value"""
+    return bytes([tag]) + encode_length(len(content)) + content
+
+def encode_int(value, tag=INTEGER):
+    return tlv(tag, value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big', signed=True))
+
+def encode_str(value, tag=OCTET_STRING):
+    return tlv(tag, value.encode('utf-8') if isinstance(value, str) else value)
+
+def encode_bool(value):
+    return tlv(BOOLEAN, b'\xff' if value else b'\x00')
+
+def encode_filter(node):
+    """
+    Encode a search filter given as nested tuples
+
+    Args:
+        node (tuple): ('and' | 'or', [filters]), ('not', filter), ('eq', attribute, value),
+            ('sub', attribute, initial, [any...], final) with None for missing
+            parts, or ('present', attribute)
+    """
+    kind = node[0]
+    tag = FILTER_TAGS[kind]
+    if kind in ('and', 'or'):
+        return tlv(tag, b''.join(encode_filter(child) for child in node[1]))
+    if kind == 'not':
+        return tlv(tag, encode_filter(node[1]))
+    if kind == 'eq':
+        return tlv(tag, encode_str(node[1]) + encode_str(node[2]))
+    if kind == 'present':
+        return encode_str(node[1], tag)
+    _, attribute, initial, middle, final = node
+    parts = b''
+    if initial:
+        parts += encode_str(initial, SUBSTRING_INITIAL)
+    for part in middle:
+        parts += encode_str(part, SUBSTRING_ANY)
+    if final:
+        parts += encode_str(final, SUBSTRING_FINAL)
+    return tlv(tag, encode_str(attribute) + tlv(SEQUENCE, parts))
+
+def encode_message(message_id, operation, controls=()):
+    """
+    Encode an LDAP message
+
+    Args:
+        controls (iterable): (oid, value bytes) pairs, sent as non-critical controls
+    """
+    encoded = b''.join(tlv(SEQUENCE, encode_str(oid) + encode_str(value)) for oid, value in controls)
+    return tlv(SEQUENCE, encode_int(message_id) + operation + (tlv(CONTROLS, encoded) if encoded else b''))
+
+def encode_paged(page_size, cookie=b''):
+    """Value of the paged results control"""
+    return tlv(SEQUENCE, encode_int(page_size) + encode_str(cookie))
+
+def decode_paged(value):
+    """Get (page size or size estimate, cookie) from a paged results control value"""
+    size, cookie = read_all(read_tlv(value, 0)[1])
+    return decode_int(size[1]), cookie[1]
+
+def encode_result(tag, result_code, message=''):
+    return tlv(tag, encode_int(result_code, ENUMERATED) + encode_str('') + encode_str(message))
+
+def read_tlv(data, offset):
+    """
+    Read one BER element
+
+    Returns:
+        tuple: (tag, content bytes, offset after the element)
+    """
+    if offset + 2 > len(data):
+        raise LDAPError("Truncated BER element")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    if offset + length > len(data):
+        raise LDAPError("Truncated BER element")
+    return tag, data[offset:offset + length], offset + length
+
+def read_all(data):
+    """Decode a constructed element's content into a list of (tag, content)"""
+    elements = []
+    offset = 0
+    while offset < len(data):
+        tag, content, offset = read_tlv(data, offset)
+        elements.append((tag, content))
+    return elements
+
+def decode_int(content):
+    return int.from_bytes(content, 'big', signed=True)
+
+def decode_filter(tag, content):
+    """Decode a filter into the nested tuples accepted by encode_filter"""
+    if tag in (FILTER_TAGS['and'], FILTER_TAGS['or']):
+        kind = 'and' if tag == FILTER_TAGS['and'] else 'or'
+        return (kind, [decode_filter(*child) for child in read_all(content)])
+    if tag == FILTER_TAGS['not']:
+        return ('not', decode_filter(*read_all(content)[0]))
+    if tag == FILTER_TAGS['eq']:
+        attribute, value = read_all(content)
+        return ('eq', attribute[1].decode('utf-8'), value[1].decode('utf-8'))
+    if tag == FILTER_TAGS['present']:
+        return ('present', content.decode('utf-8'))
+    if tag == FILTER_TAGS['sub']:
+        attribute, parts = read_all(content)
+        initial, middle, final = None, [], None
+        for part_tag, value in read_all(parts[1]):
+            value = value.decode('utf-8')
+            if part_tag == SUBSTRING_INITIAL:
+                initial = value
+            elif part_tag == SUBSTRING_ANY:
+                middle.append(value)
+            else:
+                final = value
+        return ('sub', attribute[1].decode('utf-8'), initial, middle, final)
+    raise LDAPError(f"Unsupported filter type 0x{tag:02x}")
+
+def recv_message(sock):
+    """
+    Read one complete LDAP message from a socket
+
+    Returns:
+        bytes: The encoded message, or None if the peer closed the connection
+    """
+    header = recv_exact(sock, 2)
+    if header is None:
+        return None
+    length = header[1]
+    extra = b''
+    if length & 0x80:
+        extra = recv_exact(sock, length & 0x7f)
+        if extra is None:
+            return None
+        length = int.from_bytes(extra, 'big')
+    content = recv_exact(sock, length)
+    if content is None:
+        return None
+    return header + extra + content
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def decode_message(data):
+    """
+    Split an LDAP message
+
+    Returns:
+        tuple: (message id, operation tag, operation content,
+                dict of control values by oid)
+    """
+    tag, content, _ = read_tlv(data, 0)
+    if tag != SEQUENCE:
+        raise LDAPError("Not an LDAP message")
+    elements = read_all(content)
+    if len(elements) < 2:
+        raise LDAPError("Not an LDAP message")
+    controls = {}
+    if len(elements) > 2 and elements[2][0] == CONTROLS:
+        for _, control in read_all(elements[2][1]):
+            parts = read_all(control)
+            # The optional criticality boolean comes before the optional value
+            value = parts[-1][1] if len(parts) > 1 and parts[-1][0] == OCTET_STRING else b''
+            controls[parts[0][1].decode('utf-8')] = value
+    return decode_int(elements[0][1]), elements[1][0], elements[1][1], controls
+
+def decode_result(content):
+    """Get (result code, diagnostic message) from an LDAPResult"""
+    elements = read_all(content)
+    return decode_int(elements[0][1]), elements[2][1].decode('utf-8', 'replace')
+
+def to_employee(attributes):
+    """Convert LDAP attributes to an employee record"""
+    lowered = {name.lower(): values for name, values in attributes.items()}
+    employee = {}
+    for field, attribute in ATTRIBUTES.items():
+        values = lowered.get(attribute.lower())
+        employee[field] = values[0] if values else ''
+    manager = employee['manager']
+    # Active Directory stores the manager's DN; keep the name from its first RDN
+    if manager.upper().startswith('CN=') and ',' in manager:
+        employee['manager'] = first_rdn_value(manager)
+    return employee
+
+def first_rdn_value(dn):
+    """
+    Unescaped value of the first RDN of a DN (RFC 4514)
+
+    A backslash escapes the next character or gives a byte as two hex
+    digits, so 'CN=Doe\\, Jane,OU=People' yields 'Doe, Jane'.
+    """
+    value = bytearray()
+    position = dn.index('=') + 1
+    while position < len(dn):
+        char = dn[position]
+        if char in ',+':
+            break
+        if char == '\\' and position + 1 < len(dn):
+            pair = dn[position + 1:position + 3]
+            if len(pair) == 2 and all(c in '0123456789abcdefABCDEF' for c in pair):
+                value.append(int(pair, 16))
+                position += 3
+                continue
+            char = dn[position + 1]
+            position += 1
+        value += char.encode('utf-8')
+        position += 1
+    return value.decode('utf-8', errors='replace')
+
+def escape_dn_value(value):
+    """Escape an attribute value for use in a DN (RFC 4514)"""
+    last = len(value) - 1
+    return ''.join('\\' + char if char in ',+"\\<>;=' or (char in ' #' and position == 0)
+                   or (char == ' ' and position == last) else char
+                   for position, char in enumerate(value))
+
+def contains(field, text):
+    """Filter matching a field that contains text"""
+    return ('sub', ATTRIBUTES[field], None, [text], None)
+
+
+class LDAPConnection:
+    """One connection to an LDAP server"""
+
+    def __init__(self, host, port, use_ssl=False, timeout=DEFAULT_TIMEOUT):
+        sock = socket.create_connection((host, port), timeout)
+        if use_ssl:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        self.message_id = 0
+
+    def request(self, operation, controls=()):
+        """Send an operation and return its message id"""
+        self.message_id += 1
+        self.sock.sendall(encode_message(self.message_id, operation, controls))
+        return self.message_id
+
+    def receive(self, message_id):
+        """
+        Read the next message, which must belong to message_id
+
+        Returns:
+            tuple: (operation tag, operation content, dict of control values by oid)
+        """
+        data = recv_message(self.sock)
+        if data is None:
+            raise ConnectionError("LDAP server closed the connection")
+        received_id, tag, content, controls = decode_message(data)
+        if received_id != message_id:
+            raise LDAPError(f"Unexpected response to message {received_id}")
+        return tag, content, controls
+
+    def bind(self, dn='', password=''):
+        """
+        Simple bind; an empty dn and password bind anonymously
+
+        Raises:
+            LDAPError: If the server rejects the credentials
+        """
+        message_id = self.request(tlv(BIND_REQUEST, encode_int(3) + encode_str(dn)
+                                      + encode_str(password, SIMPLE_AUTH)))
+        tag, content, _ = self.receive(message_id)
+        code, message = decode_result(content)
+        if tag != BIND_RESPONSE or code != SUCCESS:
+            raise LDAPError(f"Bind failed: {message or code}", code)
+
+    def search(self, base_dn, search_filter, attributes, size_limit=0, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Search the subtree below base_dn, a page at a time
+
+        Every request carries the paged results control, so servers that cap
+        the entries per request (Active Directory's MaxPageSize) still return
+        the whole result over several pages.
+
+        Args:
+            base_dn (str): Search base
+            search_filter (tuple): Filter, see encode_filter
+            attributes (iterable): Attributes to return
+            size_limit (int): Maximum entries; 0 for all
+            page_size (int): Entries requested per page
+
+        Returns:
+            list: (dn, {attribute: [values]}) per entry
+
+        Raises:
+            LDAPError: If the search fails, or the server stopped it before
+                size_limit entries (or, with no size_limit, all of them) were
+                returned
+        """
+        attributes = list(attributes)
+        if size_limit:
+            page_size = min(page_size, size_limit)
+        entries = []
+        cookie = b''
+        while True:
+            code, message, cookie = self.search_page(base_dn, search_filter, attributes, size_limit,
+                                                     page_size, cookie, entries)
+            complete = size_limit and len(entries) >= size_limit
+            if code == SIZE_LIMIT_EXCEEDED and not complete:
+                raise LDAPError(f"Search stopped by the server after {len(entries)} entries: "
+                                f"{message or 'size limit exceeded'}", code)
+            if code not in (SUCCESS, SIZE_LIMIT_EXCEEDED):
+                raise LDAPError(f"Search failed: {message or code}", code)
+            if not cookie:
+                return entries[:size_limit] if size_limit else entries
+            if complete:
+                # Tell the server to drop the rest of the result
+                self.search_page(base_dn, search_filter, attributes, size_limit, 0, cookie, [])
+                return entries[:size_limit]
+
+    def search_page(self, base_dn, search_filter, attributes, size_limit, page_size, cookie, entries):
+        """
+        Request one page of a paged search and append its entries
+
+        Returns:
+            tuple: (result code, diagnostic message, cookie of the next page;
+                    empty once the search is complete or the server does not page)
+        """
+        message_id = self.request(tlv(
+            SEARCH_REQUEST,
+            encode_str(base_dn) + encode_int(2, ENUMERATED) + encode_int(0, ENUMERATED)
+            + encode_int(size_limit) + encode_int(0) + encode_bool(False)
+            + encode_filter(search_filter)
+            + tlv(SEQUENCE, b''.join(encode_str(a) for a in attributes))),
+            [(PAGED_RESULTS_OID, encode_paged(page_size, cookie))])
+        while True:
+            tag, content, controls = self.receive(message_id)
+            if tag == SEARCH_RESULT_ENTRY:
+                dn, attribute_list = read_all(content)
+                attributes_found = {}
+                for _, attribute in read_all(attribute_list[1]):
+                    name, values = read_all(attribute)
+                    attributes_found[name[1].decode('utf-8')] = [
+                        value.decode('utf-8') for _, value in read_all(values[1])]
+                entries.append((dn[1].decode('utf-8'), attributes_found))
+            elif tag == SEARCH_RESULT_DONE:
+                code, message = decode_result(content)
+                paged = controls.get(PAGED_RESULTS_OID)
+                return code, message, decode_paged(paged)[1] if paged else b''
+            elif tag != SEARCH_RESULT_REFERENCE:
+                raise LDAPError(f"Unexpected response 0x{tag:02x}")
+
+    def close(self):
+        """Unbind and close the socket"""
+        try:
+            self.request(bytes([UNBIND_REQUEST, 0]))  # [APPLICATION 2] NULL
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of bound connections
+
+    At most size connections exist at a time; callers beyond that wait for
+    one to be returned. A connection that fails mid-request is closed
+    instead of returned.
+    """
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.connect = connect
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No LDAP connection available")
+        try:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+            try:
+                yield conn
+            except BaseException:
+                # Whatever interrupted the request, the connection's state is unknown
+                conn.close()
+                raise
+            self.idle.put(conn)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class LDAPDirectory(DirectoryProvider):
+    """Employee directory read from an LDAP server through a connection pool"""
+
+    def __init__(self, url, base_dn, bind_dn='', password='', pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        parsed = urlparse(url)
+        use_ssl = parsed.scheme == 'ldaps'
+        host = parsed.hostname or 'localhost'
+        port = parsed.port or (636 if use_ssl else 389)
+        self.base_dn = base_dn
+
+        def connect():
+            conn = LDAPConnection(host, port, use_ssl, timeout)
+            try:
+                conn.bind(bind_dn, password)
+            except (OSError, LDAPError):
+                conn.close()
+                raise
+            return conn
+        self.pool = ConnectionPool(connect, pool_size, timeout)
+
+    def search(self, search_filter, size_limit=0):
+        """
+        Search for employees
+
+        If the server dropped a pooled connection, the idle connections are
+        discarded, as they are likely stale too, and the search is retried once.
+
+        Returns:
+            list: Employee records
+        """
+        for attempt in (1, 2):
+            try:
+                with self.pool.connection() as conn:
+                    entries = conn.search(self.base_dn, search_filter, ATTRIBUTES.values(), size_limit)
+                return [to_employee(attributes) for _, attributes in entries]
+            except ConnectionError:
+                if attempt == 2:
+                    raise
+                self.pool.close()
+
+    def get_employee(self, identifier):
+        identifier = identifier.strip()
+        if not identifier:
+            return None
+        exact = self.search(('or', [('eq', ATTRIBUTES['employee_id'], identifier),
+                                    ('eq', ATTRIBUTES['email'], identifier)]), 1)
+        if exact:
+            return exact[0]
+        matches = self.rank(identifier, ('name', 'email'), 1)
+        return matches[0] if matches else None
+
+    def get_employees(self, employee_ids):
+        employees = {}
+        employee_ids = list(employee_ids)
+        for start in range(0, len(employee_ids), BATCH_SIZE):
+            batch = employee_ids[start:start + BATCH_SIZE]
+            search_filter = ('or', [('eq', ATTRIBUTES['employee_id'], i) for i in batch])
+            for employee in self.search(search_filter):
+                employees[employee['employee_id'].upper()] = employee
+        return employees
+
+    def get_all_employees(self):
+        return self.search(('present', ATTRIBUTES['employee_id']))
+
+    def get_employees_by_department(self, department):
+        return self.search(('eq', ATTRIBUTES['department'], department))
+
+    def get_employee_by_name(self, name):
+        for employee in self.search(('eq', ATTRIBUTES['name'], name)):
+            if employee['name'] == name:
+                return employee
+        return None
+
+    def search_employees(self, query, limit=None):
+        return self.rank(query, SEARCH_ATTRIBUTES, limit)
+
+    def rank(self, query, fields, limit):
+        """Fetch partial matches and rank them as MockActiveDirectory would"""
+        query = query.strip()
+        if not query:
+            return []
+        size_limit = limit * SEARCH_OVERFETCH if limit else 0
+        candidates = self.search(('or', [contains(field, query) for field in fields]), size_limit)
+        return EmployeeIndex(candidates).search(query, limit, fields)
+
+    def close(self):
+        self.pool.close()
+
+def to_attributes(employee):
+    """Convert an employee record to LDAP attributes"""
+    return {attribute: [employee[field]] for field, attribute in ATTRIBUTES.items() if employee.get(field)}
+
+def matches(search_filter, entry):
+    """Evaluate a filter against entry attributes keyed by lower-case name, ignoring case"""
+    kind = search_filter[0]
+    if kind == 'and':
+        return all(matches(child, entry) for child in search_filter[1])
+    if kind == 'or':
+        return any(matches(child, entry) for child in search_filter[1])
+    if kind == 'not':
+        return not matches(search_filter[1], entry)
+    values = entry.get(search_filter[1].lower(), ())
+    if kind == 'present':
+        return bool(values)
+    if kind == 'eq':
+        return any(value.lower() == search_filter[2].lower() for value in values)
+    _, _, initial, middle, final = search_filter
+    for value in values:
+        value = value.lower()
+        position = 0
+        if initial:
+            if not value.startswith(initial.lower()):
+                continue
+            position = len(initial)
+        for part in middle:
+            position = value.find(part.lower(), position)
+            if position == -1:
+                break
+            position += len(part)
+        else:
+            if not final or (value.endswith(final.lower()) and len(value) - len(final) >= position):
+                return True
+    return False
+
+
+class LDAPRequestHandler(socketserver.BaseRequestHandler):
+    """Answers bind, search and unbind requests on one connection"""
+
+    def handle(self):
+        while True:
+            try:
+                data = recv_message(self.request)
+            except OSError:
+                return
+            if data is None:
+                return
+            try:
+                message_id, tag, content, controls = decode_message(data)
+                if tag == UNBIND_REQUEST:
+                    return
+                if tag == BIND_REQUEST:
+                    self.bind(message_id, content)
+                elif tag == SEARCH_REQUEST:
+                    self.search(message_id, content, controls)
+                else:
+                    return  # Unsupported operation; a real server would send a notice
+            except (LDAPError, IndexError, UnicodeDecodeError):
+                return
+            except OSError:
+                return
+
+    def bind(self, message_id, content):
+        _, dn, password = read_all(content)
+        accepted = (self.server.bind_dn is None
+                    or (dn[1].decode('utf-8') == self.server.bind_dn
+                        and password[1].decode('utf-8') == self.server.password))
+        code = SUCCESS if accepted else INVALID_CREDENTIALS
+        self.request.sendall(encode_message(message_id, encode_result(BIND_RESPONSE, code)))
+
+    def search(self, message_id, content, controls):
+        elements = read_all(content)
+        size_limit = decode_int(elements[3][1])
+        search_filter = decode_filter(*elements[6])
+        wanted = {value.decode('utf-8').lower() for _, value in read_all(elements[7][1])}
+        with self.server.lock:
+            self.server.searches += 1
+
+        found = [entry for entry in self.server.entries if matches(search_filter, entry[2])]
+        limits = [limit for limit in (size_limit, self.server.size_limit) if limit]
+        paged = controls.get(PAGED_RESULTS_OID) if self.server.paging else None
+        response_controls = ()
+        if paged is None:
+            start, end = 0, min([len(found)] + limits)
+            code = SIZE_LIMIT_EXCEEDED if end < len(found) else SUCCESS
+        else:
+            # The cookie is the offset of the next page; a page size of 0 abandons the search
+            page_size, cookie = decode_paged(paged)
+            start = int(cookie or 0)
+            end = min(len(found), start + page_size)
+            if self.server.size_limit:
+                end = min(end, start + self.server.size_limit)
+            code = SUCCESS
+            if size_limit and end >= size_limit:
+                end = size_limit
+                code = SIZE_LIMIT_EXCEEDED if len(found) > size_limit else SUCCESS
+            next_cookie = str(end).encode() if page_size and end < len(found) and code == SUCCESS else b''
+            response_controls = [(PAGED_RESULTS_OID, encode_paged(len(found), next_cookie))]
+
+        for dn, attributes, _ in found[start:end]:
+            attribute_list = b''.join(
+                tlv(SEQUENCE, encode_str(name) + tlv(SET, b''.join(encode_str(v) for v in values)))
+                for name, values in attributes.items() if not wanted or name.lower() in wanted)
+            self.request.sendall(encode_message(message_id, tlv(
+                SEARCH_RESULT_ENTRY, encode_str(dn) + tlv(SEQUENCE, attribute_list))))
+        self.request.sendall(encode_message(message_id, encode_result(SEARCH_RESULT_DONE, code),
+                                            response_controls))
+
+
+class LDAPStandInServer(socketserver.ThreadingTCPServer):
+    """
+    In-process LDAP server holding employee records in memory
+
+    Searches scan the records, which is fine for trying the provider but not
+    for a large directory. 'searches' counts the search requests received.
+    Like Active Directory's MaxPageSize, size_limit caps the entries returned
+    per request, or per page of a paged search; paging=False makes the server
+    ignore the paged results control.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, employees, address=('127.0.0.1', 0), base_dn='OU=People,DC=company,DC=local',
+                 bind_dn=None, password=None, size_limit=0, paging=True):
+        super().__init__(address, LDAPRequestHandler)
+        self.base_dn = base_dn
+        self.bind_dn = bind_dn
+        self.password = password
+        self.size_limit = size_limit
+        self.paging = paging
+        self.lock = threading.Lock()
+        self.searches = 0
+        self.entries = []
+        for employee in employees:
+            attributes = to_attributes(employee)
+            lowered = {name.lower(): values for name, values in attributes.items()}
+            self.entries.append((f"CN={escape_dn_value(employee['name'])},{base_dn}", attributes, lowered))
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"ldap://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread"""
+        threading.Thread(target=self.serve_forever, name='helpdesk-ldap', daemon=True).start()
+        return self
+
+if __name__ == "__main__":
+    import argparse
+    import logging
+
+    from utils.mock_ad import SAMPLE_EMPLOYEES, load_employees
+
+    parser = argparse.ArgumentParser(description="Serve employee records over LDAP for testing")
+    parser.add_argument('command', choices=['serve'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3890)
+    parser.add_argument('--employees', help="JSON or JSON lines employee file (default: the sample directory)")
+    parser.add_argument('--base-dn', default='OU=People,DC=company,DC=local')
+    parser.add_argument('--size-limit', type=int, default=0,
+                        help="Entries returned per request or page, like MaxPageSize (default: no limit)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    employees = load_employees(args.employees) if args.employees else list(SAMPLE_EMPLOYEES.values())
+    server = LDAPStandInServer(employees, (args.host, args.port), args.base_dn, size_limit=args.size_limit)
+    logging.info("Serving %d employees at %s with base DN %s", len(employees), server.url, args.base_dn)
+    server.serve_forever()
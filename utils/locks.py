@@ -0,0 +1,100 @@
+"""
+Locking primitives shared by the storage backends
+"""
+
+import threading
+from contextlib import contextmanager
+
+class ReadWriteLock:
+    """
+    Reader/writer lock allowing many concurrent readers or a single writer
+
+    Waiting writers are preferred over new readers so a steady stream of page
+    renders cannot starve ticket updates. Both sides are reentrant, and the
+    thread holding the write lock may also take the read lock. A read lock
+    cannot be upgraded to a write lock.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        """Acquire the lock for reading"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                self._readers[me] += 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        """Release a read lock"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth -= 1
+                return
+            count = self._readers[me] - 1
+            if count:
+                self._readers[me] = count
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        """Acquire the lock for writing"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        """Release a write lock"""
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    def owns_write(self):
+        """Whether the calling thread holds the write lock"""
+        return self._writer == threading.get_ident()
+
+    @contextmanager
+    def read_lock(self):
+        """Context manager holding the lock for reading"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_lock(self):
+        """Context manager holding the lock for writing"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,280 @@
+"""
+Opt-in instrumentation: call counts, latency histograms and storage sizes
+Set HELPDESK_METRICS=1 before starting the app to enable it; otherwise the
+decorators return the functions unchanged and nothing is recorded.
+
+Metrics are shown in the admin Performance tab and can be exported in the
+Prometheus text format:
+    HELPDESK_METRICS_PORT=9464   serve http://127.0.0.1:9464/metrics
+    HELPDESK_METRICS_FILE=path   rewrite the file every HELPDESK_METRICS_FILE_INTERVAL_S
+                                 seconds (default 15), for a textfile collector
+"""
+
+import bisect
+import functools
+import inspect
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.environ.get('HELPDESK_METRICS', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB to 1 GiB
+
+# Help text of every metric, in the order they are exported
+METRIC_HELP = {
+    'helpdesk_call_duration_seconds': ('histogram', "Time spent in instrumented calls"),
+    'helpdesk_call_errors_total': ('counter', "Instrumented calls that raised an exception"),
+    'helpdesk_serialized_bytes': ('histogram', "Size of data serialized or read by storage operations"),
+    'helpdesk_file_bytes': ('gauge', "Current size of storage files")
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside its bucket
+
+        Returns:
+            float: Estimated value, or None if nothing was observed
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Beyond the largest bucket
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms, counters and gauges keyed by name and labels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        """Record a value in the histogram for a metric name and label tuple"""
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+    def set_gauge(self, name, labels, value):
+        with self.lock:
+            self.gauges[(name, labels)] = value
+
+    def summary(self, name):
+        """
+        Summarize the histograms of one metric
+
+        Returns:
+            list: Dicts with the labels plus 'count', 'sum', 'mean', 'p50', 'p90' and 'p99'
+        """
+        with self.lock:
+            histograms = [(labels, h) for (metric, labels), h in self.histograms.items() if metric == name]
+            rows = []
+            for labels, h in histograms:
+                row = dict(labels)
+                row.update(count=h.count, sum=h.sum, mean=h.sum / h.count if h.count else None,
+                           p50=h.quantile(0.5), p90=h.quantile(0.9), p99=h.quantile(0.99))
+                rows.append(row)
+            return rows
+
+    def gauge_values(self, name):
+        """Current values of one gauge metric, as (labels dict, value) pairs"""
+        with self.lock:
+            return [(dict(labels), value) for (metric, labels), value in self.gauges.items() if metric == name]
+
+    def render(self):
+        """Export everything in the Prometheus text exposition format"""
+        with self.lock:
+            lines = []
+            for name, (kind, help_text) in METRIC_HELP.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == 'histogram':
+                    for (metric, labels), h in sorted(self.histograms.items()):
+                        if metric != name:
+                            continue
+                        cumulative = 0
+                        bounds = [repr(float(b)) for b in h.buckets] + ['+Inf']
+                        for bound, count in zip(bounds, h.counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {h.sum!r}")
+                        lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+                else:
+                    values = self.counters if kind == 'counter' else self.gauges
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{format_labels(labels)} {value}")
+            return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    """Format label pairs as {key="value",...}, escaping values"""
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+REGISTRY = MetricsRegistry()
+
+def timed(component, name=None):
+    """
+    Decorator recording the call count and latency of a function
+
+    Args:
+        component (str): 'component' label, e.g. 'database' or 'page'
+        name (str): 'method' label; defaults to the function name
+
+    Returns:
+        The function unchanged when metrics are disabled, else a timing wrapper
+    """
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        labels = (('component', component), ('method', name or func.__name__))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                REGISTRY.increment('helpdesk_call_errors_total', labels)
+                raise
+            finally:
+                REGISTRY.observe('helpdesk_call_duration_seconds', labels, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def instrument_class(cls, component):
+    """
+    Time every public method defined on a class
+
+    Generator functions and context managers are left alone, since timing
+    the call would only measure creating the iterator.
+    """
+    if not METRICS_ENABLED:
+        return cls
+    for attr, func in list(vars(cls).items()):
+        if attr.startswith('_') or not inspect.isfunction(func):
+            continue
+        if inspect.isgeneratorfunction(getattr(func, '__wrapped__', func)):
+            continue
+        setattr(cls, attr, timed(component)(func))
+    return cls
+
+def observe_bytes(operation, size):
+    """Record the size of data serialized or read by a storage operation"""
+    if METRICS_ENABLED:
+        REGISTRY.observe('helpdesk_serialized_bytes', (('operation', operation),), size, BYTE_BUCKETS)
+
+def record_file_size(file, path):
+    """Record the current size of a storage file; missing files count as 0"""
+    if METRICS_ENABLED:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        REGISTRY.set_gauge('helpdesk_file_bytes', (('file', file),), size)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /metrics"""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the app log
+
+def write_metrics_file(path):
+    """Atomically write the Prometheus text export to a file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.metrics_', suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        f.write(REGISTRY.render())
+    os.replace(temp_path, path)
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+def start_exporters():
+    """Start the HTTP endpoint and file writer configured by environment variables, once"""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started or not METRICS_ENABLED:
+            return
+        _exporters_started = True
+
+    port = os.environ.get('HELPDESK_METRICS_PORT')
+    if port:
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', int(port)), MetricsRequestHandler)
+        except OSError:
+            logger.exception("Could not serve metrics on port %s", port)
+        else:
+            threading.Thread(target=server.serve_forever, name='helpdesk-metrics', daemon=True).start()
+
+    path = os.environ.get('HELPDESK_METRICS_FILE')
+    if path:
+        interval = float(os.environ.get('HELPDESK_METRICS_FILE_INTERVAL_S', 15))
+
+        def write_loop():
+            while True:
+                try:
+                    write_metrics_file(path)
+                except OSError:
+                    logger.exception("Could not write %s", path)
+                time.sleep(interval)
+        threading.Thread(target=write_loop, name='helpdesk-metrics-file', daemon=True).start()
@@ -1,117 +1,166 @@
 """
 Mock Active Directory integration for employee lookup
+The directory is the built-in sample unless HELPDESK_DIRECTORY_FILE points to
+a JSON or JSON lines file of employee records (optionally gzip-compressed).
+Name, email, department and title searches use an index built at load time,
+and manager lookups an org graph built at the same time.
 """
 
-class MockActiveDirectory:
-    def __init__(self):
-        # Mock employee database
-        self.employees = {
-            'EMP001': {
-                'employee_id': 'EMP001',
-                'name': 'John Doe',
-                'email': 'john.doe@company.com',
-                'department': 'Information Technology',
-                'phone': '+1-555-0101',
-                'manager': 'Jane Smith',
-                'location': 'Building A, Floor 3',
-                'title': 'Software Developer'
-            },
-            'EMP002': {
-                'employee_id': 'EMP002',
-                'name': 'Jane Smith',
-                'email': 'jane.smith@company.com',
-                'department': 'Information Technology',
-                'phone': '+1-555-0102',
-                'manager': 'Bob Johnson',
-                'location': 'Building A, Floor 3',
-                'title': 'IT Manager'
-            },
-            'EMP003': {
-                'employee_id': 'EMP003',
-                'name': 'Bob Johnson',
-                'email': 'bob.johnson@company.com',
-                'department': 'Information Technology',
-                'phone': '+1-555-0103',
-                'manager': 'CEO',
-                'location': 'Building A, Floor 4',
-                'title': 'IT Director'
-            },
-            'EMP004': {
-                'employee_id': 'EMP004',
-                'name': 'Alice Brown',
-                'email': 'alice.brown@company.com',
-                'department': 'Human Resources',
-                'phone': '+1-555-0201',
-                'manager': 'Carol Wilson',
-                'location': 'Building B, Floor 2',
-                'title': 'HR Specialist'
-            },
-            'EMP005': {
-                'employee_id': 'EMP005',
-                'name': 'Carol Wilson',
-                'email': 'carol.wilson@company.com',
-                'department': 'Human Resources',
-                'phone': '+1-555-0202',
-                'manager': 'CEO',
-                'location': 'Building B, Floor 2',
-                'title': 'HR Manager'
-            },
-            'EMP006': {
-                'employee_id': 'EMP006',
-                'name': 'David Miller',
-                'email': 'david.miller@company.com',
-                'department': 'Finance',
-                'phone': '+1-555-0301',
-                'manager': 'Sarah Davis',
-                'location': 'Building C, Floor 1',
-                'title': 'Financial Analyst'
-            },
-            'EMP007': {
-                'employee_id': 'EMP007',
-                'name': 'Sarah Davis',
-                'email': 'sarah.davis@company.com',
-                'department': 'Finance',
-                'phone': '+1-555-0302',
-                'manager': 'CEO',
-                'location': 'Building C, Floor 1',
-                'title': 'Finance Manager'
-            },
-            'EMP008': {
-                'employee_id': 'EMP008',
-                'name': 'Michael Taylor',
-                'email': 'michael.taylor@company.com',
-                'department': 'Marketing',
-                'phone': '+1-555-0401',
-                'manager': 'Lisa Anderson',
-                'location': 'Building D, Floor 2',
-                'title': 'Marketing Specialist'
-            },
-            'EMP009': {
-                'employee_id': 'EMP009',
-                'name': 'Lisa Anderson',
-                'email': 'lisa.anderson@company.com',
-                'department': 'Marketing',
-                'phone': '+1-555-0402',
-                'manager': 'CEO',
-                'location': 'Building D, Floor 2',
-                'title': 'Marketing Manager'
-            },
-            'EMP010': {
-                'employee_id': 'EMP010',
-                'name': 'Robert Chen',
-                'email': 'robert.chen@company.com',
-                'department': 'Operations',
-                'phone': '+1-555-0501',
-                'manager': 'Jennifer Lee',
-                'location': 'Building E, Floor 1',
-                'title': 'Operations Coordinator'
-            }
-        }
+import gzip
+import json
+import os
+
+from utils.directory import DirectoryProvider
+from utils.employee_index import EmployeeIndex
+from utils.org_graph import OrgGraph
+
+# Results returned by search_employees unless a limit is given
+DEFAULT_SEARCH_LIMIT = 50
+
+# Employees of the built-in sample directory
+SAMPLE_EMPLOYEES = {
+    'EMP001': {
+        'employee_id': 'EMP001',
+        'name': 'John Doe',
+        'email': 'john.doe@company.com',
+        'department': 'Information Technology',
+        'phone': '+1-555-0101',
+        'manager': 'Jane Smith',
+        'location': 'Building A, Floor 3',
+        'title': 'Software Developer'
+    },
+    'EMP002': {
+        'employee_id': 'EMP002',
+        'name': 'Jane Smith',
+        'email': 'jane.smith@company.com',
+        'department': 'Information Technology',
+        'phone': '+1-555-0102',
+        'manager': 'Bob Johnson',
+        'location': 'Building A, Floor 3',
+        'title': 'IT Manager'
+    },
+    'EMP003': {
+        'employee_id': 'EMP003',
+        'name': 'Bob Johnson',
+        'email': 'bob.johnson@company.com',
+        'department': 'Information Technology',
+        'phone': '+1-555-0103',
+        'manager': 'CEO',
+        'location': 'Building A, Floor 4',
+        'title': 'IT Director'
+    },
+    'EMP004': {
+        'employee_id': 'EMP004',
+        'name': 'Alice Brown',
+        'email': 'alice.brown@company.com',
+        'department': 'Human Resources',
+        'phone': '+1-555-0201',
+        'manager': 'Carol Wilson',
+        'location': 'Building B, Floor 2',
+        'title': 'HR Specialist'
+    },
+    'EMP005': {
+        'employee_id': 'EMP005',
+        'name': 'Carol Wilson',
+        'email': 'carol.wilson@company.com',
+        'department': 'Human Resources',
+        'phone': '+1-555-0202',
+        'manager': 'CEO',
+        'location': 'Building B, Floor 2',
+        'title': 'HR Manager'
+    },
+    'EMP006': {
+        'employee_id': 'EMP006',
+        'name': 'David Miller',
+        'email': 'david.miller@company.com',
+        'department': 'Finance',
+        'phone': '+1-555-0301',
+        'manager': 'Sarah Davis',
+        'location': 'Building C, Floor 1',
+        'title': 'Financial Analyst'
+    },
+    'EMP007': {
+        'employee_id': 'EMP007',
+        'name': 'Sarah Davis',
+        'email': 'sarah.davis@company.com',
+        'department': 'Finance',
+        'phone': '+1-555-0302',
+        'manager': 'CEO',
+        'location': 'Building C, Floor 1',
+        'title': 'Finance Manager'
+    },
+    'EMP008': {
+        'employee_id': 'EMP008',
+        'name': 'Michael Taylor',
+        'email': 'michael.taylor@company.com',
+        'department': 'Marketing',
+        'phone': '+1-555-0401',
+        'manager': 'Lisa Anderson',
+        'location': 'Building D, Floor 2',
+        'title': 'Marketing Specialist'
+    },
+    'EMP009': {
+        'employee_id': 'EMP009',
+        'name': 'Lisa Anderson',
+        'email': 'lisa.anderson@company.com',
+        'department': 'Marketing',
+        'phone': '+1-555-0402',
+        'manager': 'CEO',
+        'location': 'Building D, Floor 2',
+        'title': 'Marketing Manager'
+    },
+    'EMP010': {
+        'employee_id': 'EMP010',
+        'name': 'Robert Chen',
+        'email': 'robert.chen@company.com',
+        'department': 'Operations',
+        'phone': '+1-555-0501',
+        'manager': 'Jennifer Lee',
+        'location': 'Building E, Floor 1',
+        'title': 'Operations Coordinator'
+    }
+}
+
+def load_employees(path):
+    """
+    Read employee records from a file
+    
+    Args:
+        path (str): '.json' file holding a list (or {"employees": [...]}), or a
+            JSON lines file with one record per line; either may end in '.gz'
+            
+    Returns:
+        list: Employee records
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        if path.endswith(('.json', '.json.gz')):
+            data = json.load(f)
+            return data['employees'] if isinstance(data, dict) else data
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class MockActiveDirectory(DirectoryProvider):
+    def __init__(self, employees=None):
+        """
+        Load the directory and build its search index
+        
+        Args:
+            employees (list): Employee records; defaults to the file in
+                HELPDESK_DIRECTORY_FILE, then to SAMPLE_EMPLOYEES
+        """
+        if employees is None:
+            path = os.environ.get('HELPDESK_DIRECTORY_FILE')
+            employees = load_employees(path) if path else SAMPLE_EMPLOYEES.values()
+        self.employees = {emp['employee_id'].upper(): emp for emp in employees}
         
         # Create email-to-employee mapping for quick lookup
         self.email_mapping = {}
         for emp_id, emp_data in self.employees.items():
-            self.email_mapping[emp_data['email']] = emp_id
+            self.email_mapping[emp_data['email'].lower()] = emp_id
+        
+        self.index = EmployeeIndex(self.employees.values())
+        self.org = OrgGraph(self.employees.values())
     
     def get_employee(self, identifier):
         """
@@ -132,12 +181,40 @@ class MockActiveDirectory:
             emp_id = self.email_mapping[identifier.lower()]
             return self.employees[emp_id]
         
-        # Try partial matching
-        for emp_id, emp_data in self.employees.items():
-            if (identifier.lower() in emp_data['name'].lower() or 
-                identifier.lower() in emp_data['email'].lower()):
-                return emp_data
+        # Try partial matching, best match first
+        matches = self.index.search(identifier, limit=1, fields=('name', 'email'))
+        return matches[0] if matches else None
+    
+    def get_employees(self, employee_ids):
+        """
+        Get several employees by id
         
+        Args:
+            employee_ids (iterable): Employee IDs
+            
+        Returns:
+            dict: Employee by upper-case ID; unknown IDs are left out
+        """
+        employees = {}
+        for employee_id in employee_ids:
+            employee = self.employees.get(employee_id.upper())
+            if employee is not None:
+                employees[employee_id.upper()] = employee
+        return employees
+    
+    def get_employee_by_name(self, name):
+        """
+        Get the employee with exactly this name
+        
+        Args:
+            name (str): Full name
+            
+        Returns:
+            dict: Employee information or None if not found
+        """
+        for employee in self.index.with_value('name', name):
+            if employee['name'] == name:
+                return employee
         return None
     
     def get_all_employees(self):
@@ -159,8 +236,7 @@ class MockActiveDirectory:
         Returns:
             list: List of employees in the department
         """
-        return [emp for emp in self.employees.values() 
-                if emp['department'].lower() == department.lower()]
+        return self.index.with_value('department', department)
     
     def get_employee_manager(self, employee_id):
         """
@@ -176,14 +252,17 @@ class MockActiveDirectory:
         if not employee:
             return None
         
-        manager_name = employee['manager']
-        
-        # Find manager by name
-        for emp in self.employees.values():
-            if emp['name'] == manager_name:
-                return emp
+        manager_id = self.org.manager(employee['employee_id'])
+        return self.employees[manager_id] if manager_id else None
+    
+    def get_org_graph(self):
+        """
+        Get the reporting lines of the directory, built when it was loaded
         
-        return None
+        Returns:
+            OrgGraph: Manager and report edges between employee IDs
+        """
+        return self.org
     
     def validate_employee(self, employee_id):
         """
@@ -197,24 +276,17 @@ class MockActiveDirectory:
         """
         return employee_id.upper() in self.employees
     
-    def search_employees(self, query):
+    def search_employees(self, query, limit=DEFAULT_SEARCH_LIMIT):
         """
-        Search employees by name, email, or department
+        Search employees by name, email, department or title
+        
+        Queries of one or two characters only match the start of a word.
         
         Args:
             query (str): Search query
+            limit (int): Maximum number of results; None for all
             
         Returns:
-            list: List of matching employees
+            list: Matching employees, best match first
         """
-        query = query.lower()
-        results = []
-        
-        for emp in self.employees.values():
-            if (query in emp['name'].lower() or 
-                query in emp['email'].lower() or 
-                query in emp['department'].lower() or
-                query in emp['title'].lower()):
-                results.append(emp)
-        
-        return results
+        return self.index.search(query, limit)
@@ -0,0 +1,149 @@
+"""
+Reporting lines of the employee directory
+Directory records name their manager rather than pointing at them. The graph
+resolves those names to employee ids once, when it is built, and lays the
+org out in depth-first order so that everyone under a manager is one
+contiguous slice: a manager's org is read in time proportional to its size,
+an employee's management chain in time proportional to its length.
+"""
+
+# Preferred over the manager's name when a record has it
+MANAGER_ID_FIELD = 'manager_id'
+
+
+class OrgGraph:
+    """
+    Manager and report edges between employee ids, built once from the directory
+
+    A manager name that matches several employees resolves to the one in the
+    same department, else the first in directory order. Employees whose
+    manager is not in the directory (e.g. 'CEO') are roots. A reporting cycle
+    is cut at the first of its employees in directory order, who becomes a root.
+    """
+
+    def __init__(self, employees):
+        employees = list(employees)
+        self.manager_of = {}  # Employee id -> manager id, or None for roots
+        self.reports = {}     # Employee id -> ids of direct reports, in directory order
+        departments = {}
+        by_name = {}
+        for employee in employees:
+            employee_id = employee['employee_id'].upper()
+            self.reports[employee_id] = []
+            departments[employee_id] = employee.get('department')
+            by_name.setdefault(employee.get('name'), []).append(employee_id)
+
+        for employee in employees:
+            employee_id = employee['employee_id'].upper()
+            manager_id = (employee.get(MANAGER_ID_FIELD) or '').upper()
+            if manager_id not in self.reports:
+                candidates = by_name.get(employee.get('manager')) or [None]
+                same_department = [c for c in candidates if departments.get(c) == departments[employee_id]]
+                manager_id = (same_department or candidates)[0]
+            if manager_id == employee_id:
+                manager_id = None
+            self.manager_of[employee_id] = manager_id
+            if manager_id is not None:
+                self.reports[manager_id].append(employee_id)
+
+        # Depth-first order; each employee's org is order[start:end]
+        self.order = []
+        self.spans = {}
+        self.depths = {}
+        self.roots = [employee_id for employee_id, manager_id in self.manager_of.items() if manager_id is None]
+        for root in self.roots:
+            self.lay_out(root)
+        positions = {employee_id: number for number, employee_id in enumerate(self.manager_of)}
+        for employee_id in self.manager_of:
+            if employee_id not in self.spans:
+                # Unvisited employees are on a reporting cycle or report into one;
+                # follow the chain up until it repeats to find the cycle
+                chain = []
+                member = employee_id
+                while member not in chain:
+                    chain.append(member)
+                    member = self.manager_of[member]
+                root = min(chain[chain.index(member):], key=positions.get)
+                self.reports[self.manager_of[root]].remove(root)
+                self.manager_of[root] = None
+                self.roots.append(root)
+                self.lay_out(root)
+
+    def lay_out(self, root):
+        """Append the org under a root to the depth-first order"""
+        start = len(self.order)
+        self.order.append(root)
+        self.depths[root] = 0
+        stack = [(root, iter(self.reports[root]), start)]
+        while stack:
+            employee_id, reports, start = stack[-1]
+            report = next(reports, None)
+            if report is None:
+                self.spans[employee_id] = (start, len(self.order))
+                stack.pop()
+            elif report not in self.depths:
+                self.depths[report] = self.depths[employee_id] + 1
+                stack.append((report, iter(self.reports[report]), len(self.order)))
+                self.order.append(report)
+
+    def __len__(self):
+        return len(self.manager_of)
+
+    def __contains__(self, employee_id):
+        return employee_id.upper() in self.manager_of
+
+    def manager(self, employee_id):
+        """Id of an employee's manager, or None"""
+        return self.manager_of.get(employee_id.upper())
+
+    def direct_reports(self, employee_id):
+        """Ids of an employee's direct reports"""
+        return list(self.reports.get(employee_id.upper(), ()))
+
+    def depth(self, employee_id):
+        """Number of managers above an employee"""
+        return self.depths[employee_id.upper()]
+
+    def ancestors(self, employee_id):
+        """
+        Management chain of an employee
+
+        Returns:
+            list: Manager ids, nearest first; empty for roots and unknown ids
+        """
+        chain = []
+        manager_id = self.manager_of.get(employee_id.upper())
+        while manager_id is not None:
+            chain.append(manager_id)
+            manager_id = self.manager_of[manager_id]
+        return chain
+
+    def descendants(self, employee_id, include_self=False):
+        """
+        Everyone reporting to an employee, directly or indirectly
+
+        Args:
+            employee_id (str): Employee ID of the manager
+            include_self (bool): Whether the manager is included
+
+        Returns:
+            list: Employee ids, depth-first; empty for unknown ids
+        """
+        span = self.spans.get(employee_id.upper())
+        if span is None:
+            return []
+        start, end = span
+        return self.order[start if include_self else start + 1:end]
+
+    def org_size(self, employee_id):
+        """Number of people reporting to an employee, directly or indirectly"""
+        start, end = self.spans.get(employee_id.upper(), (0, 1))
+        return end - start - 1
+
+    def is_under(self, employee_id, manager_id):
+        """Whether an employee reports to a manager, directly or indirectly"""
+        span = self.spans.get(manager_id.upper())
+        position = self.spans.get(employee_id.upper())
+        if span is None or position is None:
+            return False
+        return span[0] < position[0] < span[1]
@@ -0,0 +1,215 @@
+"""
+Inverted full-text index for ticket search
+Ranks matches with BM25 and treats every query word as a prefix, so results
+stay useful while the user is still typing
+"""
+
+import bisect
+import math
+import re
+from collections import Counter
+
+from utils.indexes import TicketIndex
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Ticket fields included in the index, in addition to comment text
+SEARCH_FIELDS = ('title', 'description', 'employee_name', 'category')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Score multiplier for words that only match as a prefix of the indexed term
+PREFIX_WEIGHT = 0.5
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric words"""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+def ticket_terms(ticket, comments=None):
+    """
+    Count the searchable words of a ticket
+
+    Title words are counted twice so that title matches rank higher.
+
+    Args:
+        ticket (dict): Ticket
+        comments (Counter): Term frequencies of the ticket's comments, if any
+
+    Returns:
+        Counter: Term frequencies
+    """
+    terms = Counter(tokenize(ticket.get('title')))
+    for field in SEARCH_FIELDS:
+        terms.update(tokenize(ticket.get(field)))
+    if comments:
+        terms.update(comments)
+    return terms
+
+
+class SearchIndex(TicketIndex):
+    """
+    Inverted index from words to the tickets containing them
+
+    Comments are stored outside the tickets, so their words are kept per
+    ticket in comment_terms and merged in whenever a ticket is indexed.
+    """
+
+    def __init__(self):
+        self.comment_terms = {}
+        self.clear()
+
+    def clear(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def put(self, ticket):
+        ticket_id = ticket['id']
+        terms = ticket_terms(ticket, self.comment_terms.get(ticket_id))
+        if self.doc_terms.get(ticket_id) == terms:
+            return
+        self.discard(ticket_id)
+
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            postings[ticket_id] = tf
+
+        length = sum(terms.values())
+        self.doc_terms[ticket_id] = terms
+        self.doc_lengths[ticket_id] = length
+        self.total_length += length
+
+    def discard(self, ticket_id):
+        terms = self.doc_terms.pop(ticket_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self.postings[term]
+            del postings[ticket_id]
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+        self.total_length -= self.doc_lengths.pop(ticket_id)
+
+    def rebuild(self, tickets):
+        self.clear()
+        for ticket in tickets:
+            ticket_id = ticket['id']
+            terms = ticket_terms(ticket, self.comment_terms.get(ticket_id))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[ticket_id] = tf
+            length = sum(terms.values())
+            self.doc_terms[ticket_id] = terms
+            self.doc_lengths[ticket_id] = length
+            self.total_length += length
+        self.vocabulary = sorted(self.postings)
+
+    def add_comment(self, ticket_id, text):
+        """Add the words of a comment to a ticket; they are indexed when the ticket is next put"""
+        words = tokenize(text)
+        if words:
+            self.comment_terms.setdefault(ticket_id, Counter()).update(words)
+
+    def clear_comments(self):
+        """Forget the words of all comments"""
+        self.comment_terms = {}
+
+    def expand(self, word):
+        """
+        Find the indexed terms a query word matches
+
+        Every term starting with the word is included, as in the SQLite
+        backend's prefix queries, so short words match the same tickets there.
+
+        Returns:
+            list: (term, weight) pairs, the exact term first
+        """
+        matches = []
+        position = bisect.bisect_left(self.vocabulary, word)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(word):
+            term = self.vocabulary[position]
+            matches.append((term, 1.0 if term == word else PREFIX_WEIGHT))
+            position += 1
+        return matches
+
+    def estimate(self, query):
+        """
+        Upper bound on the number of tickets a query matches, without scoring
+
+        Returns:
+            int: Postings of the rarest query word
+        """
+        words = set(tokenize(query))
+        if not words:
+            return 0
+        return min(sum(len(self.postings[term]) for term, _ in self.expand(word)) for word in words)
+
+    def search(self, query, limit=None, candidates=None):
+        """
+        Find tickets containing every word of the query
+
+        Args:
+            query (str): Search text
+            limit (int): Maximum number of results, or None for all
+            candidates (set): Only consider these ticket ids, or None for all
+
+        Returns:
+            list: Ticket ids, best match first
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or not self.doc_lengths or candidates is not None and not candidates:
+            return []
+
+        count = len(self.doc_lengths)
+        average_length = self.total_length / count
+        expansions = []
+        for word in words:
+            terms = self.expand(word)
+            if not terms:
+                return []
+            scored = []
+            for term, weight in terms:
+                postings = self.postings[term]
+                df = len(postings)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                scored.append((postings, weight * idf))
+            expansions.append(scored)
+
+        # Start from the rarest word and only score candidates for the rest
+        expansions.sort(key=lambda scored: sum(len(postings) for postings, _ in scored))
+        scores = None
+        for scored in expansions:
+            word_scores = {}
+            for postings, weight in scored:
+                if scores is not None:
+                    docs = (d for d in scores if d in postings)
+                elif candidates is not None and len(candidates) < len(postings):
+                    docs = (d for d in candidates if d in postings)
+                elif candidates is not None:
+                    docs = (d for d in postings if d in candidates)
+                else:
+                    docs = postings
+                for doc in docs:
+                    tf = postings[doc]
+                    norm = K1 * (1 - B + B * self.doc_lengths[doc] / average_length)
+                    score = weight * tf * (K1 + 1) / (tf + norm)
+                    if score > word_scores.get(doc, 0):
+                        word_scores[doc] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {doc: scores[doc] + score for doc, score in word_scores.items()}
+            if not scores:
+                return []
+
+        ranked = sorted(scores, key=lambda doc: (-scores[doc], doc))
+        return ranked if limit is None else ranked[:limit]
@@ -0,0 +1,817 @@
+"""
+SQLite storage backend for tickets and system data
+Implements the same interface as Database, with indexed ticket columns so
+that filters run inside SQLite instead of over the full ticket list
+"""
+
+import json
+import os
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.comment_store import detach_comments
+from utils.database import check_filters, default_data, empty_data, parse_sort, read_data_file
+from utils.indexes import ChangeJournal
+from utils.locks import ReadWriteLock
+from utils.metrics import instrument_class
+from utils.search_index import ticket_terms, tokenize
+from utils.statistics import format_statistics
+from utils.timestamps import format_epoch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id TEXT PRIMARY KEY,
+    status TEXT,
+    priority TEXT,
+    category TEXT,
+    employee_id TEXT,
+    assigned_to TEXT,
+    created_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status);
+CREATE INDEX IF NOT EXISTS idx_tickets_priority ON tickets (priority);
+CREATE INDEX IF NOT EXISTS idx_tickets_category ON tickets (category);
+CREATE INDEX IF NOT EXISTS idx_tickets_employee_id ON tickets (employee_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_assigned_to ON tickets (assigned_to);
+CREATE INDEX IF NOT EXISTS idx_tickets_created_date ON tickets (created_date, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_updated_date ON tickets (json_extract(data, '$.updated_date'), id);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY,
+    ticket_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_comments_ticket_id ON comments (ticket_id, id);
+CREATE TABLE IF NOT EXISTS ticket_counts (
+    name TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS tickets_count_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO ticket_counts (name, count)
+    VALUES ('total', 1), ('status:' || COALESCE(NEW.status, ''), 1), ('priority:' || COALESCE(NEW.priority, ''), 1),
+           ('unassigned', NEW.assigned_to IS NULL)
+    ON CONFLICT (name) DO UPDATE SET count = count + excluded.count;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_count_delete AFTER DELETE ON tickets BEGIN
+    INSERT INTO ticket_counts (name, count)
+    VALUES ('total', -1), ('status:' || COALESCE(OLD.status, ''), -1), ('priority:' || COALESCE(OLD.priority, ''), -1),
+           ('unassigned', -(OLD.assigned_to IS NULL))
+    ON CONFLICT (name) DO UPDATE SET count = count + excluded.count;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_count_update AFTER UPDATE OF status, priority, assigned_to ON tickets BEGIN
+    INSERT INTO ticket_counts (name, count)
+    VALUES ('status:' || COALESCE(OLD.status, ''), -1), ('priority:' || COALESCE(OLD.priority, ''), -1),
+           ('unassigned', -(OLD.assigned_to IS NULL))
+    ON CONFLICT (name) DO UPDATE SET count = count + excluded.count;
+    INSERT INTO ticket_counts (name, count)
+    VALUES ('status:' || COALESCE(NEW.status, ''), 1), ('priority:' || COALESCE(NEW.priority, ''), 1),
+           ('unassigned', NEW.assigned_to IS NULL)
+    ON CONFLICT (name) DO UPDATE SET count = count + excluded.count;
+END;
+"""
+
+# Full-text index over ticket text and comments, kept in sync by triggers.
+# Only created when SQLite is built with FTS5. Comments must be inserted
+# before the ticket row that counts them is written.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5 (
+    title, description, employee_name, category, comments
+);
+CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO tickets_fts (rowid, title, description, employee_name, category, comments)
+    SELECT NEW.rowid, json_extract(NEW.data, '$.title'), json_extract(NEW.data, '$.description'),
+           json_extract(NEW.data, '$.employee_name'), json_extract(NEW.data, '$.category'),
+           (SELECT group_concat(json_extract(c.data, '$.comment'), ' ')
+            FROM comments c WHERE c.ticket_id = NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON tickets BEGIN
+    DELETE FROM tickets_fts WHERE rowid = OLD.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_update AFTER UPDATE OF data ON tickets BEGIN
+    DELETE FROM tickets_fts WHERE rowid = OLD.rowid;
+    INSERT INTO tickets_fts (rowid, title, description, employee_name, category, comments)
+    SELECT NEW.rowid, json_extract(NEW.data, '$.title'), json_extract(NEW.data, '$.description'),
+           json_extract(NEW.data, '$.employee_name'), json_extract(NEW.data, '$.category'),
+           (SELECT group_concat(json_extract(c.data, '$.comment'), ' ')
+            FROM comments c WHERE c.ticket_id = NEW.id);
+END;
+"""
+
+# Populates tickets_fts for databases created before the full-text index
+REBUILD_FTS = """
+DELETE FROM tickets_fts;
+INSERT INTO tickets_fts (rowid, title, description, employee_name, category, comments)
+SELECT rowid, json_extract(data, '$.title'), json_extract(data, '$.description'),
+       json_extract(data, '$.employee_name'), json_extract(data, '$.category'),
+       (SELECT group_concat(json_extract(c.data, '$.comment'), ' ')
+        FROM comments c WHERE c.ticket_id = tickets.id)
+FROM tickets;
+"""
+
+# Column weights for bm25(): title matches count double
+FTS_WEIGHTS = "2.0, 1.0, 1.0, 1.0, 1.0"
+
+# Rebuilds ticket_counts from scratch, for databases created before the triggers
+REBUILD_COUNTS = """
+DELETE FROM ticket_counts;
+INSERT INTO ticket_counts (name, count) SELECT 'total', COUNT(*) FROM tickets;
+INSERT INTO ticket_counts (name, count) SELECT 'status:' || COALESCE(status, ''), COUNT(*) FROM tickets GROUP BY status;
+INSERT INTO ticket_counts (name, count) SELECT 'priority:' || COALESCE(priority, ''), COUNT(*) FROM tickets GROUP BY priority;
+INSERT INTO ticket_counts (name, count) SELECT 'unassigned', COUNT(*) FROM tickets WHERE assigned_to IS NULL;
+"""
+
+# Version 1 moved comments out of the ticket documents into the comments table
+SCHEMA_VERSION = 1
+
+# Full-text triggers of version 0, which read comments from the ticket documents
+OLD_FTS_TRIGGERS = """
+DROP TRIGGER IF EXISTS tickets_fts_insert;
+DROP TRIGGER IF EXISTS tickets_fts_update;
+"""
+
+# Indexed expressions for the date fields of TICKET_SORT_FIELDS; dates are stored
+# as strings in the ticket date format, which sorts chronologically
+DATE_COLUMNS = {
+    'created_date': "t.created_date",
+    'updated_date': "json_extract(t.data, '$.updated_date')"
+}
+
+# Values bound per IN (...) list, below the 999 variables older SQLite builds allow
+MAX_QUERY_PARAMS = 500
+
+UPDATE_TICKET = """
+UPDATE tickets SET status = ?, priority = ?, category = ?, employee_id = ?,
+    assigned_to = ?, created_date = ?, data = ?
+WHERE id = ?
+"""
+
+UPSERT_TICKET = """
+INSERT INTO tickets (id, status, priority, category, employee_id, assigned_to, created_date, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    status = excluded.status,
+    priority = excluded.priority,
+    category = excluded.category,
+    employee_id = excluded.employee_id,
+    assigned_to = excluded.assigned_to,
+    created_date = excluded.created_date,
+    data = excluded.data
+"""
+
+class SQLiteDatabase:
+    def __init__(self, data_file="helpdesk_data.db", seed=True):
+        self.data_file = data_file
+        self.storage_mode = 'sqlite'
+        self.lock = ReadWriteLock()
+        self.journal = ChangeJournal()
+        
+        is_new = not os.path.exists(data_file)
+        self.conn = sqlite3.connect(data_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        if not self.conn.execute("SELECT 1 FROM ticket_counts WHERE name = 'total'").fetchone():
+            self.conn.executescript(REBUILD_COUNTS)
+        
+        upgraded = self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION
+        if upgraded:
+            self.conn.executescript(OLD_FTS_TRIGGERS)
+            self.move_embedded_comments()
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False  # SQLite built without FTS5; search falls back to a scan
+        if self.has_fts:
+            fts_rows = self.conn.execute("SELECT COUNT(*) FROM tickets_fts").fetchone()[0]
+            ticket_rows = self.conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+            if upgraded or fts_rows != ticket_rows:
+                self.conn.executescript(REBUILD_FTS)
+        
+        if is_new and seed:
+            data = default_data()
+            self.replace_all(data['tickets'], data['settings'])
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    @contextmanager
+    def transaction(self):
+        """Hold the write lock for a group of changes; each statement commits on its own"""
+        with self.lock.write_lock():
+            yield
+    
+    def flush(self):
+        """SQLite commits every write, so there is nothing to flush"""
+        return True
+    
+    def ticket_row(self, ticket):
+        """Build the table row for a ticket"""
+        return (
+            ticket['id'],
+            ticket.get('status'),
+            ticket.get('priority'),
+            ticket.get('category'),
+            ticket.get('employee_id'),
+            ticket.get('assigned_to') or None,
+            ticket.get('created_date'),
+            json.dumps(ticket)
+        )
+    
+    def move_embedded_comments(self):
+        """Move comments stored inside ticket documents, by older versions, into the comments table"""
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT data FROM tickets WHERE json_type(data, '$.comments') IS NOT NULL").fetchall()
+            for (data,) in rows:
+                ticket, comments = detach_comments(json.loads(data))
+                self.insert_comments(ticket['id'], comments)
+                self.conn.execute("UPDATE tickets SET data = ? WHERE id = ?", (json.dumps(ticket), ticket['id']))
+    
+    def insert_comments(self, ticket_id, comments):
+        """Insert comments for a ticket; must be called inside a transaction"""
+        self.conn.executemany("INSERT INTO comments (ticket_id, data) VALUES (?, ?)",
+                              [(ticket_id, json.dumps(comment)) for comment in comments])
+    
+    def query_tickets(self, sql, params=()):
+        """Run a ticket query and decode the stored documents"""
+        with self.lock.read_lock():
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    
+    def replace_all(self, tickets, settings):
+        """
+        Replace all tickets and settings in a single transaction
+        
+        Args:
+            tickets (list): Complete list of tickets, with their comments embedded
+            settings (dict): System settings
+        """
+        rows = []
+        with self.lock.write_lock(), self.conn:
+            self.conn.execute("DELETE FROM tickets")
+            self.conn.execute("DELETE FROM comments")
+            for ticket in tickets:
+                ticket, comments = detach_comments(ticket)
+                self.insert_comments(ticket['id'], comments)
+                rows.append(self.ticket_row(ticket))
+            self.conn.executemany(UPSERT_TICKET, rows)
+            self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('settings', ?)",
+                              (json.dumps(settings),))
+            self.journal.record(None)
+    
+    def get_tickets(self):
+        """Get all tickets"""
+        return self.query_tickets("SELECT data FROM tickets ORDER BY rowid")
+    
+    def count_tickets(self):
+        """Get the number of tickets"""
+        with self.lock.read_lock():
+            row = self.conn.execute("SELECT count FROM ticket_counts WHERE name = 'total'").fetchone()
+        return row[0] if row else 0
+    
+    def add_ticket(self, ticket):
+        """Add a new ticket"""
+        with self.lock.write_lock(), self.conn:
+            self.conn.execute(UPSERT_TICKET, self.ticket_row(ticket))
+            self.journal.record([ticket['id']])
+    
+    def get_ticket(self, ticket_id):
+        """Get a single ticket by id, or None if it does not exist"""
+        tickets = self.query_tickets("SELECT data FROM tickets WHERE id = ?", (ticket_id,))
+        return tickets[0] if tickets else None
+    
+    def update_ticket(self, ticket):
+        """
+        Replace a single existing ticket
+        
+        Args:
+            ticket (dict): Updated ticket, matched on its id
+            
+        Returns:
+            bool: True if the ticket exists and was replaced
+        """
+        row = self.ticket_row(ticket)
+        with self.lock.write_lock(), self.conn:
+            cursor = self.conn.execute(UPDATE_TICKET, row[1:] + row[:1])
+            if cursor.rowcount:
+                self.journal.record([ticket['id']])
+        return cursor.rowcount > 0
+    
+    def add_comment(self, ticket, comment):
+        """
+        Append a comment to a ticket's thread and update the ticket
+        
+        Args:
+            ticket (dict): Updated ticket, matched on its id
+            comment (dict): Comment with author, comment and timestamp
+            
+        Returns:
+            bool: True if the ticket exists and the comment was added
+        """
+        with self.lock.write_lock(), self.conn:
+            if not self.conn.execute("SELECT 1 FROM tickets WHERE id = ?", (ticket['id'],)).fetchone():
+                return False
+            self.insert_comments(ticket['id'], [comment])
+            count = self.conn.execute("SELECT COUNT(*) FROM comments WHERE ticket_id = ?",
+                                      (ticket['id'],)).fetchone()[0]
+            row = self.ticket_row(dict(ticket, comment_count=count, last_comment_date=comment.get('timestamp')))
+            self.conn.execute(UPDATE_TICKET, row[1:] + row[:1])
+            self.journal.record([ticket['id']])
+        return True
+    
+    def get_comments(self, ticket_id, offset=0, limit=None):
+        """
+        Get part of a ticket's comment thread, oldest first
+        
+        Args:
+            ticket_id (str): Ticket ID
+            offset (int): Number of comments to skip
+            limit (int): Maximum number of comments, or None for the rest
+            
+        Returns:
+            list: Comments
+        """
+        with self.lock.read_lock():
+            rows = self.conn.execute(
+                "SELECT data FROM comments WHERE ticket_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                (ticket_id, -1 if limit is None else limit, offset)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    
+    def export_tickets(self):
+        """Get all tickets with their comments embedded, as stored in backups"""
+        with self.lock.read_lock():
+            threads = {}
+            for ticket_id, data in self.conn.execute("SELECT ticket_id, data FROM comments ORDER BY id"):
+                threads.setdefault(ticket_id, []).append(json.loads(data))
+            tickets = self.get_tickets()
+        return [dict(t, comments=threads.get(t['id'], [])) for t in tickets]
+    
+    def iter_tickets(self, batch_size=1000):
+        """
+        Iterate over all tickets in storage order, with their comments embedded
+        
+        Tickets are read in batches by rowid, so memory use does not grow with
+        the table and the read lock is released between batches.
+        
+        Args:
+            batch_size (int): Tickets read per batch
+            
+        Yields:
+            dict: Ticket with a 'comments' list, as stored in backups
+        """
+        last_rowid = 0
+        while True:
+            with self.lock.read_lock():
+                rows = self.conn.execute(
+                    "SELECT rowid, id, data FROM tickets WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    return
+                threads = {}
+                for ticket_id, data in self.conn.execute(
+                        "SELECT ticket_id, data FROM comments "
+                        "WHERE ticket_id IN (SELECT value FROM json_each(?)) ORDER BY id",
+                        (json.dumps([row[1] for row in rows]),)):
+                    threads.setdefault(ticket_id, []).append(json.loads(data))
+            for _, ticket_id, data in rows:
+                yield dict(json.loads(data), comments=threads.get(ticket_id, []))
+            last_rowid = rows[-1][0]
+    
+    def upsert_tickets(self, tickets):
+        """
+        Add or replace a batch of tickets in one transaction, matched on their ids
+        
+        Embedded comments are stored only for tickets that have no comments
+        yet, so importing the same file twice does not duplicate threads.
+        
+        Args:
+            tickets (list): Tickets, optionally with a 'comments' list
+            
+        Returns:
+            int: Number of tickets that did not exist before
+        """
+        ids = json.dumps([t['id'] for t in tickets])
+        added = 0
+        rows = []
+        with self.lock.write_lock(), self.conn:
+            existing = dict(self.conn.execute(
+                "SELECT id, json_extract(data, '$.last_comment_date') FROM tickets "
+                "WHERE id IN (SELECT value FROM json_each(?))", (ids,)))
+            counts = dict(self.conn.execute(
+                "SELECT ticket_id, COUNT(*) FROM comments "
+                "WHERE ticket_id IN (SELECT value FROM json_each(?)) GROUP BY ticket_id", (ids,)))
+            for ticket in tickets:
+                ticket, comments = detach_comments(ticket)
+                ticket_id = ticket['id']
+                if comments and not counts.get(ticket_id):
+                    self.insert_comments(ticket_id, comments)
+                    counts[ticket_id] = len(comments)
+                elif ticket_id in existing:
+                    ticket['last_comment_date'] = existing[ticket_id]
+                ticket['comment_count'] = counts.get(ticket_id, 0)
+                if ticket_id not in existing:
+                    existing[ticket_id] = ticket['last_comment_date']
+                    added += 1
+                rows.append(self.ticket_row(ticket))
+            # Comments go in first so the full-text triggers index them with their tickets
+            self.conn.executemany(UPSERT_TICKET, rows)
+            self.journal.record([row[0] for row in rows])
+        return added
+    
+    def find_tickets(self, **filters):
+        """
+        Get tickets matching all of the given field values
+        
+        Args:
+            **filters: Field/value pairs from TICKET_FILTER_FIELDS. A value of
+                None for 'assigned_to' matches unassigned tickets, and
+                'assigned' (bool) matches tickets with or without an assignee.
+                
+        Returns:
+            list: List of matching tickets
+        """
+        check_filters(filters)
+        clauses, params = self.filter_clauses(filters)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self.query_tickets(f"SELECT t.data FROM tickets t{where} ORDER BY t.rowid", params)
+    
+    def find_tickets_for_employees(self, employee_ids):
+        """
+        Get the tickets raised by any of several employees
+        
+        Args:
+            employee_ids (iterable): Employee IDs
+            
+        Returns:
+            list: Matching tickets, in storage order
+        """
+        employee_ids = sorted(set(employee_ids))
+        rows = []
+        with self.lock.read_lock():
+            for start in range(0, len(employee_ids), MAX_QUERY_PARAMS):
+                chunk = employee_ids[start:start + MAX_QUERY_PARAMS]
+                rows.extend(self.conn.execute(
+                    f"SELECT t.rowid, t.data FROM tickets t WHERE t.employee_id IN ({', '.join('?' * len(chunk))})",
+                    chunk).fetchall())
+        rows.sort()
+        return [json.loads(data) for _, data in rows]
+    
+    def filter_clauses(self, filters, driving=None):
+        """
+        Build SQL conditions on the tickets table, aliased t, for validated filters
+        
+        Args:
+            filters (dict): Field/value pairs
+            driving (str): If given, only this filter may use its column index.
+                The others are written as +column, which SQLite cannot look up
+                in an index, so they are checked on the rows the driving filter
+                found.
+                
+        Returns:
+            tuple: (list of SQL conditions, list of parameters)
+        """
+        clauses = []
+        params = []
+        for field, value in filters.items():
+            plus = '+' if driving is not None and field != driving else ''
+            if field == 'assigned':
+                if value:
+                    clauses.append(f"({plus}t.assigned_to IS NOT NULL AND {plus}t.assigned_to != '')")
+                    continue
+                field, value = 'assigned_to', None
+            if value is None:
+                clauses.append(f"({plus}t.{field} IS NULL OR {plus}t.{field} = '')")
+            else:
+                clauses.append(f"{plus}t.{field} = ?")
+                params.append(value)
+        return clauses, params
+    
+    def index_cardinality(self, field, value):
+        """
+        Estimate how many tickets match a single filter
+        
+        Status, priority and assignment counts come from the counter table;
+        other fields are counted from their column index.
+        
+        Args:
+            field (str): Filter field, 'assigned' or 'search'
+            value: Filter value
+            
+        Returns:
+            int: Exact count for field filters, an upper bound for searches
+        """
+        counter = None
+        if field in ('status', 'priority'):
+            counter = f"{field}:{value or ''}"
+        elif field in ('assigned', 'assigned_to') and not (field == 'assigned_to' and value):
+            counter = 'unassigned'
+        
+        with self.lock.read_lock():
+            if counter is not None:
+                row = self.conn.execute("SELECT count FROM ticket_counts WHERE name = ?", (counter,)).fetchone()
+                count = row[0] if row else 0
+                return self.count_tickets() - count if field == 'assigned' and value else count
+            if field == 'search':
+                words = set(tokenize(value))
+                if not words:
+                    return 0
+                if not self.has_fts:
+                    return self.count_tickets()
+                return min(self.conn.execute("SELECT COUNT(*) FROM tickets_fts WHERE tickets_fts MATCH ?",
+                                             (f'"{word}"*',)).fetchone()[0] for word in words)
+            clauses, params = self.filter_clauses({field: value})
+            return self.conn.execute(f"SELECT COUNT(*) FROM tickets t WHERE {clauses[0]}", params).fetchone()[0]
+    
+    def find_page(self, steps=(), sort=None, offset=0, limit=None, trace=None):
+        """
+        Get one page of the tickets matching all filter steps
+        
+        The first step drives the query: only its index is used, and the
+        other steps are checked on the rows it finds. Without statistics
+        SQLite cannot tell which column index is the most selective, so it
+        follows the given order instead.
+        
+        Args:
+            steps (list): (field, value) pairs, most selective first. Fields
+                are as for find_tickets, plus 'search' (str) which matches
+                ticket text with every word as a prefix.
+            sort (str): Field from TICKET_SORT_FIELDS, prefixed with '-' for
+                descending order. Defaults to relevance when searching and to
+                creation order otherwise.
+            offset (int): Number of matching tickets to skip
+            limit (int): Maximum number of tickets to return, or None for all
+            trace (list): Optional list that receives a dict with the detail
+                of each step of SQLite's query plan
+            
+        Returns:
+            tuple: (list of tickets on the page, total number of matching tickets)
+        """
+        steps = list(steps)
+        filters = dict(steps)
+        check_filters(filters, search=True)
+        field, descending = parse_sort(sort)
+        search = filters.pop('search', None)
+        clauses, params = self.filter_clauses(filters, steps[0][0] if steps else None)
+        source = "tickets t"
+        order = "t.rowid"
+        
+        if search is not None:
+            words = list(dict.fromkeys(tokenize(search)))
+            if not words:
+                return [], 0
+            if self.has_fts:
+                source = "tickets_fts f JOIN tickets t ON t.rowid = f.rowid"
+                order = f"bm25(tickets_fts, {FTS_WEIGHTS})"
+                clauses.insert(0, "tickets_fts MATCH ?")
+                params.insert(0, ' '.join(f'"{word}"*' for word in words))
+            else:
+                ids = [ticket['id'] for ticket in self.search_tickets(search)]
+                clauses.append("t.id IN (SELECT value FROM json_each(?))")
+                params.append(json.dumps(ids))
+        
+        if field is not None:
+            column = DATE_COLUMNS[field]
+            direction = "DESC" if descending else "ASC"
+            order = f"{column} {direction}, t.id {direction}"
+        
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT t.data FROM {source}{where} ORDER BY {order} LIMIT ? OFFSET ?"
+        params = params + [-1 if limit is None else limit, offset]
+        with self.lock.read_lock():
+            if trace is not None:
+                for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+                    trace.append({'detail': row[-1]})
+            if clauses:
+                total = self.conn.execute(f"SELECT COUNT(*) FROM {source}{where}", params[:-2]).fetchone()[0]
+            else:
+                total = self.count_tickets()
+            tickets = self.query_tickets(sql, params)
+        return tickets, total
+    
+    def update_tickets(self, tickets):
+        """Update all tickets"""
+        with self.lock.write_lock(), self.conn:
+            existing = {row[0] for row in self.conn.execute("SELECT id FROM tickets")}
+            removed = existing - {t['id'] for t in tickets}
+            self.conn.executemany("DELETE FROM tickets WHERE id = ?", [(i,) for i in removed])
+            self.conn.executemany("DELETE FROM comments WHERE ticket_id = ?", [(i,) for i in removed])
+            self.conn.executemany(UPSERT_TICKET, [self.ticket_row(t) for t in tickets])
+            self.journal.record(None)
+    
+    def get_recent_tickets(self, limit, before=None):
+        """
+        Get the most recently created tickets, newest first
+        
+        Args:
+            limit (int): Maximum number of tickets to return
+            before (tuple): Optional (created_date, id) cursor; only tickets
+                created before it are returned
+                
+        Returns:
+            list: List of tickets
+        """
+        if before is None:
+            return self.query_tickets(
+                "SELECT data FROM tickets ORDER BY created_date DESC, id DESC LIMIT ?", (limit,))
+        return self.query_tickets(
+            "SELECT data FROM tickets WHERE (created_date, id) < (?, ?) "
+            "ORDER BY created_date DESC, id DESC LIMIT ?", (before[0], before[1], limit))
+    
+    def find_tickets_between(self, field, start=None, end=None):
+        """
+        Get the tickets whose date falls in a range, oldest first
+        
+        Args:
+            field (str): 'created_date' or 'updated_date'
+            start (int): First epoch second included, or None for no lower bound
+            end (int): First epoch second excluded, or None for no upper bound
+            
+        Returns:
+            list: Matching tickets
+        """
+        if field not in DATE_COLUMNS:
+            raise ValueError(f"Cannot look up tickets by {field}")
+        column = DATE_COLUMNS[field]
+        clauses = [f"{column} IS NOT NULL"]
+        params = []
+        if start is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(format_epoch(start))
+        if end is not None:
+            clauses.append(f"{column} < ?")
+            params.append(format_epoch(end))
+        return self.query_tickets(
+            f"SELECT t.data FROM tickets t WHERE {' AND '.join(clauses)} ORDER BY {column}, t.id", params)
+    
+    def search_tickets(self, query, limit=None):
+        """
+        Full-text search over ticket text and comments
+        
+        Args:
+            query (str): Search text; every word must match, as a prefix
+            limit (int): Maximum number of results, or None for all
+            
+        Returns:
+            list: Matching tickets, best match first
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        
+        if not self.has_fts:
+            with self.lock.read_lock():
+                comment_text = dict(self.conn.execute(
+                    "SELECT ticket_id, group_concat(json_extract(data, '$.comment'), ' ') "
+                    "FROM comments GROUP BY ticket_id"))
+            results = []
+            for ticket in self.get_tickets():
+                terms = ticket_terms(ticket, Counter(tokenize(comment_text.get(ticket['id']))))
+                if all(any(term.startswith(word) for term in terms) for word in words):
+                    results.append(ticket)
+            return results if limit is None else results[:limit]
+        
+        match = ' '.join(f'"{word}"*' for word in words)
+        return self.query_tickets(
+            f"SELECT t.data FROM tickets_fts f JOIN tickets t ON t.rowid = f.rowid "
+            f"WHERE tickets_fts MATCH ? ORDER BY bm25(tickets_fts, {FTS_WEIGHTS}) LIMIT ?",
+            (match, -1 if limit is None else limit))
+    
+    def check_external_changes(self):
+        """Invalidate the change journal if another connection committed since we last looked"""
+        with self.lock.write_lock():
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self.data_version:
+                self.data_version = data_version
+                self.journal.record(None)
+    
+    def get_version(self):
+        """Get the data version, which increases with every change"""
+        self.check_external_changes()
+        return self.journal.version
+    
+    def changes_since(self, version):
+        """
+        Get the ids of tickets changed after a data version
+        
+        Args:
+            version (int): Version returned by an earlier get_version call
+            
+        Returns:
+            set: Changed ticket ids, or None if everything must be reloaded
+        """
+        self.check_external_changes()
+        with self.lock.read_lock():
+            return self.journal.changes_since(version)
+    
+    def get_ticket_statistics(self):
+        """Get ticket counts by status, priority and assignment"""
+        with self.lock.read_lock():
+            rows = self.conn.execute("SELECT name, count FROM ticket_counts").fetchall()
+        
+        counts = dict(rows)
+        status_counts = {name[7:]: n for name, n in counts.items() if name.startswith('status:')}
+        priority_counts = {name[9:]: n for name, n in counts.items() if name.startswith('priority:')}
+        return format_statistics(counts.get('total', 0), status_counts, priority_counts,
+                                 counts.get('unassigned', 0))
+    
+    def get_settings(self):
+        """Get system settings"""
+        with self.lock.read_lock():
+            row = self.conn.execute("SELECT value FROM settings WHERE key = 'settings'").fetchone()
+        return json.loads(row[0]) if row else {}
+    
+    def update_settings(self, settings):
+        """Update system settings"""
+        with self.lock.write_lock(), self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('settings', ?)",
+                              (json.dumps(settings),))
+            self.journal.record()
+    
+    def backup_data(self):
+        """Create a JSON backup of current data, compatible with Database.restore_data"""
+        backup_filename = f"helpdesk_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        try:
+            with open(backup_filename, 'w') as f:
+                json.dump({'tickets': self.export_tickets(), 'settings': self.get_settings()}, f, indent=2)
+            return backup_filename
+        except IOError:
+            return None
+    
+    def restore_data(self, backup_file):
+        """Restore data from a JSON backup"""
+        try:
+            with open(backup_file, 'r') as f:
+                data = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return False
+        
+        self.replace_all(data.get('tickets', []), data.get('settings', {}))
+        return True
+    
+    def clear_all_data(self):
+        """Clear all data (use with caution)"""
+        data = empty_data()
+        self.replace_all(data['tickets'], data['settings'])
+    
+    def get_statistics(self):
+        """Get database statistics"""
+        with self.lock.read_lock():
+            total = self.conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+            comments = self.conn.execute("SELECT COUNT(*) FROM comments").fetchone()[0]
+        return {
+            'total_tickets': total,
+            'total_comments': comments,
+            'data_file_size': os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0,
+            'last_modified': datetime.fromtimestamp(
+                os.path.getmtime(self.data_file)
+            ).strftime('%Y-%m-%d %H:%M:%S') if os.path.exists(self.data_file) else 'Never',
+            'storage_mode': self.storage_mode
+        }
+    
+    def close(self):
+        """Close the database connection"""
+        with self.lock.write_lock():
+            self.conn.close()
+
+instrument_class(SQLiteDatabase, 'sqlite_database')
+
+def migrate_json_to_sqlite(json_file="helpdesk_data.json", db_file="helpdesk_data.db"):
+    """
+    Import an existing JSON data file (and any pending log) into SQLite
+    
+    The source files are only read, never rewritten.
+    
+    Args:
+        json_file (str): Path to the JSON data file
+        db_file (str): Path to the SQLite database to create or overwrite
+        
+    Returns:
+        int: Number of tickets imported
+    """
+    if not os.path.exists(json_file):
+        raise FileNotFoundError(json_file)
+    
+    tickets, settings = read_data_file(json_file)
+    target = SQLiteDatabase(db_file, seed=False)
+    try:
+        target.replace_all(tickets, settings)
+    finally:
+        target.close()
+    return len(tickets)
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Import the JSON data file into SQLite")
+    parser.add_argument("json_file", nargs="?", default="helpdesk_data.json")
+    parser.add_argument("db_file", nargs="?", default="helpdesk_data.db")
+    args = parser.parse_args()
+    
+    count = migrate_json_to_sqlite(args.json_file, args.db_file)
+    print(f"Imported {count} tickets into {args.db_file}")
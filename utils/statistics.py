@@ -0,0 +1,79 @@
+"""
+Running ticket counters for dashboard statistics
+"""
+
+from utils.indexes import TicketIndex
+
+# Statistics keys reported for each status and priority value
+STATUS_KEYS = {
+    'Open': 'open',
+    'In Progress': 'in_progress',
+    'Resolved': 'resolved',
+    'Closed': 'closed'
+}
+PRIORITY_KEYS = {
+    'High': 'high_priority',
+    'Medium': 'medium_priority',
+    'Low': 'low_priority'
+}
+
+def format_statistics(total, status_counts, priority_counts, unassigned):
+    """
+    Build the statistics dict returned by TicketManager.get_ticket_statistics
+
+    Args:
+        total (int): Total number of tickets
+        status_counts (dict): Ticket count per status
+        priority_counts (dict): Ticket count per priority
+        unassigned (int): Number of unassigned tickets
+
+    Returns:
+        dict: Statistics about tickets
+    """
+    stats = {'total': total}
+    for status, key in STATUS_KEYS.items():
+        stats[key] = status_counts.get(status, 0)
+    for priority, key in PRIORITY_KEYS.items():
+        stats[key] = priority_counts.get(priority, 0)
+    stats['unassigned'] = unassigned
+    return stats
+
+
+class TicketStatistics(TicketIndex):
+    """Ticket counters by status, priority and assignment, updated on every write"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.total = 0
+        self.status_counts = {}
+        self.priority_counts = {}
+        self.unassigned = 0
+        self.keys = {}
+
+    def count(self, key, delta):
+        status, priority, unassigned = key
+        self.total += delta
+        self.status_counts[status] = self.status_counts.get(status, 0) + delta
+        self.priority_counts[priority] = self.priority_counts.get(priority, 0) + delta
+        if unassigned:
+            self.unassigned += delta
+
+    def put(self, ticket):
+        key = (ticket.get('status'), ticket.get('priority'), not ticket.get('assigned_to'))
+        previous = self.keys.get(ticket['id'])
+        if previous == key:
+            return
+        if previous is not None:
+            self.count(previous, -1)
+        self.keys[ticket['id']] = key
+        self.count(key, 1)
+
+    def discard(self, ticket_id):
+        if ticket_id in self.keys:
+            self.count(self.keys.pop(ticket_id), -1)
+
+    def as_dict(self):
+        """Current statistics in the TicketManager.get_ticket_statistics format"""
+        return format_statistics(self.total, self.status_counts, self.priority_counts, self.unassigned)
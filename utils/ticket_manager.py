@@ -3,13 +3,86 @@ Ticket Management System
 Handles all ticket operations including creation, updates, and retrieval
 """
 
-from datetime import datetime
+import time
 import uuid
 
-class TicketManager:
+from utils.attachment_store import ORPHAN_GRACE_S, AttachmentStore
+from utils.database import check_filters
+from utils.metrics import instrument_class
+from utils.search_index import tokenize
+from utils.statistics import TicketStatistics
+from utils.timestamps import current_timestamp, to_epoch
+
+class QueryPlanner:
+    """
+    Plans conjunctive ticket queries from index cardinalities
+    
+    Every filter is one step. Steps run from the smallest estimated
+    candidate set to the largest, so later steps only have to check the
+    tickets that are left.
+    """
+    
     def __init__(self, database):
         self.db = database
     
+    def plan(self, filters):
+        """
+        Order filter steps by estimated selectivity
+        
+        Args:
+            filters (dict): Field/value pairs, as for TicketManager.query
+            
+        Returns:
+            list: (field, value, estimated rows) tuples, most selective first
+            
+        Raises:
+            ValueError: If a filter is not supported
+        """
+        check_filters(filters, search=True)
+        steps = [(field, value, self.db.index_cardinality(field, value)) for field, value in filters.items()]
+        return sorted(steps, key=lambda step: step[2])
+    
+    def explain(self, plan, trace, sort, result, plan_ms, run_ms):
+        """
+        Describe a query plan and how it ran
+        
+        Returns:
+            str: Human-readable plan with estimated and actual rows per step
+        """
+        # Backends that run the steps themselves report rows left after each one
+        rows = [step['rows'] for step in trace if 'rows' in step]
+        lines = [f"Plan ({self.db.storage_mode}, {len(plan)} steps):" if plan else
+                 f"Plan ({self.db.storage_mode}): all tickets"]
+        for number, (field, value, estimate) in enumerate(plan, 1):
+            condition = f"search {value!r}" if field == 'search' else f"{field} = {value!r}"
+            if not rows:
+                outcome = ""
+            elif number <= len(rows):
+                outcome = f"  rows {rows[number - 1]:,}"
+            else:
+                outcome = "  skipped, no rows left"
+            lines.append(f"  {number}. {condition:<36} est. {estimate:,}{outcome}")
+        for step in trace:
+            if 'detail' in step:
+                lines.append(f"  sqlite: {step['detail']}")
+        
+        if sort:
+            order = sort.lstrip('-') + (" desc" if sort.startswith('-') else "")
+        elif any(field == 'search' for field, _, _ in plan):
+            order = "relevance"
+        else:
+            order = "creation order"
+        lines.append(f"Sort: {order}; page {result['page']} of {result['pages']} ({result['total']:,} tickets)")
+        lines.append(f"Planning {plan_ms:.2f} ms, execution {run_ms:.2f} ms")
+        return "\n".join(lines)
+
+
+class TicketManager:
+    def __init__(self, database, attachments=None):
+        self.db = database
+        self.planner = QueryPlanner(database)
+        self.attachments = attachments or AttachmentStore()
+    
     def create_ticket(self, ticket_data):
         """
         Create a new support ticket
@@ -20,32 +93,83 @@ class TicketManager:
         Returns:
             str: Generated ticket ID
         """
-        ticket_id = str(len(self.db.get_tickets()) + 1).zfill(4)
+        with self.db.transaction():
+            ticket_id = str(self.db.count_tickets() + 1).zfill(4)
+            now = current_timestamp()
         
-        ticket = {
-            'id': ticket_id,
-            'title': ticket_data['title'],
-            'description': ticket_data['description'],
-            'category': ticket_data['category'],
-            'priority': ticket_data['priority'],
-            'urgency': ticket_data.get('urgency', 'Medium'),
-            'status': 'Open',
-            'employee_id': ticket_data['employee_id'],
-            'employee_name': ticket_data['employee_name'],
-            'employee_email': ticket_data['employee_email'],
-            'department': ticket_data['department'],
-            'location': ticket_data.get('location', ''),
-            'phone': ticket_data.get('phone', ''),
-            'created_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'updated_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'assigned_to': None,
-            'resolution': '',
-            'attachments': ticket_data.get('attachments', []),
-            'comments': []
-        }
+            ticket = {
+                'id': ticket_id,
+                'title': ticket_data['title'],
+                'description': ticket_data['description'],
+                'category': ticket_data['category'],
+                'priority': ticket_data['priority'],
+                'urgency': ticket_data.get('urgency', 'Medium'),
+                'status': 'Open',
+                'employee_id': ticket_data['employee_id'],
+                'employee_name': ticket_data['employee_name'],
+                'employee_email': ticket_data['employee_email'],
+                'department': ticket_data['department'],
+                'location': ticket_data.get('location', ''),
+                'phone': ticket_data.get('phone', ''),
+                'created_date': now,
+                'updated_date': now,
+                'assigned_to': None,
+                'resolution': '',
+                'attachments': ticket_data.get('attachments', []),
+                'comment_count': 0,
+                'last_comment_date': None
+            }
+        
+            self.db.add_ticket(ticket)
+            return ticket_id
+    
+    def store_attachment(self, stream, name):
+        """
+        Store an uploaded file for use in ticket_data['attachments']
         
-        self.db.add_ticket(ticket)
-        return ticket_id
+        The file is streamed to the attachment store in chunks; identical
+        files are only stored once.
+        
+        Args:
+            stream: Readable binary file object
+            name (str): File name
+            
+        Returns:
+            dict: Attachment reference with 'name', 'sha256' and 'size'
+        """
+        return self.attachments.put(stream, name)
+    
+    def read_attachment(self, attachment, start=0, end=None):
+        """
+        Stream the contents of an attachment
+        
+        Args:
+            attachment (dict): Attachment reference from a ticket
+            start (int): First byte
+            end (int): End of the range (exclusive), or None for the end of the file
+            
+        Yields:
+            bytes: Chunks of the file
+        """
+        return self.attachments.read_range(attachment['sha256'], start, end)
+    
+    def collect_attachments(self, grace=ORPHAN_GRACE_S):
+        """
+        Remove stored files that no ticket references
+        
+        Files are stored before their ticket is created, so a submission
+        that fails leaves them behind; the grace period keeps those of
+        submissions still in progress.
+        
+        Args:
+            grace (float): Files modified less than this many seconds ago are kept
+            
+        Returns:
+            int: Number of files removed
+        """
+        referenced = {attachment['sha256'] for ticket in self.db.get_tickets()
+                      for attachment in ticket.get('attachments') or [] if isinstance(attachment, dict)}
+        return self.attachments.collect_garbage(referenced, grace)
     
     def get_ticket(self, ticket_id):
         """
@@ -57,11 +181,7 @@ class TicketManager:
         Returns:
             dict: Ticket information or None if not found
         """
-        tickets = self.db.get_tickets()
-        for ticket in tickets:
-            if ticket['id'] == ticket_id:
-                return ticket
-        return None
+        return self.db.get_ticket(ticket_id)
     
     def get_all_tickets(self):
         """
@@ -82,8 +202,33 @@ class TicketManager:
         Returns:
             list: List of employee's tickets
         """
-        tickets = self.db.get_tickets()
-        return [ticket for ticket in tickets if ticket['employee_id'] == employee_id]
+        return self.db.find_tickets(employee_id=employee_id)
+    
+    def get_org_tickets(self, org, manager_id, include_manager=True):
+        """
+        Get all tickets raised by a manager's org
+        
+        Args:
+            org (OrgGraph): Reporting lines, see DirectoryProvider.get_org_graph
+            manager_id (str): Employee ID of the manager
+            include_manager (bool): Include the manager's own tickets
+            
+        Returns:
+            list: Tickets of everyone reporting to the manager, directly or indirectly
+        """
+        return self.db.find_tickets_for_employees(org.descendants(manager_id, include_self=include_manager))
+    
+    def get_org_ticket_statistics(self, org, manager_id, include_manager=True):
+        """
+        Get statistics about the tickets raised by a manager's org
+        
+        Returns:
+            dict: Statistics in the get_ticket_statistics format
+        """
+        statistics = TicketStatistics()
+        for ticket in self.get_org_tickets(org, manager_id, include_manager):
+            statistics.put(ticket)
+        return statistics.as_dict()
     
     def get_recent_tickets(self, limit=10):
         """
@@ -95,12 +240,39 @@ class TicketManager:
         Returns:
             list: List of recent tickets
         """
-        tickets = self.db.get_tickets()
-        # Sort by created date (most recent first)
-        sorted_tickets = sorted(tickets, 
-                              key=lambda x: datetime.strptime(x['created_date'], "%Y-%m-%d %H:%M:%S"), 
-                              reverse=True)
-        return sorted_tickets[:limit]
+        return self.db.get_recent_tickets(limit)
+    
+    def get_tickets_between(self, field, start=None, end=None):
+        """
+        Get tickets created or updated in a time range, oldest first
+        
+        Args:
+            field (str): 'created_date' or 'updated_date'
+            start: First moment included (datetime, date or date string), or None
+            end: First moment excluded (datetime, date or date string), or None
+            
+        Returns:
+            list: Matching tickets
+        """
+        return self.db.find_tickets_between(field, to_epoch(start), to_epoch(end))
+    
+    def get_tickets_before(self, cursor=None, limit=10):
+        """
+        Get one page of tickets, newest first, for paginated history views
+        
+        Args:
+            cursor (str): Cursor returned for the previous page, or None for the first page
+            limit (int): Number of tickets per page
+            
+        Returns:
+            tuple: (list of tickets, cursor for the next page or None if this is the last page)
+        """
+        before = tuple(cursor.split('|', 1)) if cursor else None
+        tickets = self.db.get_recent_tickets(limit, before)
+        if len(tickets) < limit:
+            return tickets, None
+        last = tickets[-1]
+        return tickets, f"{last['created_date']}|{last['id']}"
     
     def update_ticket(self, ticket_id, updates):
         """
@@ -113,22 +285,24 @@ class TicketManager:
         Returns:
             bool: True if updated successfully, False otherwise
         """
-        tickets = self.db.get_tickets()
-        for i, ticket in enumerate(tickets):
-            if ticket['id'] == ticket_id:
-                # Update specified fields
-                for field, value in updates.items():
-                    if field in ticket:
-                        ticket[field] = value
-                
-                # Always update the modified timestamp
-                ticket['updated_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Update in database
-                tickets[i] = ticket
-                self.db.update_tickets(tickets)
-                return True
-        return False
+        with self.db.transaction():
+            ticket = self.db.get_ticket(ticket_id)
+            if ticket is None:
+                return False
+            
+            # Work on a copy so readers never see a half-updated ticket
+            ticket = dict(ticket)
+            
+            # Update specified fields
+            for field, value in updates.items():
+                if field in ticket:
+                    ticket[field] = value
+            
+            # Always update the modified timestamp
+            ticket['updated_date'] = current_timestamp()
+            
+            # Update in database
+            return self.db.update_ticket(ticket)
     
     def add_comment(self, ticket_id, comment_data):
         """
@@ -141,20 +315,32 @@ class TicketManager:
         Returns:
             bool: True if comment added successfully, False otherwise
         """
-        tickets = self.db.get_tickets()
-        for i, ticket in enumerate(tickets):
-            if ticket['id'] == ticket_id:
-                if 'comments' not in ticket:
-                    ticket['comments'] = []
-                
-                ticket['comments'].append(comment_data)
-                ticket['updated_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Update in database
-                tickets[i] = ticket
-                self.db.update_tickets(tickets)
-                return True
-        return False
+        with self.db.transaction():
+            ticket = self.db.get_ticket(ticket_id)
+            if ticket is None:
+                return False
+            
+            ticket = dict(ticket)
+            ticket['updated_date'] = current_timestamp()
+            
+            # The comment goes to the comment store; the ticket keeps the count
+            return self.db.add_comment(ticket, comment_data)
+    
+    def get_comments(self, ticket_id, offset=0, limit=None):
+        """
+        Get part of a ticket's comment thread, oldest first
+        
+        The ticket's comment_count gives the length of the whole thread.
+        
+        Args:
+            ticket_id (str): Ticket ID
+            offset (int): Number of comments to skip
+            limit (int): Maximum number of comments, or None for the rest
+            
+        Returns:
+            list: Comments
+        """
+        return self.db.get_comments(ticket_id, offset, limit)
     
     def get_tickets_by_status(self, status):
         """
@@ -166,8 +352,7 @@ class TicketManager:
         Returns:
             list: List of tickets with specified status
         """
-        tickets = self.db.get_tickets()
-        return [ticket for ticket in tickets if ticket['status'] == status]
+        return self.db.find_tickets(status=status)
     
     def get_tickets_by_priority(self, priority):
         """
@@ -179,8 +364,7 @@ class TicketManager:
         Returns:
             list: List of tickets with specified priority
         """
-        tickets = self.db.get_tickets()
-        return [ticket for ticket in tickets if ticket['priority'] == priority]
+        return self.db.find_tickets(priority=priority)
     
     def get_tickets_by_category(self, category):
         """
@@ -192,8 +376,7 @@ class TicketManager:
         Returns:
             list: List of tickets in specified category
         """
-        tickets = self.db.get_tickets()
-        return [ticket for ticket in tickets if ticket['category'] == category]
+        return self.db.find_tickets(category=category)
     
     def get_assigned_tickets(self, assignee):
         """
@@ -205,8 +388,7 @@ class TicketManager:
         Returns:
             list: List of assigned tickets
         """
-        tickets = self.db.get_tickets()
-        return [ticket for ticket in tickets if ticket.get('assigned_to') == assignee]
+        return self.db.find_tickets(assigned_to=assignee)
     
     def get_unassigned_tickets(self):
         """
@@ -215,31 +397,76 @@ class TicketManager:
         Returns:
             list: List of unassigned tickets
         """
-        tickets = self.db.get_tickets()
-        return [ticket for ticket in tickets if not ticket.get('assigned_to')]
+        return self.db.find_tickets(assigned_to=None)
     
-    def search_tickets(self, query):
+    def search_tickets(self, query, limit=None):
         """
-        Search tickets by title, description, or employee name
+        Search tickets by title, description, employee name, category or comments
+        
+        Every word of the query must match the start of a word in the ticket.
         
         Args:
             query (str): Search query
+            limit (int): Maximum number of results, or None for all
             
         Returns:
-            list: List of matching tickets
+            list: List of matching tickets, best match first
+        """
+        if not tokenize(query):
+            tickets = self.db.get_tickets()
+            return tickets if limit is None else tickets[:limit]
+        return self.db.search_tickets(query, limit)
+    
+    def query(self, filters=None, sort=None, page=1, page_size=20, explain=False):
         """
-        tickets = self.db.get_tickets()
-        query = query.lower()
-        results = []
+        Get one page of tickets matching filters, for paginated list views
         
-        for ticket in tickets:
-            if (query in ticket['title'].lower() or 
-                query in ticket['description'].lower() or 
-                query in ticket['employee_name'].lower() or
-                query in ticket['category'].lower()):
-                results.append(ticket)
+        The filters are run most selective first, as planned by QueryPlanner.
         
-        return results
+        Args:
+            filters (dict): Field/value pairs such as {'status': 'Open'}. A value of
+                None for 'assigned_to' matches unassigned tickets, 'assigned' (bool)
+                matches tickets with or without an assignee, and 'search' (str)
+                matches ticket text as in search_tickets.
+            sort (str): 'created_date' or 'updated_date', prefixed with '-' for
+                descending order. Defaults to relevance when searching and to
+                creation order otherwise.
+            page (int): 1-based page number; pages past the end return the last page
+            page_size (int): Number of tickets per page
+            explain (bool): Also describe the chosen plan and its timings
+            
+        Returns:
+            dict: 'tickets' on the page, 'total' matching tickets, the 'page'
+                actually returned and the number of 'pages', plus 'explain'
+                text if requested
+            
+        Raises:
+            ValueError: If a filter is not supported
+        """
+        filters = dict(filters or {})
+        if 'search' in filters and not tokenize(filters['search']):
+            del filters['search']
+        
+        start = time.perf_counter()
+        plan = self.planner.plan(filters)
+        steps = [(field, value) for field, value, _ in plan]
+        planned = time.perf_counter()
+        
+        trace = [] if explain else None
+        page = max(1, page)
+        tickets, total = self.db.find_page(steps, sort, (page - 1) * page_size, page_size, trace)
+        pages = max(1, -(-total // page_size))
+        if page > pages:
+            page = pages
+            trace = [] if explain else None  # Explain the run whose tickets are returned
+            tickets, total = self.db.find_page(steps, sort, (page - 1) * page_size, page_size, trace)
+        finished = time.perf_counter()
+        
+        result = {'tickets': tickets, 'total': total, 'page': page, 'pages': pages}
+        if explain:
+            result['explain'] = self.planner.explain(plan, trace, sort, result,
+                                                     (planned - start) * 1000, (finished - planned) * 1000)
+        return result
     
     def get_ticket_statistics(self):
         """
@@ -248,21 +475,17 @@ class TicketManager:
         Returns:
             dict: Statistics about tickets
         """
-        tickets = self.db.get_tickets()
-        
-        stats = {
-            'total': len(tickets),
-            'open': len([t for t in tickets if t['status'] == 'Open']),
-            'in_progress': len([t for t in tickets if t['status'] == 'In Progress']),
-            'resolved': len([t for t in tickets if t['status'] == 'Resolved']),
-            'closed': len([t for t in tickets if t['status'] == 'Closed']),
-            'high_priority': len([t for t in tickets if t['priority'] == 'High']),
-            'medium_priority': len([t for t in tickets if t['priority'] == 'Medium']),
-            'low_priority': len([t for t in tickets if t['priority'] == 'Low']),
-            'unassigned': len([t for t in tickets if not t.get('assigned_to')])
-        }
+        return self.db.get_ticket_statistics()
+    
+    def get_ticket_frame(self):
+        """
+        Get a cached, typed DataFrame of all tickets for analytics
         
-        return stats
+        Returns:
+            pandas.DataFrame: One row per ticket, indexed by id. Treat as read-only.
+        """
+        from utils.analytics import get_ticket_frame
+        return get_ticket_frame(self.db)
     
     def close_ticket(self, ticket_id, resolution):
         """
@@ -295,7 +518,7 @@ class TicketManager:
         comment_data = {
             'author': 'System',
             'comment': f'Ticket reopened. Reason: {reason}',
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'timestamp': current_timestamp()
         }
         
         # Add comment about reopening
@@ -307,3 +530,6 @@ class TicketManager:
             'assigned_to': None
         }
         return self.update_ticket(ticket_id, updates)
+
+
+instrument_class(TicketManager, 'ticket_manager')
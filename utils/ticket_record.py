@@ -0,0 +1,179 @@
+"""
+Compact in-memory ticket records
+A ticket dict carries a hash table of 20 keys and its own copy of strings such
+as 'Open' or 'Hardware Issues'. TicketRecord keeps the known fields in slots,
+stores low-cardinality fields as small integer codes, dates as epoch seconds
+and interns values that repeat across tickets, while still behaving as a
+mutable mapping.
+"""
+
+import sys
+import threading
+from collections.abc import MutableMapping
+
+from utils.timestamps import format_epoch, is_date, to_epoch
+
+# Ticket fields held in slots, in the order they are iterated
+TICKET_FIELDS = (
+    'id', 'title', 'description', 'category', 'priority', 'urgency', 'status',
+    'employee_id', 'employee_name', 'employee_email', 'department', 'location', 'phone',
+    'created_date', 'updated_date', 'assigned_to', 'resolution', 'attachments',
+    'comment_count', 'last_comment_date'
+)
+
+# Fields with a handful of distinct values, stored as codes into a CodeTable
+CODED_FIELDS = ('status', 'priority', 'urgency', 'category', 'department')
+
+# Date fields, stored as epoch seconds and formatted when read
+DATE_FIELDS = ('created_date', 'updated_date', 'last_comment_date')
+
+# String fields whose values repeat across the tickets of one employee or agent
+INTERNED_FIELDS = ('employee_id', 'employee_name', 'employee_email', 'location', 'phone', 'assigned_to')
+
+
+class CodeTable:
+    """
+    Two-way mapping between the values of a field and small integer codes
+
+    Codes are handed out on first use and never reused, so any value can be
+    stored; in practice these fields only take a few dozen distinct values.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self.lock = threading.Lock()
+
+    def encode(self, value):
+        """Get the code of a value, assigning one if it is new"""
+        code = self.codes.get(value)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(value)
+                if code is None:
+                    code = self.codes[value] = len(self.values)
+                    self.values.append(value)
+        return code
+
+    def decode(self, code):
+        """Get the value of a code"""
+        return self.values[code]
+
+
+CODE_TABLES = {field: CodeTable() for field in CODED_FIELDS}
+
+_field_set = frozenset(TICKET_FIELDS)
+_interned_set = frozenset(INTERNED_FIELDS)
+_date_set = frozenset(DATE_FIELDS)
+
+class TicketRecord(MutableMapping):
+    """
+    Ticket stored in slots, usable wherever a ticket dict is read
+
+    Keys outside TICKET_FIELDS are kept in a small dict of their own. Use
+    dict(record) where a real dict is required, for example before
+    serializing to JSON (see encode_json).
+    """
+
+    __slots__ = TICKET_FIELDS + ('extra',)
+
+    def __init__(self, ticket=(), **fields):
+        self.extra = None
+        for key, value in dict(ticket, **fields).items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in _field_set:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            table = CODE_TABLES.get(key)
+            if table is not None:
+                return table.values[value]
+            if key in _date_set and type(value) is int:
+                return format_epoch(value)
+            return value
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _field_set:
+            table = CODE_TABLES.get(key)
+            if table is not None:
+                value = table.encode(value)
+            elif key in _interned_set and type(value) is str:
+                value = sys.intern(value)
+            elif key in _date_set and is_date(value):
+                value = to_epoch(value)  # Other strings, e.g. '2025-02-30 10:00:00', are kept as they are
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in _field_set:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self):
+        for field in TICKET_FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self.extra:
+            yield from list(self.extra)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def epoch(self, field):
+        """Value of a date field in epoch seconds, or None if it is missing or not a date"""
+        value = getattr(self, field, None)
+        return value if type(value) is int else None
+
+    def copy(self):
+        """Shallow copy, as a TicketRecord"""
+        return TicketRecord(self)
+
+    def __reduce__(self):
+        return TicketRecord, (dict(self),)
+
+    def __repr__(self):
+        return f"TicketRecord({dict(self)!r})"
+
+def ticket_epoch(ticket, field):
+    """
+    Value of a date field in epoch seconds, for a TicketRecord or a ticket dict
+
+    Returns:
+        int: Epoch seconds, or None if the date is missing or not in DATE_FORMAT
+    """
+    if isinstance(ticket, TicketRecord):
+        return ticket.epoch(field)
+    value = ticket.get(field)
+    return to_epoch(value) if is_date(value) else None
+
+def encode_json(value):
+    """json.dumps default hook that writes ticket records as objects"""
+    if isinstance(value, TicketRecord):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
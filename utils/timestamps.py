@@ -0,0 +1,71 @@
+"""
+Conversion between ticket date strings and epoch seconds
+Ticket dates are local wall-clock times in DATE_FORMAT, without a time zone.
+They are converted as if they were UTC, so the mapping is exact in both
+directions and unaffected by daylight saving changes.
+"""
+
+import calendar
+import functools
+import re
+import time
+from datetime import date, datetime
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} ([01]\d|2[0-3]):[0-5]\d:[0-5]\d$")
+
+@functools.lru_cache(maxsize=4096)
+def day_epoch(day):
+    """Epoch seconds at the start of a 'YYYY-MM-DD' day"""
+    return calendar.timegm(date.fromisoformat(day).timetuple())
+
+def is_date(value):
+    """Whether a value is a date string in DATE_FORMAT"""
+    if not isinstance(value, str) or not DATE_PATTERN.match(value):
+        return False
+    try:
+        day_epoch(value[:10])
+        return True
+    except ValueError:
+        return False
+
+def to_epoch(value):
+    """
+    Convert a ticket date to epoch seconds
+
+    Args:
+        value: DATE_FORMAT string, datetime, date, epoch seconds or None
+
+    Returns:
+        int: Epoch seconds, or None for None or ''
+
+    Raises:
+        ValueError: If a string is not in DATE_FORMAT or names a day that does not exist
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        if not DATE_PATTERN.match(value):
+            raise ValueError(f"Not a '{DATE_FORMAT}' date: {value!r}")
+        # Only the day needs a calendar lookup, and days repeat across tickets
+        return (day_epoch(value[:10]) + int(value[11:13]) * 3600
+                + int(value[14:16]) * 60 + int(value[17:19]))
+    if isinstance(value, datetime):
+        return calendar.timegm(value.timetuple())
+    if isinstance(value, date):
+        return calendar.timegm(value.timetuple())
+    return int(value)
+
+def format_epoch(seconds):
+    """Format epoch seconds as a DATE_FORMAT string; None stays None"""
+    if seconds is None:
+        return None
+    return time.strftime(DATE_FORMAT, time.gmtime(seconds))
+
+def now_epoch():
+    """Current local wall-clock time in epoch seconds"""
+    return calendar.timegm(time.localtime())
+
+def current_timestamp():
+    """Current local time as a DATE_FORMAT string"""
+    return format_epoch(now_epoch())
@@ -0,0 +1,83 @@
+"""
+Streamlit caches for shared resources and derived views
+Every widget interaction reruns the page script from the top. The database,
+ticket manager and directory are created once per process and shared by all
+sessions. Views derived from the tickets are cached per data version: any
+write bumps the database's version, so the next rerun computes a fresh entry
+and the stale ones age out. Every cache is bounded and evicts its least
+recently used entries.
+"""
+
+from datetime import timedelta
+
+import streamlit as st
+
+from utils.database import get_shared_database
+from utils.directory import create_directory
+from utils.ticket_manager import TicketManager
+
+# Entries kept per cached view. Most hits are on the newest version, so a few
+# dozen covers the filter and page combinations sessions switch between.
+VIEW_CACHE_ENTRIES = 32
+
+@st.cache_resource(max_entries=1)
+def get_database():
+    """Process-wide database, see get_shared_database"""
+    return get_shared_database()
+
+@st.cache_resource(max_entries=1)
+def get_ticket_manager():
+    """Process-wide ticket manager on the shared database"""
+    return TicketManager(get_database())
+
+@st.cache_resource(max_entries=1)
+def get_directory():
+    """Process-wide employee directory, behind its lookup cache"""
+    return create_directory()
+
+def data_version():
+    """Current data version of the shared database, the key of every cached view"""
+    return get_database().get_version()
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def ticket_statistics(version):
+    """Ticket counts by status and priority at a data version"""
+    return get_ticket_manager().get_ticket_statistics()
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def recent_tickets(version, limit):
+    """Newest tickets at a data version"""
+    return [dict(t) for t in get_ticket_manager().get_recent_tickets(limit)]
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def tickets_updated_on(version, day):
+    """Tickets last updated on a day (datetime.date) at a data version"""
+    tickets = get_ticket_manager().get_tickets_between('updated_date', day, day + timedelta(days=1))
+    return [dict(t) for t in tickets]
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def ticket_page(version, filters, sort, page, page_size):
+    """
+    One page of a ticket query at a data version, see TicketManager.query
+
+    Query plans are not cached, since their timings are the point of asking.
+    """
+    result = get_ticket_manager().query(filters, sort, page, page_size)
+    result['tickets'] = [dict(t) for t in result['tickets']]
+    return result
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def employee_tickets(version, employee_id):
+    """Tickets of one employee at a data version"""
+    return [dict(t) for t in get_ticket_manager().get_employee_tickets(employee_id)]
+
+@st.cache_data(max_entries=VIEW_CACHE_ENTRIES)
+def org_ticket_statistics(version, org_generation, manager_id):
+    """
+    Ticket counts of everyone in a manager's org, the manager included
+
+    Keyed by the data version and by the generation of the directory's org
+    graph, so a refreshed graph is picked up without waiting for a write.
+    """
+    org = get_directory().get_org_graph()
+    return get_ticket_manager().get_org_ticket_statistics(org, manager_id)